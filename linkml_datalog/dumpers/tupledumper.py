@@ -1,14 +1,27 @@
+import gzip
+import hashlib
 import logging
 import os
+import queue
+import threading
+import urllib.parse
 from abc import abstractmethod
+from collections import defaultdict, OrderedDict
+from functools import lru_cache
 from enum import Enum
 from numbers import Number
-from typing import Optional, Any, Dict, List, Union
+from pathlib import Path
+from typing import Optional, Any, Dict, List, Union, Iterator, Iterable, Tuple, TextIO
 
+from curies import Converter
 from linkml_runtime.dumpers import rdflib_dumper
 from rdflib import Graph, URIRef
-from rdflib.term import Node, BNode, Literal, Identifier
-from rdflib.namespace import RDF
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.term import Node, BNode, Literal
+from rdflib.namespace import RDF, XSD
+from rdflib.plugins.parsers.notation3 import BadSyntax, RDFSink, SinkParser
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser, ParseError, r_nodeid
+from rdflib.util import guess_format
 
 
 from linkml_runtime.dumpers.dumper_root import Dumper
@@ -19,59 +32,837 @@ class Predicate(Enum):
     triple = 'triple'
     literal_number = 'literal_number'
     literal_symbol = 'literal_symbol'
+    literal_datatype = 'literal_datatype'
 
     @staticmethod
     def list() -> List[str]:
         return list(map(lambda c: c.value, Predicate))
 
 
+# number of lines passed between threads at a time when streaming
+STREAM_CHUNK_SIZE = 1000
+STREAM_BUFFER_SIZE = 1 << 20
+# number of lines written to a fact file at a time, and the size of its buffer
+WRITE_BATCH_SIZE = 10000
+WRITE_BUFFER_SIZE = 1 << 22
+# number of distinct literals whose tuples are memoized, and of literal tuples remembered to omit repeats
+LITERAL_CACHE_SIZE = 1 << 16
+# number of triples about identified objects remembered to omit repeats, when walking objects
+TRIPLE_CACHE_SIZE = 1 << 16
+# formats of RDF files that can be streamed
+NTRIPLES = 'nt'
+TURTLE = 'turtle'
+# lines read after a Turtle statement fails to parse, before its syntax error is reported
+TURTLE_RETRY_LINES = 1000
+# graph of the triples of data objects and files, when dumping quads
+DEFAULT_GRAPH = str(DATASET_DEFAULT_GRAPH_ID)
+# relations mapping literal nodes to their values and datatypes
+LITERAL_PREDICATES = {Predicate.literal_number.value, Predicate.literal_symbol.value, Predicate.literal_datatype.value}
+# datatypes of literals whose nodes are their values alone; other literals have their language or datatype appended
+DEFAULT_DATATYPES = {str(XSD.string), str(XSD.integer)}
+# kinds of relation a predicate's triples are partitioned into, see partition_relation
+PARTITION_OBJECT = 'object'
+PARTITION_SYMBOL = 'symbol'
+PARTITION_NUMBER = 'number'
+LITERAL_PARTITIONS = {
+    Predicate.literal_symbol.value: PARTITION_SYMBOL,
+    Predicate.literal_number.value: PARTITION_NUMBER,
+}
+
+
+def make_fifo(path: str) -> None:
+    """
+    Creates a named pipe, replacing any regular file at the path
+    """
+    if not hasattr(os, 'mkfifo'):
+        raise NotImplementedError('Named pipes are not supported on this platform')
+    if os.path.lexists(path):
+        os.remove(path)
+    os.mkfifo(path)
+
+
+def canonical_bnode_labels(graph: Union[Graph, Iterable[Tuple[Node, Node, Node]]]) -> Dict[BNode, str]:
+    """
+    Labels blank nodes independently of the identifiers rdflib assigned them
+
+    Each blank node is coloured by repeatedly hashing its own colour together with its
+    incident triples, with neighbouring blank nodes replaced by their colours, until the
+    partition into colours is stable. Nodes are then numbered in order of colour.
+
+    :param graph: graph, or the triples of a graph that involve blank nodes
+    :return: mapping from blank node to label
+    """
+    if isinstance(graph, Graph):
+        graph = graph.triples((None, None, None))
+    edges = defaultdict(list)
+    for s, p, o in graph:
+        if isinstance(s, BNode):
+            edges[s].append(('>', p, o))
+        if isinstance(o, BNode):
+            edges[o].append(('<', p, s))
+    colors = {b: '' for b in edges}
+    n_colors = 1
+    for _ in range(len(edges)):
+        refined = {}
+        for b, incident in edges.items():
+            signature = sorted(f'{d}{p.n3()} {colors[x] if isinstance(x, BNode) else x.n3()}'
+                               for d, p, x in incident)
+            h = hashlib.sha256(colors[b].encode('utf-8'))
+            for part in signature:
+                h.update(b'\0')
+                h.update(part.encode('utf-8'))
+            refined[b] = h.hexdigest()
+        colors = refined
+        n = len(set(colors.values()))
+        if n == n_colors:
+            break
+        n_colors = n
+    return {b: f'b{i}' for i, b in enumerate(sorted(edges, key=lambda b: colors[b]))}
+
+
+def literal_datatype(literal: Literal) -> URIRef:
+    if literal.datatype is not None:
+        return literal.datatype
+    return RDF.langString if literal.language else XSD.string
+
+
+def safe_str(v: Any) -> str:
+    return str(v).replace('\t', '\\t').replace('\n', '\\n')
+
+
+def literal_tuples(literal: Literal) -> Tuple[str, Tuple[Tuple[str, Tuple[str, ...]], ...]]:
+    """
+    Node for a literal, and the tuples mapping the node to its value and datatype
+
+    The node is the value, quoted if it is not a number, followed by the language tag or datatype
+    unless the literal is a plain string or an integer, e.g. "bob", "bob"@en, 30, or
+    "2000-01-01"^^<http://www.w3.org/2001/XMLSchema#date>. Literals with the same value
+    but a different language or datatype are distinct nodes, each with one datatype
+
+    Literals are memoized, since the same values recur throughout most data. They are
+    keyed by their lexical form, datatype and language, as hashing and comparing
+    Literal objects is much slower than for strings
+    """
+    return _literal_tuples(str(literal), literal.datatype, literal.language)
+
+
+@lru_cache(maxsize=LITERAL_CACHE_SIZE)
+def _literal_tuples(lexical: str, datatype: Optional[URIRef],
+                    language: Optional[str]) -> Tuple[str, Tuple[Tuple[str, Tuple[str, ...]], ...]]:
+    literal = Literal(lexical, datatype=datatype, lang=language)
+    v = literal.toPython()
+    if isinstance(v, Number) and not isinstance(v, bool):
+        rel, v = Predicate.literal_number.value, str(v)
+        node = v
+    else:
+        rel, v = Predicate.literal_symbol.value, safe_str(v)
+        node = f'"{v}"'
+    dt = str(literal_datatype(literal))
+    if language:
+        node += f'@{language}'
+    elif dt not in DEFAULT_DATATYPES:
+        node += f'^^<{dt}>'
+    return node, ((rel, (node, v)), (Predicate.literal_datatype.value, (node, dt)))
+
+
+@lru_cache(maxsize=None)
+def partition_relation(predicate: str, kind: str = PARTITION_OBJECT) -> str:
+    """
+    Name of a relation holding the triples with a predicate, when facts are partitioned by predicate
+
+    Relations are named by a hash of the predicate URI, as URIs are not valid relation names
+
+    :param predicate: predicate URI
+    :param kind: object, for (subject, object) rows of all triples, or symbol or number, for
+      (subject, value) rows of triples whose object is a literal with a value of that type
+    :return: relation name
+    """
+    digest = hashlib.sha256(predicate.encode('utf-8')).hexdigest()[:16]
+    return f'p_{digest}_{kind}'
+
+
+def partition_tuples(tuples: Iterable[Tuple[str, Tuple[str, ...]]]) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+    """
+    Rewrites tuples so that triples are partitioned by predicate
+
+    Each triple becomes a row of the object relation for its predicate, and the value of a
+    literal object also becomes a row of the predicate's symbol or number relation (see
+    partition_relation), so that values are looked up by predicate without joining
+    through the triple and literal relations. Literal tuples are kept as they are.
+
+    The literal tuples for a triple must directly follow it, as in the tuples generated by
+    graph_tuples, triples_tuples and ObjectWalker, so repeated literal tuples are omitted afterwards.
+    Quads keep their graph as the leading column of the partitioned rows
+    """
+    g = ()
+    s = p = None
+    for rel, row in tuples:
+        if rel == Predicate.triple.value:
+            g, (s, p, o) = row[:-3], row[-3:]
+            yield partition_relation(p), g + (s, o)
+        else:
+            yield rel, row
+            kind = LITERAL_PARTITIONS.get(rel)
+            if kind is not None:
+                yield partition_relation(p, kind), g + (s, row[1])
+
+
+def quad_tuples(tuples: Iterable[Tuple[str, Tuple[str, ...]]], graph: str) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+    """
+    Adds a graph as the leading column of triple tuples, making them quads
+
+    Literal tuples are kept as they are, since a literal has the same value in every graph
+    """
+    triple = Predicate.triple.value
+    for rel, row in tuples:
+        yield rel, ((graph,) + row if rel == triple else row)
+
+
+def unique_literal_tuples(tuples: Iterable[Tuple[str, Tuple[str, ...]]],
+                          maxsize: int = LITERAL_CACHE_SIZE) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+    """
+    Omits literal tuples that were recently generated, e.g. for a value that recurs in many triples
+
+    Only the maxsize most recently used literal tuples are remembered, so tuples for values
+    that recur after many others may be repeated. Relations are sets, so repeats change no result
+    """
+    recent = OrderedDict()
+    for rel, row in tuples:
+        if rel in LITERAL_PREDICATES:
+            key = (rel, row)
+            if key in recent:
+                recent.move_to_end(key)
+                continue
+            recent[key] = None
+            if len(recent) > maxsize:
+                recent.popitem(last=False)
+        yield rel, row
+
+
+class ObjectWalker:
+    """
+    Converts instance data objects to tuples directly, following the schema
+
+    The objects are walked in the same way as rdflib_dumper converts them to RDF, so the
+    tuples are the same as those of the graph, except for the labels of blank nodes, which
+    are numbered in order of the walk, and for values of types with uri xsd:anyURI, which are
+    URIs rather than literals, as for rdfs:Resource. Enum values may also be plain permissible
+    values. Tuples are generated as the objects are walked, without building a graph
+
+    Triples about an identified object may recur, e.g. if the object is inlined in several
+    places, and a graph would hold them once. Only the maxsize most recently generated of these
+    triples are remembered to omit repeats, so memory does not grow with the data; unlike a
+    graph, a triple that recurs after many others is generated again. Relations are sets, so
+    repeats change no result
+    """
+
+    def __init__(self, schemaview: SchemaView, prefix_map: Union[Dict[str, str], Converter, None] = None,
+                 maxsize: int = TRIPLE_CACHE_SIZE):
+        self.schemaview = schemaview
+        # the namespaces of a schema only include those of its imports once the imports are loaded
+        schemaview.imports_closure()
+        self.namespaces = schemaview.namespaces()
+        if isinstance(prefix_map, Converter):
+            prefix_map = {record.prefix: record.uri_prefix for record in prefix_map.records}
+        # prefixes are registered with the schema as rdflib_dumper does, since identifiers are expanded with them
+        for k, v in (prefix_map or {}).items():
+            if k == '@base':
+                self.namespaces._base = v
+            else:
+                self.namespaces[k] = v
+        if '_base' in self.namespaces:
+            self.namespaces._base = self.namespaces['_base']
+        self.slot_name_map = schemaview.slot_name_mappings()
+        self.enums = schemaview.all_enums()
+        self.types = schemaview.all_types()
+        self._induced_slots: Dict[Tuple[str, str], Tuple[Optional[str], Any]] = {}
+        self._class_uris: Dict[str, str] = {}
+        self._id_slots: Dict[str, Any] = {}
+        self._bnodes = 0
+        self.maxsize = maxsize
+        self._seen: OrderedDict = OrderedDict()
+
+    def tuples(self, element: YAMLRoot) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """
+        Generates tuples for an object and everything it contains
+        """
+        yield from self._walk(element, None)
+
+    def _walk(self, element: Any, target_type: Optional[ElementName]):
+        """
+        Generates tuples for the triples about an element, and returns the node for the element
+        """
+        sv = self.schemaview
+        if target_type in self.enums:
+            if isinstance(element, PermissibleValueText):
+                element = self.enums[target_type].permissible_values[element]
+            elif not isinstance(element, PermissibleValue):
+                element = element.code
+            if element.meaning is not None:
+                return URIRef(sv.expand_curie(element.meaning))
+            return Literal(element.text)
+        if target_type in self.types:
+            dt_uri = self.types[target_type].uri
+            if dt_uri:
+                if dt_uri == 'rdfs:Resource' or dt_uri == 'xsd:anyURI':
+                    return URIRef(sv.expand_curie(element))
+                elif dt_uri == 'xsd:string':
+                    return Literal(element)
+                if 'xsd' not in self.namespaces:
+                    self.namespaces['xsd'] = XSD
+                return Literal(element, datatype=self.namespaces.uri_for(dt_uri))
+            logging.warning(f'No datatype specified for : {target_type}, using plain Literal')
+            return Literal(element)
+        element_vars = {k: v for k, v in vars(element).items() if not k.startswith('_')}
+        if not element_vars:
+            return self._as_uri(element, self._id_slot(target_type))
+        cn = type(element).class_name
+        id_slot = self._id_slot(cn)
+        if id_slot is not None:
+            node = str(self._as_uri(getattr(element, id_slot.name), id_slot))
+            seen = self._seen
+        else:
+            node = f'b{self._bnodes}'
+            self._bnodes += 1
+            # triples about a blank node can only be repeated within the object itself
+            seen = OrderedDict()
+        type_added = False
+        for k, v_or_list in element_vars.items():
+            if isinstance(v_or_list, list):
+                vs = v_or_list
+            elif isinstance(v_or_list, dict):
+                vs = v_or_list.values()
+            else:
+                vs = [v_or_list]
+            for v in vs:
+                if v is None:
+                    continue
+                slot_uri, slot = self._induced_slot(k, cn)
+                if slot.identifier:
+                    continue
+                o = yield from self._walk(v, slot.range)
+                if isinstance(o, Literal):
+                    key = (node, slot_uri, o)
+                    if self._is_new(seen, key):
+                        o_node, rows = literal_tuples(o)
+                        yield Predicate.triple.value, (node, slot_uri, o_node)
+                        yield from rows
+                elif isinstance(o, _Blank):
+                    # blank nodes are new for each object, so these triples are never repeated
+                    yield Predicate.triple.value, (node, slot_uri, str(o))
+                else:
+                    o = str(o)
+                    key = (node, slot_uri, o)
+                    if self._is_new(seen, key):
+                        yield Predicate.triple.value, key
+                if slot.designates_type:
+                    type_added = True
+        if not type_added:
+            class_uri = self._class_uris.get(cn)
+            if class_uri is None:
+                class_uri = self._class_uris[cn] = sv.get_uri(cn, expand=True)
+            key = (node, str(RDF.type), class_uri)
+            if self._is_new(seen, key):
+                yield Predicate.triple.value, key
+        return node if id_slot is not None else _Blank(node)
+
+    def _is_new(self, seen: OrderedDict, key: Tuple[str, str, Any]) -> bool:
+        """
+        True if a triple was not recently generated; the triple is remembered, and the least recent forgotten
+        """
+        if key in seen:
+            seen.move_to_end(key)
+            return False
+        seen[key] = None
+        if len(seen) > self.maxsize:
+            seen.popitem(last=False)
+        return True
+
+    def _id_slot(self, cn: Optional[str]):
+        if cn not in self._id_slots:
+            self._id_slots[cn] = self.schemaview.get_identifier_slot(cn)
+        return self._id_slots[cn]
+
+    def _induced_slot(self, k: str, cn: str):
+        key = (k, cn)
+        if key not in self._induced_slots:
+            if k in self.slot_name_map:
+                k = self.slot_name_map[k].name
+            else:
+                logging.error(f'Slot {k} not in name map')
+            slot = self.schemaview.induced_slot(k, cn)
+            self._induced_slots[key] = (self.schemaview.get_uri(slot, expand=True), slot)
+        return self._induced_slots[key]
+
+    def _as_uri(self, element_id: str, id_slot) -> URIRef:
+        if id_slot and self.schemaview.is_slot_percent_encoded(id_slot):
+            return URIRef(urllib.parse.quote(element_id))
+        return self.namespaces.uri_for(element_id)
+
+
+class _Blank(str):
+    """
+    Label of a blank node
+    """
+
+
+def rdf_file_format(path: str) -> str:
+    """
+    Format of an RDF file that can be streamed, from its suffix, ignoring any .gz suffix
+
+    :return: NTRIPLES or TURTLE
+    """
+    fmt = guess_format(path[:-len('.gz')] if path.endswith('.gz') else path)
+    if fmt in ('nt', 'nt11', 'ntriples'):
+        return NTRIPLES
+    if fmt in ('turtle', 'ttl'):
+        return TURTLE
+    raise ValueError(f'Cannot stream {path}: only N-Triples and Turtle files are supported')
+
+
+class _TripleSink:
+    """
+    Collects the triples an rdflib parser generates, as a parser sink or as a graph
+    """
+
+    def __init__(self):
+        self.triples: List[Tuple[Node, Node, Node]] = []
+
+    def triple(self, s: Node, p: Node, o: Node) -> None:
+        self.triples.append((s, p, o))
+
+    def add(self, triple: Tuple[Node, Node, Node]) -> None:
+        self.triples.append(triple)
+
+    def drain(self) -> List[Tuple[Node, Node, Node]]:
+        triples = self.triples
+        self.triples = []
+        return triples
+
+
+class _NTriplesLineParser(W3CNTriplesParser):
+    """
+    N-Triples parser that keeps the labels blank nodes have in the file, rather than making new ones
+    """
+    __slots__ = ()
+
+    def nodeid(self, bnode_context=None) -> Union[BNode, bool]:
+        if self.peek('_'):
+            return BNode(f'b{self.eat(r_nodeid).group(1)}')
+        return False
+
+
+class _TurtleSink(RDFSink):
+    """
+    Turtle parser sink that numbers blank nodes in order of appearance
+    """
+
+    def newBlankNode(self, arg=None, uri=None, why=None) -> BNode:
+        self.counter += 1
+        return BNode(f'b{self.counter}')
+
+
+def ntriples_triples(stream: TextIO) -> Iterator[Tuple[Node, Node, Node]]:
+    """
+    Parses N-Triples a line at a time
+    """
+    sink = _TripleSink()
+    parser = _NTriplesLineParser(sink=sink)
+    for n, line in enumerate(stream, 1):
+        parser.line = line.rstrip('\r\n')
+        try:
+            parser.parseline()
+        except ParseError as e:
+            raise ParseError(f'Invalid line {n}: {line}') from e
+        yield from sink.drain()
+
+
+def turtle_triples(stream: TextIO, base: str = None) -> Iterator[Tuple[Node, Node, Node]]:
+    """
+    Parses Turtle a group of statements at a time
+
+    Lines are collected until one ends in a full stop outside a long string, which
+    usually ends a statement, and are then parsed. If the statement turns out to
+    be incomplete, the triples parsed from the lines are discarded, and the lines are
+    parsed again once more have been read. If they still cannot be parsed after
+    TURTLE_RETRY_LINES more lines, the first syntax error is raised
+
+    :param stream:
+    :param base: base IRI for relative IRIs
+    :raises BadSyntax: with the line of the error in the file
+    """
+    sink = _TripleSink()
+    parser = SinkParser(_TurtleSink(sink), baseURI=base, turtle=True)
+    parser.startDoc()
+    lines = []
+    # number of lines parsed before the pending ones, so that errors report lines of the file
+    offset = 0
+    error = None
+    failed_at = 0
+    in_long_string = False
+    for line in stream:
+        lines.append(line)
+        if error is not None and len(lines) - failed_at > TURTLE_RETRY_LINES:
+            raise error
+        if (line.count('"""') + line.count("'''")) % 2:
+            in_long_string = not in_long_string
+        if in_long_string or not line.rstrip().endswith('.') or line.lstrip().startswith('#'):
+            continue
+        parser.lines = offset
+        try:
+            parser.feed(''.join(lines))
+        except BadSyntax as e:
+            sink.drain()
+            if error is None:
+                error = e
+                failed_at = len(lines)
+            continue
+        offset += len(lines)
+        lines.clear()
+        error = None
+        yield from sink.drain()
+    if lines:
+        parser.lines = offset
+        try:
+            parser.feed(''.join(lines))
+        except BadSyntax as e:
+            raise error or e
+        yield from sink.drain()
+    parser.endDoc()
+
+
+def rdf_file_triples(path: str, format: str = None) -> Iterator[Tuple[Node, Node, Node]]:
+    """
+    Parses the triples in an N-Triples or Turtle file, optionally gzipped, as they are consumed
+
+    Blank nodes are labeled b followed by their labels in N-Triples files, and numbered
+    in order of appearance in Turtle files, as b1, b2, ...; as labels of blank nodes
+    cannot contain colons, they are never mistaken for IRIs
+
+    :param path:
+    :param format: NTRIPLES or TURTLE; by default, inferred from the suffix of the path
+    """
+    if format is None:
+        format = rdf_file_format(path)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as stream:
+        if format == NTRIPLES:
+            yield from ntriples_triples(stream)
+        elif format == TURTLE:
+            yield from turtle_triples(stream, base=Path(path).absolute().as_uri())
+        else:
+            raise ValueError(f'Cannot stream {format}: only {NTRIPLES} and {TURTLE} are supported')
+
+
+def triples_tuples(triples: Iterable[Tuple[Node, Node, Node]]) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+    """
+    Generates tuples for triples, with blank nodes labeled by their identifiers
+    """
+    triple = Predicate.triple.value
+    for s, p, o in triples:
+        if isinstance(o, Literal):
+            node, rows = literal_tuples(o)
+            yield triple, (str(s), str(p), node)
+            yield from rows
+        else:
+            yield triple, (str(s), str(p), str(o))
+
+
+class TupleStream:
+    """
+    Writes tuples to one named pipe per relation, from background threads
+
+    Lines are dispatched to a queue per pipe, each drained by its own writer thread. The
+    queues are unbounded, so a consumer that reads the pipes one at a time, in any order,
+    never blocks the others. Tuples for relations without a pipe are dropped.
+    """
+
+    def __init__(self, tuples: Iterable[Tuple[str, Tuple[str, ...]]], directory: str,
+                 relations: Iterable[str] = None):
+        if relations is None:
+            relations = Predicate.list()
+        self.paths = {p: os.path.join(directory, f'{p}.facts') for p in relations}
+        self.queues = {p: queue.SimpleQueue() for p in self.paths}
+        self.errors = []
+        for path in self.paths.values():
+            make_fifo(path)
+        self.writers = {p: threading.Thread(target=self._write, args=(p,), daemon=True) for p in self.paths}
+        self.dispatcher = threading.Thread(target=self._dispatch, args=(tuples,), daemon=True)
+
+    def start(self) -> 'TupleStream':
+        for t in self.writers.values():
+            t.start()
+        self.dispatcher.start()
+        return self
+
+    def _dispatch(self, tuples: Iterable[Tuple[str, Tuple[str, ...]]]) -> None:
+        chunks = {p: [] for p in self.paths}
+        try:
+            for p, row in tuples:
+                chunk = chunks.get(p)
+                if chunk is None:
+                    continue
+                chunk.append('\t'.join(row))
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    chunk.append('')
+                    self.queues[p].put('\n'.join(chunk))
+                    chunk.clear()
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            for p, chunk in chunks.items():
+                if chunk:
+                    chunk.append('')
+                    self.queues[p].put('\n'.join(chunk))
+                self.queues[p].put(None)
+
+    def _write(self, p: str) -> None:
+        q = self.queues[p]
+        try:
+            with open(self.paths[p], 'w', buffering=STREAM_BUFFER_SIZE) as stream:
+                while True:
+                    chunk = q.get()
+                    if chunk is None:
+                        break
+                    stream.write(chunk)
+        except BrokenPipeError:
+            logging.warning(f'Reader closed {self.paths[p]} before all tuples were written')
+
+    def finish(self) -> None:
+        """
+        Waits for all tuples to be written, after the consumer has finished
+
+        Pipes that the consumer never opened are drained, so that their writers can complete.
+        """
+        for p, t in self.writers.items():
+            if t.is_alive():
+                fd = os.open(self.paths[p], os.O_RDONLY | os.O_NONBLOCK)
+                try:
+                    while t.is_alive():
+                        try:
+                            os.read(fd, STREAM_BUFFER_SIZE)
+                        except BlockingIOError:
+                            t.join(0.01)
+                finally:
+                    os.close(fd)
+        self.dispatcher.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def close(self) -> None:
+        """
+        Removes the named pipes
+        """
+        for path in self.paths.values():
+            if os.path.lexists(path):
+                os.remove(path)
+
+
 class TupleDumper(Dumper):
     """
     Dumps LinkML instance data as TSV tuples
+
+    Objects are converted to tuples directly (see ObjectWalker), unless use_rdflib is set,
+    in which case they are first converted to an rdflib graph
+
+    If partitioned is set, triples are partitioned by predicate (see partition_tuples)
+
+    If quads is set, triples are dumped as (graph, subject, predicate, object) rows (see quad_tuples):
+    each named graph of a graph with contexts, such as a ConjunctiveGraph, is dumped under its
+    identifier, and other graphs under theirs. Data objects and files are dumped under DEFAULT_GRAPH,
+    or under the URI of the file
+
+    Tuples for a literal are generated once for each of its values, rather than for each
+    triple it is the object of, unless it is used again after many other literals
     """
 
+    def __init__(self, use_rdflib: bool = False, partitioned: bool = False, quads: bool = False):
+        self.use_rdflib = use_rdflib
+        self.partitioned = partitioned
+        self.quads = quads
+
     def dump(self, element: Union[YAMLRoot, Graph], schemaview: SchemaView = None, directory=None, **kwargs):
-        if isinstance(element, Graph):
-            g = element
-        else:
-            g = rdflib_dumper.as_rdf_graph(element, schemaview, **kwargs)
-        self.graph_to_tuples(g, directory=directory)
+        self.write_tuples(self.tuples(element, schemaview, **kwargs), directory=directory)
 
     def dumps(self, *args, **kwargs):
         return self.dump(*args, **kwargs)
 
-    def graph_to_tuples(self, graph: Graph, directory: str) -> None:
+    def tuples(self, element: Union[YAMLRoot, Graph], schemaview: SchemaView = None, graph: str = None,
+               **kwargs) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """
+        Generates tuples for an element, without writing any files
+
+        :param element: instance data object or rdflib graph
+        :param schemaview:
+        :param graph: for quads, the graph all triples are dumped under, rather than their own
+        :param prefix_map: prefixes used to expand CURIEs in the data
+        :return: iterator over (relation, row) pairs
+        """
+        if isinstance(element, Graph):
+            return self._rdf_tuples(element, identifier=graph)
+        if self.use_rdflib:
+            tuples = self.graph_tuples(rdflib_dumper.as_rdf_graph(element, schemaview, **kwargs))
+        else:
+            tuples = ObjectWalker(schemaview, **kwargs).tuples(element)
+        if self.quads:
+            tuples = quad_tuples(tuples, DEFAULT_GRAPH if graph is None else graph)
+        if self.partitioned:
+            tuples = partition_tuples(tuples)
+        return unique_literal_tuples(tuples)
+
+    def file_tuples(self, path: str, format: str = None) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """
+        Generates tuples for the triples in an N-Triples or Turtle file, without building a graph
+
+        The file is parsed as the tuples are consumed, so memory use does not grow with
+        the file, apart from the labels of blank nodes in Turtle files. Blank nodes
+        are labeled as in the file (see rdf_file_triples) rather than canonically
+
+        :param path: path to the file, which may be gzipped
+        :param format: NTRIPLES or TURTLE; by default, inferred from the suffix of the path
+        :return: iterator over (relation, row) pairs
+        """
+        tuples = triples_tuples(rdf_file_triples(path, format))
+        if self.quads:
+            tuples = quad_tuples(tuples, Path(path).absolute().as_uri())
+        if self.partitioned:
+            tuples = partition_tuples(tuples)
+        return unique_literal_tuples(tuples)
+
+    def file_to_tuples(self, path: str, directory: str, format: str = None) -> None:
+        """
+        Writes tuples for the triples in an N-Triples or Turtle file to a directory, streaming the file
+        """
+        self.write_tuples(self.file_tuples(path, format), directory=directory)
+
+    def graph_to_tuples(self, graph: Graph, directory: str, partitioned: bool = None) -> None:
+        """
+        Writes tuples for all triples in a graph to a directory
+
+        :param graph:
+        :param directory:
+        :param partitioned: write one file per relation of each predicate (see partition_tuples);
+          by default, as set for the dumper
+        """
+        if partitioned is None:
+            partitioned = self.partitioned
+        self.write_tuples(self._rdf_tuples(graph, partitioned), directory=directory)
+
+    def _rdf_tuples(self, graph: Graph, partitioned: bool = None,
+                    identifier: str = None) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        if not self.quads:
+            tuples = self.graph_tuples(graph)
+        elif identifier is not None:
+            tuples = quad_tuples(self.graph_tuples(graph), identifier)
+        else:
+            tuples = self.quads_tuples(graph)
+        if self.partitioned if partitioned is None else partitioned:
+            tuples = partition_tuples(tuples)
+        return unique_literal_tuples(tuples)
+
+    def write_tuples(self, tuples: Iterable[Tuple[str, Tuple[str, ...]]], directory: str,
+                     relations: Iterable[str] = None) -> None:
+        """
+        Writes tuples to one .facts file per relation in a directory
+
+        Rows are collected into batches for each relation, which are joined into one string
+        and written at once
+
+        :param tuples:
+        :param directory:
+        :param relations: relations whose files are written even if they have no tuples;
+          by default the Predicate relations
+        """
         file_map = {}
-        for p in Predicate.list():
-            file_map[p] = open(os.path.join(directory, f'{p}.facts'), 'w')
+        batches: Dict[str, List[Tuple[str, ...]]] = {}
 
-        def safe_str(v: str) -> str:
-            return str(v).replace('\t', '\\t').replace('\n', '\\n')
+        def open_facts(p: str) -> List[Tuple[str, ...]]:
+            file_map[p] = open(os.path.join(directory, f'{p}.facts'), 'w', buffering=WRITE_BUFFER_SIZE)
+            batches[p] = []
+            return batches[p]
 
-        def as_str(v: Identifier) -> str:
-            if isinstance(v, Literal):
-                v = v.toPython()
-                if isinstance(v, Number) and not isinstance(v, bool):
-                    return str(v)
-                else:
-                    v = safe_str(v)
-                    return f'"{v}"'
-            else:
-                return str(v)
+        def write_batch(p: str) -> None:
+            stream = file_map[p]
+            stream.write('\n'.join(map('\t'.join, batches[p])))
+            stream.write('\n')
+            batches[p].clear()
 
-        def emit(predicate: Predicate, *args):
-            file_map[predicate.value].write('\t'.join([as_str(a) for a in args]))
-            file_map[predicate.value].write('\n')
+        try:
+            for p in Predicate.list() if relations is None else relations:
+                open_facts(p)
+            for p, row in tuples:
+                batch = batches.get(p)
+                if batch is None:
+                    batch = open_facts(p)
+                batch.append(row)
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    write_batch(p)
+            for p, batch in batches.items():
+                if batch:
+                    write_batch(p)
+        finally:
+            for stream in file_map.values():
+                stream.close()
 
+    def stream_tuples(self, tuples: Iterable[Tuple[str, Tuple[str, ...]]], directory: str,
+                      relations: Iterable[str] = None) -> TupleStream:
+        """
+        Streams tuples through one named pipe per relation in a directory
+
+        Tuples are written by background threads as a consumer reads the pipes; call
+        finish() on the returned stream once the consumer is done
+
+        :param relations: relations to make pipes for; by default the Predicate relations
+        """
+        return TupleStream(tuples, directory, relations=relations).start()
+
+    def graph_tuples(self, graph: Graph) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """
+        Generates tuples for all triples in a graph
+
+        Each triple yields a triple tuple, and each literal object additionally yields
+        a literal_number or literal_symbol tuple mapping the literal to its value, and a
+        literal_datatype tuple mapping it to its datatype URI. Plain literals have datatype
+        xsd:string, and literals with a language tag rdf:langString
+
+        Blank nodes are given canonical labels, so that dumping the same data twice gives
+        identical tuples, even though rdflib assigns fresh identifiers. The labels depend on
+        all the triples involving blank nodes, so these triples are kept aside while the graph
+        is read, and their tuples are generated last
+        """
+        triple = Predicate.triple.value
+        bnode_triples = []
         for s, p, o in graph.triples((None, None, None)):
-            emit(Predicate.triple, s, p, o)
+            if isinstance(s, BNode) or isinstance(o, BNode):
+                bnode_triples.append((s, p, o))
+            elif isinstance(o, Literal):
+                node, rows = literal_tuples(o)
+                yield triple, (str(s), str(p), node)
+                yield from rows
+            else:
+                yield triple, (str(s), str(p), str(o))
+        if not bnode_triples:
+            return
+        bnode_labels = canonical_bnode_labels(bnode_triples)
+        for s, p, o in bnode_triples:
+            s = bnode_labels[s] if isinstance(s, BNode) else str(s)
             if isinstance(o, Literal):
-                v = o.toPython()
-                if isinstance(v, Number) and not isinstance(v, bool):
-                    emit(Predicate.literal_number, as_str(o), v)
-                else:
-                    emit(Predicate.literal_symbol, as_str(o), safe_str(v))
-
+                node, rows = literal_tuples(o)
+                yield triple, (s, str(p), node)
+                yield from rows
+            else:
+                yield triple, (s, str(p), bnode_labels[o] if isinstance(o, BNode) else str(o))
 
+    def quads_tuples(self, graph: Graph) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """
+        Generates tuples for the triples of each named graph in a graph, as quads
 
+        Blank nodes are labeled separately in each named graph, as in graph_tuples, so the
+        rows for a named graph are the same as when it is dumped on its own
 
+        :param graph: graph with contexts, such as a ConjunctiveGraph or Dataset, or any other
+          graph, which is dumped as a single named graph
+        """
+        contexts = graph.contexts() if graph.context_aware else [graph]
+        for context in contexts:
+            yield from quad_tuples(self.graph_tuples(context), str(context.identifier))
@@ -0,0 +1,53 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Tuple, Any
+
+# a fact is a relation name paired with a row of values, rendered as they would be in a .facts file
+Fact = Tuple[str, Tuple[str, ...]]
+
+
+class DatalogBackend(ABC):
+    """
+    Evaluates a generated datalog program over a collection of facts
+
+    Implementations differ in where evaluation happens (e.g. a souffle subprocess
+    or in-process), but all accept the program text produced by DatalogGenerator
+    and the facts produced by TupleDumper
+    """
+
+    @abstractmethod
+    def run(self, program: str, facts: Iterable[Fact], workdir: str = None, strict: bool = True) -> None:
+        """
+        Evaluates the program over the facts
+
+        :param program: souffle datalog program text
+        :param facts: facts for the input relations
+        :param workdir: working directory, for backends that exchange files
+        :param strict: if true, treat warnings as errors
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def relation(self, pred: str) -> List[List[str]]:
+        """
+        Retrieves the contents of a relation after running
+
+        Values are rendered as strings, as they would appear in souffle csv output
+
+        :param pred: relation name
+        :return: list of rows
+        """
+        raise NotImplementedError
+
+
+def parse_value(value: str, typ: str) -> Any:
+    """
+    Converts a value from its .facts rendering to a python value, given a souffle primitive type
+    """
+    if typ == 'number' or typ == 'unsigned':
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+    if typ == 'float':
+        return float(value)
+    return value
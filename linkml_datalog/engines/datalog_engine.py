@@ -1,9 +1,10 @@
-import csv
+import hashlib
 import json
 import os
-import subprocess
-from dataclasses import dataclass
-from typing import Any, Dict, List, Union, Tuple
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Union, Tuple
 
 import yaml
 import logging
@@ -11,15 +12,28 @@ import logging
 import click
 from linkml.generators.pythongen import PythonGenerator
 from linkml_runtime.dumpers import yaml_dumper
-from linkml_runtime.linkml_model import SlotDefinitionName
+from linkml_runtime.linkml_model import SlotDefinitionName, SchemaDefinition
 from linkml_runtime.utils.compile_python import compile_python
 from linkml_runtime.utils.formatutils import underscore
 from linkml_runtime.utils.schemaview import SchemaView, ClassDefinitionName
 from linkml_runtime.utils.yamlutils import YAMLRoot
-from rdflib import Graph
+from rdflib import Graph, BNode
 
-from linkml_datalog.dumpers.tupledumper import TupleDumper
-from linkml_datalog.generators.dataloggen import DatalogGenerator
+from linkml_datalog.dumpers.tupledumper import TupleDumper, LITERAL_PREDICATES
+from linkml_datalog.engines.backend import DatalogBackend, Fact, parse_value
+from linkml_datalog.engines.pruning import prune_program
+from linkml_datalog.engines.python_backend import PythonBackend
+from linkml_datalog.engines.result_cache import ResultCache, Results
+from linkml_datalog.engines.result_set import ResultSet
+from linkml_datalog.engines.souffle_backend import SouffleBackend
+from linkml_datalog.engines.souffle_compiler import compile_program, default_cache_dir
+from linkml_datalog.engines.souffle_library_backend import SouffleLibraryBackend
+from linkml_datalog.engines.sql_backend import SQLBackend
+from linkml_datalog.generators.dataloggen import DatalogGenerator, OUTPUT_ALL, OUTPUT_VALIDATION, generate_program, \
+    ENCODING_RELATIONS, ENCODING_WIDE, PROGRAM_CACHE_SIZE
+from linkml_datalog.utils.curie_converter import CurieConverter
+from linkml_datalog.utils.schema_index import SchemaIndex, element_pred, load_schema_index, schema_digest
+from linkml_datalog.utils.souffle_parser import Program, parse_program
 from linkml.utils.datautils import _get_format, infer_root_class, get_loader, dumpers_loaders
 from linkml_datalog.model.validation import ValidationReport, ValidationResult
 
@@ -31,6 +45,15 @@ def runcmd(cmd: str) -> int:
         raise Exception(f'Error running" {cmd}')
     return status
 
+@dataclass
+class ValidationDelta:
+    """
+    Validation results added and removed by an incremental update
+    """
+    added: List[ValidationResult] = field(default_factory=list)
+    removed: List[ValidationResult] = field(default_factory=list)
+
+
 @dataclass
 class DatalogEngine:
     """
@@ -40,93 +63,378 @@ class DatalogEngine:
 
     uses DatalogDumper
 
+    Evaluation is delegated to a backend; by default this is souffle. If compiled
+    is set, the souffle backend compiles the generated program to a native binary
+    with souffle -o, and caches the binary in cache_dir for subsequent runs. If streaming
+    is set, facts and results are exchanged with souffle through named pipes
+
+    If a result cache is provided, runs over the same facts with the same program
+    reuse the output relations of a previous run rather than evaluating the program
+
+    With a backend that supports it (currently the python backend), update applies
+    added and removed triples to the previous run, re-deriving only what they affect
+
+    outputs selects the relations souffle writes (see DatalogGenerator); relations that
+    are not output cannot be retrieved from the souffle backends
+
+    encoding selects how class-slot relations are generated (see DatalogGenerator);
+    inferred_slot_values and materialize_inferences read either encoding
+
+    The generated program is reused across runs and engines for schemas with identical content.
+    If cache_dir is set, the index over the schema used to generate programs and write back
+    inferences is also snapshotted there, so later processes using the same schema load it
+    rather than recomputing it
+
+    If prune is set, rules that cannot fire on the facts of a run are removed from the program
+    before it is evaluated (see Pruner). Pruned programs depend on the data, so pruning cannot
+    be combined with compiled programs, streaming or incremental updates
+
+    If partitioned is set, facts are partitioned by predicate, and the program reads the
+    relation for each slot rather than joining through triple (see DatalogGenerator)
+
+    If quads is set, each named graph of the data is evaluated in isolation, in a single run
+    (see DatalogGenerator and TupleDumper). Validation results have the graph they were found
+    in as their source, and the rows of each relation have the graph as their first column;
+    inferred_slot_values and materialize_inferences use the values inferred in any graph
     """
     sv: SchemaView = None
     workdir: str = None
+    compiled: bool = False
+    cache_dir: str = None
+    streaming: bool = False
+    backend: DatalogBackend = None
+    cache: ResultCache = None
+    outputs: Union[str, List[str]] = OUTPUT_ALL
+    encoding: str = ENCODING_RELATIONS
+    prune: bool = False
+    partitioned: bool = False
+    quads: bool = False
+    _cached_results: Results = field(default=None, repr=False)
+    _evaluated: bool = field(default=False, repr=False)
+    _result_sets: Dict[Union[str, Tuple[str, str]], ResultSet] = field(default_factory=dict, repr=False)
+    _outputs: Dict[str, List[str]] = field(default_factory=OrderedDict, repr=False)
+    _prefix_map: Dict[str, str] = field(default=None, repr=False)
+    _converter: CurieConverter = field(default=None, repr=False)
+    _schema_state: Tuple[SchemaDefinition, str, SchemaIndex] = field(default=None, repr=False)
+    _program_state: Tuple[str, Program] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.backend is None:
+            self.backend = SouffleBackend(compiled=self.compiled, cache_dir=self.cache_dir,
+                                          streaming=self.streaming)
+        if self.prune and (self.compiled or self.streaming or isinstance(self.backend, SouffleLibraryBackend)):
+            raise ValueError('Pruning cannot be combined with compiled programs or streaming')
 
-    def run(self, obj: Union[YAMLRoot, Graph], prefix_map: Dict[str, str] = None, strict=True):
+    def run(self, obj: Union[YAMLRoot, Graph], prefix_map: Dict[str, str] = None, strict=True,
+            outputs: Union[str, List[str]] = None):
         """
         Run datalog inference over a data object
+
+        :param obj: instance data object or rdflib graph
+        :param prefix_map: prefixes used to expand CURIEs in the data
+        :param strict: if true, treat warnings as errors
+        :param outputs: relations to output, overriding the engine default
+        """
+        self._prefix_map = prefix_map
+        self._converter = None
+        dumper = TupleDumper(partitioned=self.partitioned, quads=self.quads)
+        self._run_facts(dumper.tuples(obj, self.sv, prefix_map=prefix_map), strict=strict, outputs=outputs)
+
+    def run_file(self, path: str, format: str = None, strict=True, outputs: Union[str, List[str]] = None):
         """
+        Run datalog inference over an N-Triples or Turtle file, without loading it into memory
+
+        Triples are parsed as the backend reads the facts, e.g. as they are written to the
+        fact files of the souffle backend (see TupleDumper.file_tuples)
+
+        :param path: path to the file, which may be gzipped
+        :param format: 'nt' or 'turtle'; by default, inferred from the suffix of the path
+        :param strict: if true, treat warnings as errors
+        :param outputs: relations to output, overriding the engine default
+        """
+        self._prefix_map = None
+        self._converter = None
+        dumper = TupleDumper(partitioned=self.partitioned, quads=self.quads)
+        self._run_facts(dumper.file_tuples(path, format=format), strict=strict, outputs=outputs)
+
+    def _run_facts(self, facts: Iterable[Fact], strict: bool, outputs: Union[str, List[str], None]) -> None:
         sv = self.sv
         workdir = self.workdir
-        generator = DatalogGenerator(sv.schema)
-        with open(os.path.join(workdir, 'schema.dl'), 'w') as stream:
-            stream.write(generator.serialize())
-        generator.serialize()
-        dumper = TupleDumper()
-        dumper.dump(obj, sv, directory=workdir, prefix_map=prefix_map)
-        result = subprocess.run(['souffle', f'-F{workdir}', f'-D{workdir}', f'{workdir}/schema.dl'],
-                                capture_output=True)
-        print(f'STDERR: {result.stderr}')
-        if result.stderr:
-            logging.error(f'STDERR: {result.stderr}')
-        if result.stdout:
-            logging.error(f'STDOUT: {result.stdout}')
-        result.check_returncode()
-        if strict and result.stderr:
-            raise Exception(f'Got warnings: {result.stderr}')
-        #runcmd(f'souffle -F{workdir} -D{workdir} {workdir}/schema.dl')
+        program = generate_program(sv, outputs=self.outputs if outputs is None else outputs,
+                                   digest=self._schema_digest(), index=self._schema_index(), encoding=self.encoding,
+                                   partitioned=self.partitioned, quads=self.quads)
+        if self.prune:
+            facts = list(facts)
+            program = prune_program(self._parsed_program(program), facts).to_souffle()
+        self._cached_results = None
+        self._evaluated = False
+        self._result_sets = {}
+        if self.cache is None:
+            self.backend.run(program, facts, workdir=workdir, strict=strict)
+            self._evaluated = True
+            return
+        facts = list(facts)
+        key = self.cache.key(program, facts)
+        results = self.cache.get(key)
+        if results is None:
+            self.backend.run(program, facts, workdir=workdir, strict=strict)
+            self._evaluated = True
+            results = {pred: self.backend.relation(pred) for pred in self._output_relations(program)}
+            self.cache.put(key, results)
+        self._cached_results = results
+
+    def update(self, added: Graph = None, removed: Graph = None,
+               graph: str = None) -> Tuple[ValidationReport, ValidationDelta]:
+        """
+        Applies changes to the data of the previous run, re-deriving only what they affect
+
+        Blank nodes are labeled relative to a complete graph, so changes must not involve blank nodes.
+        Literal values are kept when triples using them are removed.
+
+        With quads, changes apply to the named graph given, or else to the graphs they are in,
+        which must be identified by URIs, as for a ConjunctiveGraph parsed from TriG. Data objects
+        are run in DEFAULT_GRAPH, and files in the graph named by the URI of the file
+
+        :param added: triples to add
+        :param removed: triples to remove
+        :param graph: for quads, the named graph the changes apply to
+        :return: updated validation report, and the validation results added and removed
+        """
+        if self.prune:
+            raise ValueError('Incremental updates are not supported for pruned programs')
+        if not hasattr(self.backend, 'update'):
+            raise ValueError(f'{type(self.backend).__name__} does not support incremental updates')
+        if not self._evaluated:
+            raise ValueError('Incremental updates require a previous run evaluated by the backend')
+        dumper = TupleDumper(partitioned=self.partitioned, quads=self.quads)
+        facts = {}
+        for name, g in [('added', added), ('removed', removed)]:
+            facts[name] = []
+            if g is None:
+                continue
+            if any(isinstance(t, BNode) for triple in g for t in triple):
+                raise ValueError('Changes must not involve blank nodes')
+            # graphs are otherwise identified by fresh blank nodes, matching no graph of the previous run
+            if self.quads and graph is None and \
+                    any(isinstance(c.identifier, BNode) for c in (g.contexts() if g.context_aware else [g])):
+                raise ValueError('Changes to quads must be in graphs identified by URIs, or name their graph')
+            for rel, row in dumper.tuples(g, graph=graph):
+                # literal values may still be used by other triples
+                if name == 'added' or rel not in LITERAL_PREDICATES:
+                    facts[name].append((rel, row))
+        changes = self.backend.update(facts['added'], facts['removed'])
+        self._cached_results = None
+        self._result_sets = {}
+        inserted, deleted = changes.get('validation_result', ([], []))
+        delta = ValidationDelta(added=[self._validation_result(row) for row in inserted],
+                                removed=[self._validation_result(row) for row in deleted])
+        return self.validation_results(), delta
+
+    def _schema_digest(self) -> str:
+        return self._schema()[1]
+
+    def _schema_index(self) -> SchemaIndex:
+        return self._schema()[2]
+
+    def _schema(self) -> Tuple[SchemaDefinition, str, SchemaIndex]:
+        # computed once per schema object: converting data with a SchemaView fills in
+        # induced values (e.g. marking identifiers required), which would change the digest,
+        # so the index is built over a copy taken before any data is converted
+        if self._schema_state is None or self._schema_state[0] is not self.sv.schema:
+            digest = schema_digest(self.sv)
+            sv = SchemaView(deepcopy(self.sv.schema))
+            if self.cache_dir is not None:
+                index = load_schema_index(sv, self.cache_dir, digest)
+            else:
+                index = SchemaIndex(sv)
+            self._schema_state = (self.sv.schema, digest, index)
+        return self._schema_state
+
+    def _parsed_program(self, program: str) -> Program:
+        if self._program_state is None or self._program_state[0] != program:
+            self._program_state = (program, parse_program(program))
+        return self._program_state[1]
+
+    def _output_relations(self, program: str) -> List[str]:
+        # pruned programs differ from run to run, so programs are keyed by digest, and only the most recent kept
+        key = hashlib.sha256(program.encode('utf-8')).hexdigest()
+        outputs = self._outputs.get(key)
+        if outputs is None:
+            outputs = self._outputs[key] = list(parse_program(program).outputs)
+            while len(self._outputs) > PROGRAM_CACHE_SIZE:
+                self._outputs.popitem(last=False)
+        else:
+            self._outputs.move_to_end(key)
+        return outputs
 
     def _parse_results(self, pred: str) -> List[List[str]]:
-        with open(os.path.join(self.workdir, f'{pred}.csv')) as csvfile:
-            reader = csv.reader(csvfile, delimiter='\t', quotechar='|')
-            return [row for row in reader]
+        if self._cached_results is not None:
+            if pred not in self._cached_results:
+                raise ValueError(f'{pred} is not an output relation')
+            return self._cached_results[pred]
+        return self.backend.relation(pred)
+
+    def results(self, pred: str) -> ResultSet:
+        """
+        Retrieves the contents of a relation after running
+
+        Each relation is loaded from the backend at most once per run, e.g.
+        engine.results('Person_ancestor_of').objects_of(subject)
+        """
+        result_set = self._result_sets.get(pred)
+        if result_set is None:
+            result_set = ResultSet(pred, self._parse_results(pred))
+            self._result_sets[pred] = result_set
+        return result_set
 
     def validation_results(self) -> ValidationReport:
         """
         Retrieves validation results, after running souffle
         """
-        rows = self._parse_results('validation_result')
-        results = []
-        for [typ, subject, cls, pred, val, info] in rows:
-            result = ValidationResult(type=typ,
-                                      subject=subject,
-                                      instantiates=cls,
-                                      predicate=pred,
-                                      object_str=val,
-                                      info=info)
-            results.append(result)
+        results = [self._validation_result(row) for row in self.results('validation_result')]
         return ValidationReport(results=results)
 
+    def validation_results_by_graph(self) -> Dict[str, ValidationReport]:
+        """
+        Retrieves validation results for each named graph with any, after running over quads
+        """
+        if not self.quads:
+            raise ValueError('Validation results are only attributed to graphs when running over quads')
+        reports = {}
+        for result in self.validation_results().results:
+            reports.setdefault(str(result.source), ValidationReport(results=[])).results.append(result)
+        return reports
+
+    def _validation_result(self, row: Iterable[str]) -> ValidationResult:
+        source = None
+        if self.quads:
+            [source, *row] = row
+        [typ, subject, cls, pred, val, info] = row
+        return ValidationResult(type=typ,
+                                subject=subject,
+                                instantiates=cls,
+                                predicate=pred,
+                                object_str=val,
+                                info=info,
+                                source=source)
+
+    def class_slot_results(self, cn: ClassDefinitionName, sn: SlotDefinitionName) -> ResultSet:
+        """
+        (subject, value) rows for the values of a slot for instances of a class, in either encoding
+
+        With quads, the graph column is dropped, so that the rows hold the values in any graph
+
+        :param cn: class, as named in relations
+        :param sn: slot, as named in relations
+        """
+        pred = f'{cn}_{sn}'
+        if self.encoding != ENCODING_WIDE and not self.quads:
+            return self.results(pred)
+        result_set = self._result_sets.get((cn, sn))
+        if result_set is None:
+            g = 1 if self.quads else 0
+            if self.encoding != ENCODING_WIDE:
+                rows = dict.fromkeys(row[g:] for row in self.results(pred))
+            else:
+                rows = {}
+                for rel in ['class_slot', 'class_slot_number']:
+                    rows.update(dict.fromkeys(row[g + 2:] for row in self.results(rel).lookup(g, cn)
+                                              if row[g + 1] == sn))
+            result_set = ResultSet(pred, rows)
+            self._result_sets[(cn, sn)] = result_set
+        return result_set
+
     def inferred_slot_values(self, cn: ClassDefinitionName, sn: SlotDefinitionName) -> List[Tuple[str, str]]:
-        return [(r[0], r[1]) for r in self._parse_results(f'{cn}_{sn}')]
+        return self.class_slot_results(cn, sn).pairs()
 
-    def materialize_inferences(self, obj: YAMLRoot) -> None:
-        # TODO: potentially redo, get all inferred triples first
-        print(f'MAT {obj} {type(obj)}')
-        if obj is None:
-            return
-        if isinstance(obj, list):
-            for x in obj:
-                self.materialize_inferences(x)
-            return
-        if isinstance(obj, dict):
-            for x in obj.values():
-                self.materialize_inferences(x)
-            return
-        sv = self.sv
-        t = type(obj)
-        try:
-            cn = t.class_name
-        except:
-            return
-        id_slot = sv.get_identifier_slot(cn)
-        if id_slot:
-            id_val = getattr(obj, id_slot.name)
-        else:
-            id_val = None
-        for islot in sv.class_induced_slots(cn):
-            sn = underscore(islot.name)
-            if id_val:
-                # TODO: optimize
-                for row in self._parse_results(sn):
-                    # TODO: CURIE expansion
-                    if row[0] == id_val:
-                        setattr(obj, sn, row[1])
-            if islot.range in sv.all_classes():
-                self.materialize_inferences(getattr(obj, sn))
+    def materialize_inferences(self, obj: Union[YAMLRoot, list, dict]) -> None:
+        """
+        Writes inferred slot values back to objects, after running
+
+        Values are taken from the class-slot relation for the class of each object with
+        an identifier. Inferred values are appended to multivalued slots if not already
+        present, and single-valued slots are only set if they have no value. Identifiers
+        are compacted to CURIEs using the prefixes of the schema and of the run, and values
+        of enums are the texts of their permissible values, rather than their meanings.
 
+        :param obj: object, or list or dict of objects, to update in place
+        """
+        converter = self._curie_converter()
+        class_slots = {}
+        stack = [obj]
+        visited = set()
+        while stack:
+            obj = stack.pop()
+            if obj is None or id(obj) in visited:
+                continue
+            visited.add(id(obj))
+            if isinstance(obj, list):
+                stack.extend(obj)
+                continue
+            if isinstance(obj, dict):
+                stack.extend(obj.values())
+                continue
+            cn = getattr(type(obj), 'class_name', None)
+            if cn is None:
+                continue
+            if cn not in class_slots:
+                class_slots[cn] = self._materialization_plan(cn)
+            id_slot, slots = class_slots[cn]
+            id_val = getattr(obj, id_slot) if id_slot else None
+            subject = converter.expand(str(id_val)) if id_val else None
+            for sn, (cpred, spred), dltype, multivalued, writeback, meanings in slots:
+                current = getattr(obj, sn, None)
+                if writeback and subject is not None:
+                    values = [self._from_datalog(v, dltype, converter, meanings)
+                              for v in self.class_slot_results(cpred, spred).objects_of(subject)]
+                    if multivalued:
+                        if current is None:
+                            current = []
+                            setattr(obj, sn, current)
+                        if isinstance(current, list):
+                            for v in values:
+                                if v not in current:
+                                    current.append(v)
+                    elif values and (current is None or current == []):
+                        setattr(obj, sn, values[0])
+                if isinstance(current, (YAMLRoot, list, dict)):
+                    stack.append(current)
+
+    def _materialization_plan(self, cn: ClassDefinitionName) -> Tuple[str, list]:
+        """
+        Identifier slot, and for each induced slot (attribute, (class, slot), datalog type, multivalued, writeback,
+        meanings), where meanings maps the meanings of an enum range to texts, and is None for other ranges
+        """
+        index = self._schema_index()
+        id_slot = index.identifier_slot(cn)
+        slots = []
+        for islot in index.class_induced_slots(cn):
+            # values of inlined slots are objects, not identifiers
+            writeback = not index.is_inlined(islot)
+            slots.append((underscore(islot.name), (index.pred(cn), element_pred(islot)), index.datalog_type(islot),
+                          bool(islot.multivalued), writeback, index.enum_meanings(islot.range)))
+        return (underscore(id_slot.name) if id_slot else None), slots
+
+    def _curie_converter(self) -> CurieConverter:
+        if self._converter is None:
+            prefix_map = {pfx: str(ns) for pfx, ns in self.sv.namespaces().items()}
+            prefix_map.update(self._prefix_map or {})
+            self._converter = CurieConverter(prefix_map)
+        return self._converter
+
+    @staticmethod
+    def _from_datalog(v: str, dltype: str, converter: CurieConverter, meanings: Dict[str, str] = None) -> Any:
+        if meanings is not None:
+            # members of an enum are the meanings of its permissible values, or literals holding their texts
+            if v in meanings:
+                return meanings[v]
+            if len(v) > 1 and v.startswith('"') and v.endswith('"'):
+                v, dltype = v[1:-1], 'symbol'
+        if dltype == 'identifier':
+            return converter.compact(v)
+        if dltype == 'number':
+            return parse_value(v, dltype)
+        return v.replace('\\t', '\t').replace('\\n', '\n')
 
 
 
@@ -136,8 +444,38 @@ class DatalogEngine:
 
 
 
-@click.command()
-@click.option('--dir', '-d', required=True, help='Directory to export to')
+
+BACKENDS = {
+    'souffle': SouffleBackend,
+    'python': PythonBackend,
+    'sql': SQLBackend,
+    'souffle-library': SouffleLibraryBackend,
+}
+
+
+class DefaultCommandGroup(click.Group):
+    """
+    Command group that falls back to the run command when no subcommand is given
+
+    This keeps the original invocation style working: linkml-dl -s SCHEMA INPUT
+    """
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args.insert(0, 'run')
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """
+    Datalog inference and validation over linkml data
+    """
+    logging.basicConfig(level=logging.INFO)
+
+
+@cli.command()
+@click.option('--dir', '-d', help='Directory to export to; required for the souffle backend')
 @click.option('--schema', '-s', required=True, help='Path to schema')
 @click.option("--input-format", "-f",
               type=click.Choice(list(dumpers_loaders.keys())),
@@ -146,8 +484,29 @@ class DatalogEngine:
               help="name of class in datamodel that the root node instantiates")
 @click.option("--module", "-m",
               help="Path to python datamodel module")
+@click.option('--compiled/--no-compiled', default=False,
+              help='Run a compiled binary of the datalog program rather than the interpreter')
+@click.option('--cache-dir', help='Directory for compiled binaries, libraries and schema snapshots')
+@click.option('--streaming/--no-streaming', default=False,
+              help='Exchange facts and results with souffle through named pipes rather than files')
+@click.option('--backend', '-b', type=click.Choice(list(BACKENDS.keys())), default='souffle',
+              help='Backend used to evaluate the datalog program')
+@click.option('--outputs', default=OUTPUT_ALL, show_default=True,
+              help="Relations to output: 'all', 'validation', or a comma-separated list of class and slot names")
+@click.option('--encoding', type=click.Choice([ENCODING_RELATIONS, ENCODING_WIDE]), default=ENCODING_RELATIONS,
+              show_default=True, help='Encoding of the values of slots for instances of each class')
+@click.option('--prune/--no-prune', default=False,
+              help='Remove rules that cannot fire on the input before evaluating the program')
+@click.option('--partitioned/--no-partitioned', default=False,
+              help='Partition facts by predicate, so that slot rules do not join through triple')
+@click.option('--quads/--no-quads', default=False,
+              help='Evaluate each named graph of the input in isolation, in a single run')
+@click.option('--rdf/--no-rdf', default=False,
+              help='Stream the input as an N-Triples or Turtle file (optionally gzipped), rather than loading '
+                   'it as instance data')
 @click.argument('input')
-def cli(input, schema, module, target_class, input_format, dir):
+def run(input, schema, module, target_class, input_format, dir, compiled, cache_dir, streaming, backend, outputs,
+        encoding, prune, partitioned, quads, rdf):
     """
     Performs inference and validation over input files using a linkml schema
 
@@ -157,29 +516,70 @@ def cli(input, schema, module, target_class, input_format, dir):
      - collect above in working directory
      - run souffle
     """
-    logging.basicConfig(level=logging.INFO)
-    if module is None:
-        if schema is None:
-            raise Exception('must pass one of module OR schema')
+    sv = SchemaView(schema)
+    obj = None
+    if not rdf:
+        if module is None:
+            if schema is None:
+                raise Exception('must pass one of module OR schema')
+            else:
+                python_module = PythonGenerator(schema).compile_module()
         else:
-            python_module = PythonGenerator(schema).compile_module()
+            python_module = compile_python(module)
+        input_format = _get_format(input, input_format)
+        loader = get_loader(input_format)
+        if target_class is None:
+            target_class = infer_root_class(sv)
+        if target_class is None:
+            raise Exception(f'target class not specified and could not be inferred')
+        py_target_class = python_module.__dict__[target_class]
+
+        obj = loader.load(source=input,  target_class=py_target_class)
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    if backend == 'souffle':
+        engine = DatalogEngine(sv, workdir=dir, compiled=compiled, cache_dir=cache_dir, streaming=streaming,
+                               encoding=encoding, prune=prune, partitioned=partitioned, quads=quads)
+    elif backend == 'souffle-library':
+        engine = DatalogEngine(sv, cache_dir=cache_dir, backend=SouffleLibraryBackend(cache_dir=cache_dir),
+                               encoding=encoding, prune=prune, partitioned=partitioned, quads=quads)
     else:
-        python_module = compile_python(module)
-    sv = SchemaView(schema)
-    input_format = _get_format(input, input_format)
-    loader = get_loader(input_format)
-    if target_class is None:
-        target_class = infer_root_class(sv)
-    if target_class is None:
-        raise Exception(f'target class not specified and could not be inferred')
-    py_target_class = python_module.__dict__[target_class]
-
-    obj = loader.load(source=input,  target_class=py_target_class)
-    engine = DatalogEngine(sv, workdir=dir)
-    engine.run(obj)
+        engine = DatalogEngine(sv, workdir=dir, cache_dir=cache_dir, backend=BACKENDS[backend](), encoding=encoding,
+                               prune=prune, partitioned=partitioned, quads=quads)
+    if outputs not in (OUTPUT_ALL, OUTPUT_VALIDATION):
+        outputs = outputs.split(',')
+    if rdf:
+        engine.run_file(input, outputs=outputs)
+    else:
+        engine.run(obj, outputs=outputs)
     rpt = engine.validation_results()
     print(yaml_dumper.dumps(rpt))
 
 
+@cli.command(name='compile')
+@click.option('--schema', '-s', required=True, help='Path to schema')
+@click.option('--cache-dir', help='Directory for compiled binaries and schema snapshots')
+@click.option('--encoding', type=click.Choice([ENCODING_RELATIONS, ENCODING_WIDE]), default=ENCODING_RELATIONS,
+              show_default=True, help='Encoding of the values of slots for instances of each class')
+@click.option('--partitioned/--no-partitioned', default=False,
+              help='Compile the program for facts partitioned by predicate')
+@click.option('--quads/--no-quads', default=False,
+              help='Compile the program for facts about many named graphs')
+def compile_schema(schema, cache_dir, encoding, partitioned, quads):
+    """
+    Compiles the datalog program for a schema ahead of time
+
+    The binary is placed in the cache directory, where subsequent
+    runs with --compiled will find it. The path to the binary is printed.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    sv = SchemaView(schema)
+    digest = schema_digest(sv)
+    program = generate_program(sv, digest=digest, index=load_schema_index(sv, cache_dir, digest), encoding=encoding,
+                               partitioned=partitioned, quads=quads)
+    print(compile_program(program, cache_dir=cache_dir))
+
+
 if __name__ == '__main__':
-    cli()
\ No newline at end of file
+    cli()
@@ -0,0 +1,266 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from linkml_datalog.engines.backend import Fact
+from linkml_datalog.utils.souffle_parser import Program, Rule, Atom, Negation, Constraint, Variable, Constant, \
+    Declaration, expand_eqrel
+
+
+class _Abstract:
+    """
+    A value standing for a set of concrete values
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+# any value that is not a constant of the program
+OTHER = _Abstract('OTHER')
+# any value at all, e.g. numbers and the results of functors
+ANY = _Abstract('ANY')
+
+Row = Tuple[object, ...]
+
+
+class _Relation:
+    """
+    Abstract rows of a relation, indexed by the value at each position
+    """
+
+    def __init__(self):
+        self.rows: Set[Row] = set()
+        self.index: Dict[int, Dict[object, List[Row]]] = defaultdict(lambda: defaultdict(list))
+
+    def add(self, row: Row) -> bool:
+        if row in self.rows:
+            return False
+        self.rows.add(row)
+        for pos, v in enumerate(row):
+            self.index[pos][v].append(row)
+        return True
+
+    def lookup(self, pos: int, v: object) -> List[Row]:
+        """
+        Rows that may have a value at a position
+        """
+        if v is ANY:
+            return list(self.rows)
+        values = self.index[pos]
+        return values.get(v, []) + values.get(ANY, [])
+
+
+def _unify(a: object, b: object) -> Optional[object]:
+    """
+    The more specific of two abstract values, or None if no concrete value is represented by both
+    """
+    if a is ANY:
+        return b
+    if b is ANY or a == b:
+        return a
+    return None
+
+
+class Pruner:
+    """
+    Finds the rules of a program that cannot fire on a given input
+
+    The program is evaluated over abstract facts, in which every value that is not a
+    constant of the program is replaced by OTHER, and numbers by ANY. Abstract evaluation
+    over-approximates what the program derives: negations and comparisons are assumed to
+    hold, and functors and aggregates may produce any value. A rule that derives nothing
+    in the abstract evaluation therefore derives nothing from the actual facts.
+
+    For instance, slot rules match triples with the slot URI as predicate, and class rules
+    match rdf:type triples with the class URI as object, so if the data only uses a few
+    slots and classes of a large schema, most of their rules and validation checks are
+    never run.
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.analyzed = expand_eqrel(program)
+        self.constants: Set[str] = set()
+        for rule in self.analyzed.rules:
+            for lit in [rule.head] + rule.body:
+                for t in _terms(lit):
+                    if isinstance(t, Constant) and isinstance(t.value, str):
+                        self.constants.add(t.value)
+
+    def _numeric(self, rel: str) -> List[bool]:
+        if rel not in self.analyzed.declarations:
+            return []
+        return [self.analyzed.is_numeric(t) for _, t in self.analyzed.declarations[rel].attributes]
+
+    def abstract_facts(self, facts: Iterable[Fact]) -> Dict[str, Set[Row]]:
+        """
+        Abstract rows of the input relations
+        """
+        rows = defaultdict(set)
+        numeric = {}
+        for rel, row in facts:
+            if rel not in self.analyzed.inputs:
+                continue
+            if rel not in numeric:
+                numeric[rel] = self._numeric(rel)
+            rows[rel].add(tuple(ANY if n else (v if v in self.constants else OTHER)
+                                for v, n in zip(row, numeric[rel])))
+        return rows
+
+    def live_rules(self, facts: Iterable[Fact]) -> List[Rule]:
+        """
+        Rules of the program that may fire on the facts, in program order
+
+        :param facts: facts for the input relations
+        :return: facts of the program, and rules that derive something in the abstract evaluation
+        """
+        relations: Dict[str, _Relation] = defaultdict(_Relation)
+        for rel, rows in self.abstract_facts(facts).items():
+            for row in rows:
+                relations[rel].add(row)
+        numeric = {rel: self._numeric(rel) for rel in self.analyzed.declarations}
+        dependents = defaultdict(set)
+        pending = []
+        for i, rule in enumerate(self.analyzed.rules):
+            if rule.is_fact():
+                relations[rule.head.relation].add(self._head(rule.head, {}, numeric))
+            else:
+                pending.append(i)
+                for lit in rule.body:
+                    if isinstance(lit, Atom):
+                        dependents[lit.relation].add(i)
+        fired = set()
+        queued = set(pending)
+        while pending:
+            i = pending.pop()
+            queued.discard(i)
+            rule = self.analyzed.rules[i]
+            # recursive rules read the relation they add to, so rows are added after matching
+            rows = [self._head(rule.head, bindings, numeric) for bindings in self._matches(rule, relations, numeric)]
+            if rows:
+                fired.add(i)
+            head = relations[rule.head.relation]
+            if any([head.add(row) for row in rows]):
+                for j in dependents[rule.head.relation]:
+                    if j not in queued:
+                        queued.add(j)
+                        pending.append(j)
+        return [rule for i, rule in enumerate(self.program.rules) if rule.is_fact() or i in fired]
+
+    def prune(self, facts: Iterable[Fact]) -> Program:
+        """
+        Copy of the program without the rules that cannot fire on the facts
+
+        Declarations, inputs and outputs are kept, so relations whose rules were removed are empty.
+        Each of these is given a rule deriving it from itself (see stub_rule), which derives nothing,
+        as souffle warns about relations that are declared but have no rules
+        """
+        rules = self.live_rules(facts)
+        logging.info(f'Pruned {len(self.program.rules) - len(rules)} of {len(self.program.rules)} rules')
+        live = {rule.head.relation for rule in rules}
+        emptied = dict.fromkeys(rule.head.relation for rule in self.program.rules if rule.head.relation not in live)
+        rules += [stub_rule(self.program.declarations[rel]) for rel in emptied]
+        return Program(types=self.program.types, declarations=self.program.declarations,
+                       inputs=self.program.inputs, outputs=self.program.outputs, rules=rules)
+
+    def _head(self, atom: Atom, bindings: Dict[str, object], numeric: Dict[str, List[bool]]) -> Row:
+        row = []
+        for pos, t in enumerate(atom.args):
+            if isinstance(t, Variable):
+                row.append(bindings.get(t.name, ANY))
+            else:
+                row.append(self._constant(atom.relation, pos, t, numeric))
+        return tuple(row)
+
+    def _constant(self, rel: str, pos: int, t, numeric: Dict[str, List[bool]]) -> object:
+        """
+        Abstract value of a term that is not a variable
+        """
+        if not isinstance(t, Constant) or not isinstance(t.value, str):
+            return ANY
+        cols = numeric.get(rel, [])
+        return ANY if pos < len(cols) and cols[pos] else t.value
+
+    def _matches(self, rule: Rule, relations: Dict[str, _Relation],
+                 numeric: Dict[str, List[bool]]) -> Iterable[Dict[str, object]]:
+        atoms = [lit for lit in rule.body if isinstance(lit, Atom)]
+        equalities = [lit for lit in rule.body if isinstance(lit, Constraint) and lit.operator == '=']
+
+        def join(k: int, bindings: Dict[str, object]) -> Iterable[Dict[str, object]]:
+            if k == len(atoms):
+                yield from self._equalities(equalities, bindings)
+                return
+            atom = atoms[k]
+            pattern = []
+            for pos, t in enumerate(atom.args):
+                if isinstance(t, Variable):
+                    pattern.append(ANY if t.is_wildcard() else bindings.get(t.name, ANY))
+                else:
+                    pattern.append(self._constant(atom.relation, pos, t, numeric))
+            relation = relations[atom.relation]
+            bound = [pos for pos, v in enumerate(pattern) if v is not ANY]
+            candidates = relation.lookup(bound[0], pattern[bound[0]]) if bound else relation.rows
+            for row in candidates:
+                extended = dict(bindings)
+                for pos, t in enumerate(atom.args):
+                    v = _unify(pattern[pos], row[pos])
+                    if v is None:
+                        break
+                    if isinstance(t, Variable) and not t.is_wildcard():
+                        extended[t.name] = v
+                else:
+                    yield from join(k + 1, extended)
+
+        return join(0, {})
+
+    def _equalities(self, equalities: List[Constraint], bindings: Dict[str, object]) -> Iterable[Dict[str, object]]:
+        bindings = dict(bindings)
+        for c in equalities:
+            left, right = (self._term_value(t, bindings) for t in (c.left, c.right))
+            v = _unify(left, right)
+            if v is None:
+                return
+            for t in (c.left, c.right):
+                if isinstance(t, Variable) and not t.is_wildcard():
+                    bindings[t.name] = v
+        yield bindings
+
+    def _term_value(self, t, bindings: Dict[str, object]) -> object:
+        if isinstance(t, Variable):
+            return bindings.get(t.name, ANY)
+        if isinstance(t, Constant) and isinstance(t.value, str):
+            return t.value
+        return ANY
+
+
+def stub_rule(decl: Declaration) -> Rule:
+    """
+    Rule that derives nothing for a relation, e.g. R(x0, x1) :- R(x0, x1).
+    """
+    args = tuple(Variable(f'x{i}') for i in range(decl.arity))
+    return Rule(head=Atom(decl.name, args), body=[Atom(decl.name, args)])
+
+
+def _terms(lit) -> Iterable:
+    if isinstance(lit, Atom):
+        yield from lit.args
+    elif isinstance(lit, Constraint):
+        yield lit.left
+        yield lit.right
+    elif isinstance(lit, Negation):
+        yield from lit.atom.args
+
+
+def prune_program(program: Program, facts: Iterable[Fact]) -> Program:
+    """
+    Removes the rules of a program that cannot fire on the given facts
+
+    :param program: parsed program
+    :param facts: facts for the input relations
+    :return: pruned copy of the program
+    """
+    return Pruner(program).prune(facts)
@@ -0,0 +1,683 @@
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Dict, Set, Tuple, Any, Optional, Callable
+
+from linkml_datalog.engines.backend import DatalogBackend, Fact, parse_value
+from linkml_datalog.utils.souffle_parser import Program, Rule, Atom, Negation, Constraint, Variable, Constant, \
+    Functor, Aggregate, Term, BodyLiteral, parse_program, term_variables, literal_variables, literal_relations, \
+    stratify, expand_eqrel, NotStratifiableError
+
+# plan step kinds
+SCAN = 'scan'
+NEGATE = 'negate'
+FILTER = 'filter'
+ASSIGN = 'assign'
+
+
+class Relation:
+    """
+    A set of tuples, with hash indexes built on demand for each combination of bound columns
+    """
+    __slots__ = ('arity', 'tuples', 'indexes')
+
+    def __init__(self, arity: int, tuples: Iterable[tuple] = None):
+        self.arity = arity
+        self.tuples: Set[tuple] = set(tuples) if tuples is not None else set()
+        self.indexes: Dict[Tuple[int, ...], Dict[tuple, List[tuple]]] = {}
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __contains__(self, t: tuple) -> bool:
+        return t in self.tuples
+
+    def add(self, t: tuple) -> bool:
+        if t in self.tuples:
+            return False
+        self.tuples.add(t)
+        for cols, index in self.indexes.items():
+            index.setdefault(tuple(t[c] for c in cols), []).append(t)
+        return True
+
+    def discard(self, t: tuple) -> bool:
+        if t not in self.tuples:
+            return False
+        self.tuples.remove(t)
+        for cols, index in self.indexes.items():
+            k = tuple(t[c] for c in cols)
+            matches = index[k]
+            matches.remove(t)
+            if not matches:
+                del index[k]
+        return True
+
+    def lookup(self, cols: Tuple[int, ...], key: tuple) -> Iterable[tuple]:
+        if not cols:
+            return self.tuples
+        if len(cols) == self.arity:
+            return [key] if key in self.tuples else []
+        index = self.indexes.get(cols)
+        if index is None:
+            index = defaultdict(list)
+            for t in self.tuples:
+                index[tuple(t[c] for c in cols)].append(t)
+            index = dict(index)
+            self.indexes[cols] = index
+        return index.get(key, [])
+
+
+class _PreviousRelation:
+    """
+    View of a relation as it was before an update, given the tuples the update inserted and deleted
+    """
+    __slots__ = ('current', 'inserted', 'deleted')
+
+    def __init__(self, current: Relation, inserted: Set[tuple], deleted: Set[tuple]):
+        self.current = current
+        self.inserted = inserted
+        self.deleted = Relation(current.arity, deleted)
+
+    def lookup(self, cols: Tuple[int, ...], key: tuple) -> Iterable[tuple]:
+        matches = [t for t in self.current.lookup(cols, key) if t not in self.inserted]
+        matches.extend(self.deleted.lookup(cols, key))
+        return matches
+
+
+# changes to a relation: (inserted, deleted)
+Changes = Dict[str, Tuple[Set[tuple], Set[tuple]]]
+
+
+def _to_number(v: Any) -> Any:
+    if isinstance(v, str):
+        try:
+            return int(v)
+        except ValueError:
+            return float(v)
+    return v
+
+
+def _divide(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        # souffle integer division truncates towards zero
+        q = abs(a) // abs(b)
+        return q if (a >= 0) == (b >= 0) else -q
+    return a / b
+
+
+FUNCTOR_IMPLEMENTATIONS: Dict[str, Callable] = {
+    '+': lambda a, b: a + b,
+    '*': lambda a, b: a * b,
+    '/': _divide,
+    '%': lambda a, b: a % b,
+    '^': lambda a, b: a ** b,
+    'cat': lambda *args: ''.join(str(a) for a in args),
+    'to_string': lambda a: str(a),
+    'to_number': _to_number,
+    'to_float': lambda a: float(a),
+    'to_unsigned': lambda a: int(a),
+    'strlen': lambda a: len(a),
+    'substr': lambda s, i, n: s[i:i + n],
+    'as': lambda a, *_: a,
+    'min': lambda *args: min(args),
+    'max': lambda *args: max(args),
+    'abs': lambda a: abs(a),
+}
+
+COMPARISONS: Dict[str, Callable] = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'match': lambda pattern, s: re.fullmatch(pattern, s) is not None,
+    'contains': lambda sub, s: sub in s,
+}
+
+
+class _EmptyAggregate(Exception):
+    """
+    Raised when min, max or mean is taken over no values; the enclosing rule does not fire
+    """
+    pass
+
+
+class SemiNaiveEvaluator:
+    """
+    In-process bottom-up evaluation of a parsed program
+
+    Relations are partitioned into strata (strongly connected components of the
+    dependency graph); each stratum is evaluated to a fixpoint using semi-naive
+    iteration, in which every round only joins against the tuples derived in the
+    previous round. Negation and aggregation must be stratified.
+
+    After evaluation, input facts can be added or removed with update, which
+    maintains the derived relations incrementally using delete-and-rederive
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.relations: Dict[str, Relation] = {name: Relation(decl.arity)
+                                               for name, decl in program.declarations.items()}
+        self._plans: Dict[tuple, list] = {}
+        self._aggregate_outer: Dict[int, Set[str]] = {}
+        self._check_relations()
+        self.strata = stratify(program)
+        self._derived = set(rule.head.relation for rule in program.rules)
+        # input facts of relations that also have rules, which must survive rederivation
+        self.base: Dict[str, Set[tuple]] = defaultdict(set)
+
+    def _check_relations(self):
+        for rule in self.program.rules:
+            refs = [(rule.head.relation, True)] + [r for lit in rule.body for r in literal_relations(lit)]
+            for rel, _ in refs:
+                if rel not in self.relations:
+                    raise ValueError(f'Undefined relation: {rel} in {rule}')
+
+    def load(self, facts: Iterable[Fact]) -> None:
+        """
+        Adds input facts, converting values according to the declared column types
+        """
+        for rel, t in self._parse_facts(facts):
+            self.relations[rel].add(t)
+            if rel in self._derived:
+                self.base[rel].add(t)
+
+    def _parse_facts(self, facts: Iterable[Fact]) -> Iterable[Tuple[str, tuple]]:
+        types = {}
+        for rel, row in facts:
+            if rel not in self.relations:
+                continue
+            if rel not in types:
+                types[rel] = self.program.column_types(rel)
+            yield rel, tuple(parse_value(v, t) for v, t in zip(row, types[rel]))
+
+    def evaluate(self) -> None:
+        for scc, rules in self.strata:
+            self._evaluate_stratum(scc, rules)
+
+    def _evaluate_stratum(self, scc: Set[str], rules: List[Rule]) -> None:
+        recursive = [r for r in rules
+                     if any(isinstance(lit, Atom) and lit.relation in scc for lit in r.body)]
+        derived = defaultdict(list)
+        for rule in rules:
+            derived[rule.head.relation].extend(self.fire(rule))
+        delta = self._add_all(derived)
+        while recursive and delta:
+            delta_relations = {rel: Relation(self.relations[rel].arity, ts) for rel, ts in delta.items()}
+            derived = defaultdict(list)
+            for rule in recursive:
+                for k, lit in enumerate(rule.body):
+                    if isinstance(lit, Atom) and lit.relation in delta_relations:
+                        derived[rule.head.relation].extend(self.fire(rule, k, delta_relations))
+            delta = self._add_all(derived)
+
+    def update(self, added: Iterable[Fact], removed: Iterable[Fact]) -> Changes:
+        """
+        Adds and removes input facts, incrementally maintaining all derived relations
+
+        Strata unaffected by the changes are skipped. Strata that only use changed relations
+        positively are maintained using delete-and-rederive: everything derivable from a deleted
+        tuple is deleted, tuples that still have an alternative derivation are rederived, and
+        insertions are propagated semi-naively. Strata that negate or aggregate over a changed
+        relation are recomputed.
+
+        :param added: facts to add
+        :param removed: facts to remove
+        :return: tuples inserted and deleted in each relation that changed
+        """
+        to_add = defaultdict(set)
+        to_remove = defaultdict(set)
+        for rel, t in self._parse_facts(added):
+            to_add[rel].add(t)
+        for rel, t in self._parse_facts(removed):
+            to_remove[rel].add(t)
+        changes: Changes = {}
+        seeds: Changes = {}
+        for rel in set(to_add) | set(to_remove):
+            both = to_add[rel] & to_remove[rel]
+            if rel in self._derived:
+                base = self.base[rel]
+                deleted = (to_remove[rel] - both) & base
+                inserted = to_add[rel] - both - base
+                base -= deleted
+                base |= inserted
+                seeds[rel] = (inserted, deleted)
+            else:
+                relation = self.relations[rel]
+                deleted = set(t for t in to_remove[rel] - both if relation.discard(t))
+                inserted = set(t for t in to_add[rel] - both if relation.add(t))
+                changes[rel] = (inserted, deleted)
+        for scc, rules in self.strata:
+            if not rules:
+                continue
+            changed = set(rel for rel, (ins, dels) in changes.items() if ins or dels)
+            refs = [r for rule in rules for lit in rule.body for r in literal_relations(lit)]
+            if not any(rel in changed for rel, _ in refs) and not any(rel in seeds for rel in scc):
+                continue
+            if any(rel in changed and not positive for rel, positive in refs):
+                changes.update(self._recompute_stratum(scc, rules))
+            else:
+                changes.update(self._maintain_stratum(scc, rules, changes, seeds))
+        return {rel: (ins, dels) for rel, (ins, dels) in changes.items() if ins or dels}
+
+    def _recompute_stratum(self, scc: Set[str], rules: List[Rule]) -> Changes:
+        previous = {}
+        for rel in scc:
+            previous[rel] = self.relations[rel].tuples
+            self.relations[rel] = Relation(self.relations[rel].arity, self.base.get(rel, ()))
+        self._evaluate_stratum(scc, rules)
+        return {rel: (self.relations[rel].tuples - previous[rel], previous[rel] - self.relations[rel].tuples)
+                for rel in scc}
+
+    def _maintain_stratum(self, scc: Set[str], rules: List[Rule], changes: Changes, seeds: Changes) -> Changes:
+        previous = {rel: _PreviousRelation(self.relations[rel], ins, dels)
+                    for rel, (ins, dels) in changes.items() if ins or dels}
+        recursive = [r for r in rules
+                     if any(isinstance(lit, Atom) and lit.relation in scc for lit in r.body)]
+        # over-delete everything with a derivation that uses a deleted tuple, evaluated over the previous state
+        over_deleted = defaultdict(set)
+        delta = {rel: dels for rel, (_, dels) in changes.items() if dels}
+        for rel in scc:
+            if rel in seeds and seeds[rel][1]:
+                over_deleted[rel] |= seeds[rel][1]
+                delta[rel] = seeds[rel][1]
+        candidates = rules
+        while delta:
+            delta_relations = {rel: Relation(self.relations[rel].arity, ts) for rel, ts in delta.items()}
+            delta = defaultdict(set)
+            for rule in candidates:
+                sources = {i: previous[lit.relation] for i, lit in enumerate(rule.body)
+                           if isinstance(lit, Atom) and lit.relation in previous}
+                for k, lit in enumerate(rule.body):
+                    if isinstance(lit, Atom) and lit.relation in delta_relations:
+                        head = rule.head.relation
+                        relation = self.relations[head]
+                        for t in self.fire(rule, k, delta_relations, sources):
+                            if t in relation and t not in over_deleted[head]:
+                                over_deleted[head].add(t)
+                                delta[head].add(t)
+            delta = {rel: ts for rel, ts in delta.items() if ts}
+            candidates = recursive
+        for rel, ts in over_deleted.items():
+            relation = self.relations[rel]
+            for t in ts:
+                relation.discard(t)
+        # rederive over-deleted tuples that still have a derivation, then propagate insertions
+        derived = defaultdict(list)
+        for rel, ts in over_deleted.items():
+            derived[rel].extend(ts & self.base.get(rel, set()))
+        for rule in rules:
+            head = rule.head.relation
+            if over_deleted.get(head):
+                derived[head].extend(self._rederive(rule, over_deleted[head]))
+            for k, lit in enumerate(rule.body):
+                if isinstance(lit, Atom) and lit.relation in changes and changes[lit.relation][0]:
+                    inserted = Relation(self.relations[lit.relation].arity, changes[lit.relation][0])
+                    derived[head].extend(self.fire(rule, k, {lit.relation: inserted}))
+        for rel in scc:
+            if rel in seeds:
+                derived[rel].extend(seeds[rel][0])
+        added = defaultdict(set)
+        delta = self._add_all(derived)
+        while delta:
+            for rel, ts in delta.items():
+                added[rel] |= ts
+            if not recursive:
+                break
+            delta_relations = {rel: Relation(self.relations[rel].arity, ts) for rel, ts in delta.items()}
+            derived = defaultdict(list)
+            for rule in recursive:
+                for k, lit in enumerate(rule.body):
+                    if isinstance(lit, Atom) and lit.relation in delta_relations:
+                        derived[rule.head.relation].extend(self.fire(rule, k, delta_relations))
+            delta = self._add_all(derived)
+        return {rel: (added[rel] - over_deleted[rel],
+                      set(t for t in over_deleted[rel] if t not in self.relations[rel]))
+                for rel in scc}
+
+    def _rederive(self, rule: Rule, candidates: Set[tuple]) -> List[tuple]:
+        """
+        Head tuples of a rule that are among the candidates, evaluated with the head bound to each candidate
+        """
+        head_args = rule.head.args
+        if rule.is_fact() or not all(isinstance(a, (Variable, Constant)) for a in head_args):
+            return [t for t in self.fire(rule) if t in candidates]
+        key = ('rederive', id(rule))
+        plan = self._plans.get(key)
+        if plan is None:
+            self._register_aggregates(rule, rule.body)
+            head_vars = set(a.name for a in head_args if isinstance(a, Variable) and not a.is_wildcard())
+            plan = self._plan(rule, bound=head_vars, body=rule.body)
+            self._plans[key] = plan
+        results = []
+        for t in candidates:
+            env = {}
+            consistent = True
+            for a, v in zip(head_args, t):
+                if isinstance(a, Constant) or a.is_wildcard():
+                    consistent = not isinstance(a, Constant) or a.value == v
+                elif a.name in env:
+                    consistent = env[a.name] == v
+                else:
+                    env[a.name] = v
+                if not consistent:
+                    break
+            if not consistent:
+                continue
+            found = []
+            self._execute(plan, 0, env, {}, lambda e: found.append(True))
+            if found:
+                results.append(t)
+        return results
+
+    def _add_all(self, derived: Dict[str, Iterable[tuple]]) -> Dict[str, Set[tuple]]:
+        delta = defaultdict(set)
+        for rel, tuples in derived.items():
+            relation = self.relations[rel]
+            for t in tuples:
+                if relation.add(t):
+                    delta[rel].add(t)
+        return {k: v for k, v in delta.items() if v}
+
+    def fire(self, rule: Rule, delta_position: int = None, delta_relations: Dict[str, Relation] = None,
+             sources: Dict[int, Relation] = None) -> List[tuple]:
+        """
+        Evaluates a single rule, returning the head tuples it derives
+
+        :param rule: rule to evaluate
+        :param delta_position: if set, the body atom at this position is matched against delta_relations
+        :param delta_relations: tuples derived in the previous round
+        :param sources: overrides the relation matched by the body literal at a position
+        :return: derived head tuples
+        """
+        if rule.is_fact():
+            return [tuple(self._eval(a, {}) for a in rule.head.args)]
+        key = (id(rule), delta_position)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plan(rule, delta_position)
+            self._plans[key] = plan
+        overrides = dict(sources) if sources else {}
+        if delta_position is not None:
+            overrides[delta_position] = delta_relations[rule.body[delta_position].relation]
+        results = []
+        head_args = rule.head.args
+        self._execute(plan, 0, {}, overrides,
+                      lambda env: results.append(tuple(self._eval(a, env) for a in head_args)))
+        return results
+
+    def _needed(self, term: Term) -> Set[str]:
+        if isinstance(term, Aggregate):
+            return self._aggregate_outer[id(term)]
+        if isinstance(term, Functor):
+            return set().union(*[self._needed(a) for a in term.args]) if term.args else set()
+        return set(term_variables(term))
+
+    def _register_aggregates(self, rule: Rule, body: List[BodyLiteral]) -> None:
+        """
+        Determines which variables in each aggregate body are bound from the enclosing rule
+        """
+        for lit in body:
+            if isinstance(lit, Constraint):
+                for t in (lit.left, lit.right):
+                    if isinstance(t, Aggregate):
+                        inner = set(v for blit in t.body for v in literal_variables(blit))
+                        outer = set(term_variables(lit.right if t is lit.left else lit.left))
+                        for a in rule.head.args:
+                            outer |= set(term_variables(a))
+                        for other in body:
+                            if other is not lit:
+                                outer |= set(literal_variables(other))
+                        self._aggregate_outer[id(t)] = inner & outer
+
+    def _plan(self, rule: Rule, delta_position: int = None, bound: Set[str] = None,
+              body: List[BodyLiteral] = None) -> list:
+        """
+        Orders the body literals of a rule into a sequence of steps
+
+        Atoms are joined greedily, preferring the delta atom and then the atom with most
+        bound arguments; filters, negations and assignments are applied as soon as the
+        variables they use are bound.
+        """
+        if body is None:
+            body = rule.body
+            self._register_aggregates(rule, body)
+        bound = set(bound) if bound else set()
+        atoms = [(i, lit) for i, lit in enumerate(body) if isinstance(lit, Atom)]
+        others = [(i, lit) for i, lit in enumerate(body) if not isinstance(lit, Atom)]
+        steps = []
+
+        def flush():
+            progress = True
+            while progress:
+                progress = False
+                for item in list(others):
+                    i, lit = item
+                    if isinstance(lit, Negation):
+                        if set(literal_variables(lit)) <= bound:
+                            steps.append(self._atom_step(NEGATE, i, lit.atom, bound))
+                            others.remove(item)
+                            progress = True
+                    else:
+                        left_needed = self._needed(lit.left)
+                        right_needed = self._needed(lit.right)
+                        if left_needed | right_needed <= bound:
+                            steps.append((FILTER, lit))
+                            others.remove(item)
+                            progress = True
+                        elif lit.operator == '=':
+                            for var, expr in ((lit.left, lit.right), (lit.right, lit.left)):
+                                if isinstance(var, Variable) and not var.is_wildcard() and \
+                                        var.name not in bound and self._needed(expr) <= bound:
+                                    steps.append((ASSIGN, var.name, expr))
+                                    bound.add(var.name)
+                                    others.remove(item)
+                                    progress = True
+                                    break
+
+        flush()
+        while atoms:
+            chosen = None
+            if delta_position is not None:
+                chosen = next((a for a in atoms if a[0] == delta_position), None)
+            if chosen is None:
+                def score(a):
+                    return sum(1 for t in a[1].args
+                               if isinstance(t, Constant) or
+                               (isinstance(t, Variable) and t.name in bound) or
+                               (isinstance(t, Functor) and self._needed(t) <= bound))
+                chosen = max(atoms, key=score)
+            atoms.remove(chosen)
+            i, atom = chosen
+            steps.append(self._atom_step(SCAN, i, atom, bound))
+            bound |= set(literal_variables(atom))
+            flush()
+        if others:
+            raise ValueError(f'Ungrounded variables in {rule}: {[str(lit) for _, lit in others]}')
+        return steps
+
+    def _atom_step(self, kind: str, position: int, atom: Atom, bound: Set[str]) -> tuple:
+        bound_cols = []
+        free_cols = []
+        checks = []
+        first_col = {}
+        for col, t in enumerate(atom.args):
+            if isinstance(t, Variable):
+                if t.is_wildcard():
+                    continue
+                if t.name in bound:
+                    bound_cols.append((col, t))
+                elif t.name in first_col:
+                    checks.append((col, first_col[t.name]))
+                else:
+                    first_col[t.name] = col
+                    free_cols.append((col, t.name))
+            else:
+                if not self._needed(t) <= bound:
+                    raise ValueError(f'Cannot evaluate argument {t} of {atom}')
+                bound_cols.append((col, t))
+        cols = tuple(c for c, _ in bound_cols)
+        terms = [t for _, t in bound_cols]
+        return kind, position, atom.relation, cols, terms, free_cols, checks
+
+    def _execute(self, steps: list, k: int, env: Dict[str, Any], overrides: Dict[int, Relation],
+                 emit: Callable) -> None:
+        if k == len(steps):
+            emit(env)
+            return
+        step = steps[k]
+        kind = step[0]
+        if kind == SCAN:
+            _, position, rel, cols, terms, free_cols, checks = step
+            relation = overrides.get(position)
+            if relation is None:
+                relation = self.relations[rel]
+            key = tuple(self._eval(t, env) for t in terms)
+            for t in relation.lookup(cols, key):
+                if checks and any(t[a] != t[b] for a, b in checks):
+                    continue
+                for col, var in free_cols:
+                    env[var] = t[col]
+                self._execute(steps, k + 1, env, overrides, emit)
+        elif kind == NEGATE:
+            _, position, rel, cols, terms, _, _ = step
+            relation = overrides.get(position)
+            if relation is None:
+                relation = self.relations[rel]
+            key = tuple(self._eval(t, env) for t in terms)
+            if not relation.lookup(cols, key):
+                self._execute(steps, k + 1, env, overrides, emit)
+        elif kind == FILTER:
+            lit = step[1]
+            try:
+                ok = COMPARISONS[lit.operator](self._eval(lit.left, env), self._eval(lit.right, env))
+            except (TypeError, _EmptyAggregate):
+                ok = False
+            if ok:
+                self._execute(steps, k + 1, env, overrides, emit)
+        elif kind == ASSIGN:
+            _, var, expr = step
+            try:
+                env[var] = self._eval(expr, env)
+            except _EmptyAggregate:
+                return
+            self._execute(steps, k + 1, env, overrides, emit)
+
+    def _eval(self, term: Term, env: Dict[str, Any]) -> Any:
+        if isinstance(term, Variable):
+            return env[term.name]
+        if isinstance(term, Constant):
+            return term.value
+        if isinstance(term, Functor):
+            args = [self._eval(a, env) for a in term.args]
+            if term.name == '-':
+                return -args[0] if len(args) == 1 else args[0] - args[1]
+            impl = FUNCTOR_IMPLEMENTATIONS.get(term.name)
+            if impl is None:
+                raise ValueError(f'Unsupported functor: {term.name}')
+            return impl(*args)
+        if isinstance(term, Aggregate):
+            return self._aggregate(term, env)
+        raise ValueError(f'Cannot evaluate {term}')
+
+    def _aggregate(self, agg: Aggregate, env: Dict[str, Any]) -> Any:
+        outer = self._aggregate_outer[id(agg)]
+        key = ('aggregate', id(agg))
+        plan = self._plans.get(key)
+        if plan is None:
+            body = [_name_wildcards(lit, n) for n, lit in enumerate(agg.body)]
+            self._register_aggregates(Rule(Atom('_', ()), body), body)
+            plan = self._plan(Rule(Atom('_', ()), body), bound=outer, body=body), \
+                sorted(set(v for lit in body for v in literal_variables(lit)) - outer)
+            self._plans[key] = plan
+        steps, local_vars = plan
+        matches = {}
+        inner_env = {v: env[v] for v in outer}
+
+        def collect(e):
+            matches[tuple(e[v] for v in local_vars)] = self._eval(agg.target, e) if agg.target is not None else None
+
+        self._execute(steps, 0, inner_env, {}, collect)
+        values = list(matches.values())
+        if agg.name == 'count':
+            return len(matches)
+        if agg.name == 'sum':
+            return sum(values)
+        if not values:
+            raise _EmptyAggregate()
+        if agg.name == 'min':
+            return min(values)
+        if agg.name == 'max':
+            return max(values)
+        if agg.name == 'mean':
+            return sum(values) / len(values)
+        raise ValueError(f'Unsupported aggregate: {agg.name}')
+
+    def rows(self, pred: str) -> List[List[str]]:
+        if pred not in self.relations:
+            raise ValueError(f'No such relation: {pred}')
+        return [[str(v) for v in t] for t in self.relations[pred].tuples]
+
+
+def _name_wildcards(lit: BodyLiteral, n: int) -> BodyLiteral:
+    """
+    Gives each wildcard in an aggregate body a distinct name, so that distinct matches are counted
+    """
+    counter = [0]
+
+    def rename(t: Term) -> Term:
+        if isinstance(t, Variable) and t.is_wildcard():
+            counter[0] += 1
+            return Variable(f'_w{n}_{counter[0]}')
+        return t
+
+    if isinstance(lit, Atom):
+        return Atom(lit.relation, tuple(rename(t) for t in lit.args))
+    return lit
+
+
+@dataclass
+class PythonBackend(DatalogBackend):
+    """
+    Evaluates programs in-process using a semi-naive evaluator
+
+    No souffle installation or working directory is required; facts are passed
+    directly from the dumper to the evaluator, and results are held in memory.
+    Parsed programs are reused while the program text is unchanged.
+
+    After running, facts can be added and removed with update, which re-derives
+    only what the changes affect
+    """
+    evaluator: Optional[SemiNaiveEvaluator] = None
+    _program_text: str = field(default=None, repr=False)
+    _program: Program = field(default=None, repr=False)
+
+    def run(self, program: str, facts: Iterable[Fact], workdir: str = None, strict: bool = True) -> None:
+        if program != self._program_text:
+            self._program = expand_eqrel(parse_program(program))
+            self._program_text = program
+        self.evaluator = SemiNaiveEvaluator(self._program)
+        self.evaluator.load(facts)
+        self.evaluator.evaluate()
+
+    def update(self, added: Iterable[Fact], removed: Iterable[Fact]) -> Dict[str, Tuple[List[List[str]], List[List[str]]]]:
+        """
+        Adds and removes facts, incrementally updating the results of the previous run
+
+        :param added: facts to add
+        :param removed: facts to remove
+        :return: rows inserted and deleted in each relation that changed
+        """
+        if self.evaluator is None:
+            raise ValueError('Program has not been run')
+        changes = self.evaluator.update(added, removed)
+        return {rel: ([[str(v) for v in t] for t in ins], [[str(v) for v in t] for t in dels])
+                for rel, (ins, dels) in changes.items()}
+
+    def relation(self, pred: str) -> List[List[str]]:
+        if self.evaluator is None:
+            raise ValueError('Program has not been run')
+        return self.evaluator.rows(pred)
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Dict, Optional, Tuple
+
+from linkml_datalog.engines.backend import Fact
+
+DEFAULT_MAX_ENTRIES = 128
+
+# digests of distinct rows are summed modulo 2^256, so the data hash does not depend on the order of facts
+DIGEST_MODULUS = 1 << 256
+
+Results = Dict[str, List[List[str]]]
+
+
+def program_hash(program: str) -> str:
+    """
+    Hash of the text of a datalog program
+    """
+    return hashlib.sha256(program.encode('utf-8')).hexdigest()
+
+
+def data_hash(facts: Iterable[Fact]) -> str:
+    """
+    Canonical hash of a collection of facts
+
+    The hash is independent of the order in which facts are generated, and of facts
+    generated more than once, since relations are sets; so the same data serialized or
+    traversed differently hashes identically
+    """
+    total = 0
+    seen = set()
+    for rel, row in facts:
+        h = hashlib.sha256(rel.encode('utf-8'))
+        for v in row:
+            h.update(b'\0')
+            h.update(v.encode('utf-8'))
+        digest = h.digest()
+        if digest not in seen:
+            seen.add(digest)
+            total = (total + int.from_bytes(digest, 'big')) % DIGEST_MODULUS
+    return f'{total:064x}'
+
+
+@dataclass
+class ResultCache:
+    """
+    Content-addressed cache of the output relations of previous runs
+
+    Entries are keyed by the hash of the program and the hash of the facts, so a
+    run over unchanged data with an unchanged schema can reuse previous results.
+    At most max_entries results are kept, evicting the least recently used
+    """
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    hits: int = 0
+    misses: int = 0
+    _entries: OrderedDict = field(default_factory=OrderedDict, repr=False)
+
+    def key(self, program: str, facts: Iterable[Fact]) -> Tuple[str, str]:
+        return program_hash(program), data_hash(facts)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Results]:
+        """
+        Retrieves the results for a key, or None if they are not cached
+        """
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        logging.info(f'Using cached results for {key}')
+        return results
+
+    def put(self, key: Tuple[str, str], results: Results) -> None:
+        """
+        Stores the results for a key, evicting the least recently used entries if the cache is full
+        """
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
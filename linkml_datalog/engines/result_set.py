@@ -0,0 +1,58 @@
+import sys
+from typing import Iterable, Iterator, List, Dict, Tuple
+
+
+class ResultSet:
+    """
+    Rows of a relation, loaded once per run
+
+    Values are interned, since the same identifiers recur across rows and relations.
+    Hash indexes on a column are built the first time the column is looked up.
+    """
+
+    def __init__(self, name: str, rows: Iterable[Iterable[str]]):
+        self.name = name
+        self.rows: List[Tuple[str, ...]] = [tuple(sys.intern(v) for v in row) for row in rows]
+        self._indexes: Dict[int, Dict[str, List[Tuple[str, ...]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        return iter(self.rows)
+
+    def index(self, col: int) -> Dict[str, List[Tuple[str, ...]]]:
+        """
+        Hash index from the values of a column to the rows with that value
+        """
+        index = self._indexes.get(col)
+        if index is None:
+            index = {}
+            for row in self.rows:
+                index.setdefault(row[col], []).append(row)
+            self._indexes[col] = index
+        return index
+
+    def lookup(self, col: int, value: str) -> List[Tuple[str, ...]]:
+        """
+        Rows with a value in a column
+        """
+        return self.index(col).get(value, [])
+
+    def objects_of(self, subject: str) -> List[str]:
+        """
+        Values in the second column of rows with a subject in the first column
+        """
+        return [row[1] for row in self.lookup(0, subject)]
+
+    def subjects_of(self, obj: str) -> List[str]:
+        """
+        Values in the first column of rows with an object in the second column
+        """
+        return [row[0] for row in self.lookup(1, obj)]
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """
+        (subject, object) pairs of a binary relation
+        """
+        return [(row[0], row[1]) for row in self.rows]
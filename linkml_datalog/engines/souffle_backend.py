@@ -0,0 +1,118 @@
+import csv
+import logging
+import os
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable, List, Dict
+
+from linkml_datalog.dumpers.tupledumper import TupleDumper, Predicate, make_fifo
+from linkml_datalog.engines.backend import DatalogBackend, Fact
+from linkml_datalog.engines.souffle_compiler import compile_program, SOUFFLE
+from linkml_datalog.utils.souffle_parser import parse_program
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """
+    Writes text to a file, unless the file already has exactly that content
+
+    :return: true if the file was written
+    """
+    if os.path.exists(path):
+        with open(path) as stream:
+            if stream.read() == text:
+                return False
+    with open(path, 'w') as stream:
+        stream.write(text)
+    return True
+
+
+@dataclass
+class SouffleBackend(DatalogBackend):
+    """
+    Evaluates programs using the souffle executable
+
+    Facts are written to the working directory, and results are read back from
+    the csv files souffle writes there.
+
+    If compiled is set, the program is compiled with souffle -o, and the binary
+    is cached in cache_dir for subsequent runs
+
+    If streaming is set, the fact files and output csv files are named pipes:
+    facts are written from background threads while souffle loads them, and
+    outputs are read into memory as souffle writes them, so nothing is stored
+    on disk and dumping overlaps with loading
+    """
+    compiled: bool = False
+    cache_dir: str = None
+    executable: str = SOUFFLE
+    workdir: str = None
+    streaming: bool = False
+    _results: Dict[str, List[List[str]]] = field(default_factory=dict, repr=False)
+
+    def run(self, program: str, facts: Iterable[Fact], workdir: str = None, strict: bool = True) -> None:
+        if workdir is None:
+            raise ValueError('The souffle backend requires a working directory')
+        self.workdir = workdir
+        write_if_changed(os.path.join(workdir, 'schema.dl'), program)
+        self._results = {}
+        if self.streaming:
+            self._run_streaming(program, facts, workdir, strict)
+        else:
+            # every input needs a file, including relations of predicates with no triples
+            inputs = Predicate.list() + list(parse_program(program).inputs)
+            TupleDumper().write_tuples(facts, directory=workdir, relations=dict.fromkeys(inputs))
+            self._execute(program, workdir, strict)
+
+    def _execute(self, program: str, workdir: str, strict: bool) -> None:
+        if self.compiled:
+            binary = compile_program(program, cache_dir=self.cache_dir, executable=self.executable)
+            cmd = [binary, f'-F{workdir}', f'-D{workdir}']
+        else:
+            cmd = [self.executable, f'-F{workdir}', f'-D{workdir}', f'{workdir}/schema.dl']
+        result = subprocess.run(cmd, capture_output=True)
+        if result.stderr:
+            logging.error(f'STDERR: {result.stderr}')
+        if result.stdout:
+            logging.error(f'STDOUT: {result.stdout}')
+        result.check_returncode()
+        if strict and result.stderr:
+            raise Exception(f'Got warnings: {result.stderr}')
+
+    def _run_streaming(self, program: str, facts: Iterable[Fact], workdir: str, strict: bool) -> None:
+        parsed = parse_program(program)
+        readers = {}
+        for pred in parsed.outputs:
+            path = os.path.join(workdir, f'{pred}.csv')
+            make_fifo(path)
+            readers[pred] = threading.Thread(target=self._read_output, args=(pred, path), daemon=True)
+            readers[pred].start()
+        stream = TupleDumper().stream_tuples(facts, directory=workdir,
+                                             relations=dict.fromkeys(Predicate.list() + list(parsed.inputs)))
+        try:
+            self._execute(program, workdir, strict)
+        finally:
+            stream.finish()
+            for pred, t in readers.items():
+                path = os.path.join(workdir, f'{pred}.csv')
+                # outputs souffle did not write are closed, so that their readers see an empty relation
+                while t.is_alive():
+                    try:
+                        os.close(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+                    except OSError:
+                        pass
+                    t.join(0.01)
+                os.remove(path)
+            stream.close()
+
+    def _read_output(self, pred: str, path: str) -> None:
+        with open(path) as csvfile:
+            reader = csv.reader(csvfile, delimiter='\t', quotechar='|')
+            self._results[pred] = [row for row in reader]
+
+    def relation(self, pred: str) -> List[List[str]]:
+        if pred in self._results:
+            return self._results[pred]
+        with open(os.path.join(self.workdir, f'{pred}.csv')) as csvfile:
+            reader = csv.reader(csvfile, delimiter='\t', quotechar='|')
+            return [row for row in reader]
@@ -0,0 +1,242 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+
+SOUFFLE = 'souffle'
+CACHE_DIR_ENV = 'LINKML_DATALOG_CACHE'
+DEFAULT_CACHE_DIR = os.path.join(Path.home(), '.cache', 'linkml-datalog')
+
+
+def default_cache_dir() -> str:
+    """
+    Directory where compiled souffle programs are stored
+
+    Can be overridden using the LINKML_DATALOG_CACHE environment variable
+    """
+    return os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+
+
+@lru_cache()
+def souffle_version(executable: str = SOUFFLE) -> str:
+    """
+    Version string reported by the souffle executable
+    """
+    result = subprocess.run([executable, '--version'], capture_output=True, text=True)
+    result.check_returncode()
+    return result.stdout.strip()
+
+
+def program_key(program: str, version: str) -> str:
+    """
+    Cache key for a compiled program
+
+    Two programs share a binary only if the datalog text and the souffle version are identical
+    """
+    h = hashlib.sha256()
+    h.update(version.encode('utf-8'))
+    h.update(b'\0')
+    h.update(program.encode('utf-8'))
+    return h.hexdigest()
+
+
+def compiled_program_path(program: str, cache_dir: str = None, executable: str = SOUFFLE) -> str:
+    """
+    Path of the binary for a program, whether or not it has been compiled yet
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    key = program_key(program, souffle_version(executable))
+    return os.path.join(cache_dir, key)
+
+
+def compile_program(program: str, cache_dir: str = None, executable: str = SOUFFLE) -> str:
+    """
+    Compiles a datalog program to a native binary using souffle -o
+
+    The binary is stored in the cache directory, keyed by the hash of the program text
+    and the souffle version; if a binary with that key already exists it is reused.
+
+    :param program: souffle datalog program text
+    :param cache_dir: directory for compiled binaries
+    :param executable: souffle executable
+    :return: path to compiled binary
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    # souffle is run in the cache directory, so paths within it must not be relative to it
+    cache_dir = os.path.abspath(cache_dir)
+    path = compiled_program_path(program, cache_dir, executable)
+    if os.path.exists(path):
+        logging.info(f'Using cached binary: {path}')
+        return path
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    # compile to a process-specific name and rename into place, so that concurrent
+    # workers never execute a partially written binary
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    src_path = f'{tmp_path}.dl'
+    with open(src_path, 'w') as stream:
+        stream.write(program)
+    logging.info(f'Compiling {src_path} to {path}')
+    try:
+        result = subprocess.run([executable, '-o', tmp_path, src_path],
+                                capture_output=True, cwd=cache_dir)
+        if result.stderr:
+            logging.warning(f'STDERR: {result.stderr}')
+        result.check_returncode()
+        os.replace(tmp_path, path)
+    finally:
+        for p in [src_path, tmp_path, f'{tmp_path}.cpp']:
+            if os.path.exists(p):
+                os.remove(p)
+    return path
+
+
+# C entry points around souffle's C++ program interface, so that a program built as a
+# shared library can be driven with ctypes. souffle's own SWIG bindings only support
+# loading and printing whole directories of files, not inserting or iterating tuples
+LIBRARY_SHIM = r'''
+#include <cstdlib>
+#include <cstring>
+#include <sstream>
+#include <string>
+#include "souffle/SouffleInterface.h"
+
+using namespace souffle;
+
+extern "C" {
+
+void *ldl_new(const char *name) {
+    return ProgramFactory::newInstance(name);
+}
+
+void ldl_delete(void *program) {
+    delete static_cast<SouffleProgram *>(program);
+}
+
+int ldl_insert(void *program, const char *relation, const char **values, int n) {
+    Relation *rel = static_cast<SouffleProgram *>(program)->getRelation(relation);
+    if (rel == nullptr || rel->getArity() != (arity_type) n) {
+        return -1;
+    }
+    tuple t(rel);
+    for (int i = 0; i < n; i++) {
+        switch (rel->getAttrType(i)[0]) {
+            case 'i': t << (RamSigned) std::strtoll(values[i], nullptr, 10); break;
+            case 'u': t << (RamUnsigned) std::strtoull(values[i], nullptr, 10); break;
+            case 'f': t << (RamFloat) std::strtod(values[i], nullptr); break;
+            default: t << std::string(values[i]);
+        }
+    }
+    rel->insert(t);
+    return 0;
+}
+
+void ldl_run(void *program) {
+    static_cast<SouffleProgram *>(program)->run();
+}
+
+char *ldl_relation(void *program, const char *relation) {
+    Relation *rel = static_cast<SouffleProgram *>(program)->getRelation(relation);
+    if (rel == nullptr) {
+        return nullptr;
+    }
+    std::ostringstream out;
+    for (auto &t : *rel) {
+        for (arity_type i = 0; i < rel->getArity(); i++) {
+            if (i > 0) {
+                out << '\t';
+            }
+            switch (rel->getAttrType(i)[0]) {
+                case 'i': { RamSigned v; t >> v; out << v; break; }
+                case 'u': { RamUnsigned v; t >> v; out << v; break; }
+                case 'f': { RamFloat v; t >> v; out << v; break; }
+                default: { std::string v; t >> v; out << v; }
+            }
+        }
+        out << '\n';
+    }
+    std::string s = out.str();
+    char *buffer = static_cast<char *>(std::malloc(s.size() + 1));
+    std::memcpy(buffer, s.c_str(), s.size() + 1);
+    return buffer;
+}
+
+void ldl_free(char *buffer) {
+    std::free(buffer);
+}
+
+}
+'''
+
+CXX_ENV = 'CXX'
+DEFAULT_CXX = 'c++'
+
+
+def library_name(program: str, executable: str = SOUFFLE) -> str:
+    """
+    Name under which a program built as a library registers itself with souffle's ProgramFactory
+    """
+    return 'ldl_' + program_key(LIBRARY_SHIM + program, souffle_version(executable))[0:24]
+
+
+def compile_library(program: str, cache_dir: str = None, executable: str = SOUFFLE) -> str:
+    """
+    Compiles a datalog program to a shared library that can be loaded in-process
+
+    The program is translated to C++ using souffle -g, and built together with
+    a C shim that allows tuples to be inserted into input relations and read from
+    output relations directly. Libraries are cached in the same way as binaries.
+
+    :param program: souffle datalog program text
+    :param cache_dir: directory for compiled libraries
+    :param executable: souffle executable
+    :return: path to shared library
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    # souffle and the C++ compiler are run in the build directory, so paths must not be relative
+    cache_dir = os.path.abspath(cache_dir)
+    name = library_name(program, executable)
+    path = os.path.join(cache_dir, f'{name}.so')
+    if os.path.exists(path):
+        logging.info(f'Using cached library: {path}')
+        return path
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    # the factory name is taken from the base name of the generated file, so
+    # sources are written to a process-specific directory rather than renamed
+    build_dir = os.path.join(cache_dir, f'{name}.{os.getpid()}.build')
+    Path(build_dir).mkdir(exist_ok=True)
+    src_path = os.path.join(build_dir, f'{name}.dl')
+    cpp_path = os.path.join(build_dir, f'{name}.cpp')
+    shim_path = os.path.join(build_dir, 'shim.cpp')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(src_path, 'w') as stream:
+        stream.write(program)
+    with open(shim_path, 'w') as stream:
+        stream.write(LIBRARY_SHIM)
+    # souffle headers are installed alongside the executable
+    include_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(
+        shutil.which(executable) or executable))), 'include')
+    logging.info(f'Compiling {src_path} to {path}')
+    try:
+        result = subprocess.run([executable, '-g', cpp_path, src_path], capture_output=True, cwd=build_dir)
+        if result.stderr:
+            logging.warning(f'STDERR: {result.stderr}')
+        result.check_returncode()
+        cxx = os.environ.get(CXX_ENV, DEFAULT_CXX)
+        result = subprocess.run([cxx, '-std=c++17', '-O3', '-fPIC', '-shared', '-D__EMBEDDED_SOUFFLE__',
+                                 f'-I{include_dir}', cpp_path, shim_path, '-o', tmp_path, '-lpthread'],
+                                capture_output=True, cwd=build_dir)
+        if result.stderr:
+            logging.warning(f'STDERR: {result.stderr}')
+        result.check_returncode()
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
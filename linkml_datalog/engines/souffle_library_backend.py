@@ -0,0 +1,97 @@
+import ctypes
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, List, Dict, Any
+
+from linkml_datalog.engines.backend import DatalogBackend, Fact
+from linkml_datalog.engines.souffle_compiler import compile_library, library_name, SOUFFLE
+
+
+def load_library(path: str) -> ctypes.CDLL:
+    """
+    Loads a library built by compile_library, declaring the signatures of the shim functions
+    """
+    lib = ctypes.CDLL(path)
+    lib.ldl_new.argtypes = [ctypes.c_char_p]
+    lib.ldl_new.restype = ctypes.c_void_p
+    lib.ldl_delete.argtypes = [ctypes.c_void_p]
+    lib.ldl_delete.restype = None
+    lib.ldl_insert.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_char_p), ctypes.c_int]
+    lib.ldl_insert.restype = ctypes.c_int
+    lib.ldl_run.argtypes = [ctypes.c_void_p]
+    lib.ldl_run.restype = None
+    # returned as a void pointer rather than c_char_p, so that the buffer can be freed
+    lib.ldl_relation.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    lib.ldl_relation.restype = ctypes.c_void_p
+    lib.ldl_free.argtypes = [ctypes.c_void_p]
+    lib.ldl_free.restype = None
+    return lib
+
+
+@dataclass
+class SouffleLibraryBackend(DatalogBackend):
+    """
+    Evaluates programs in-process, using souffle programs built as shared libraries
+
+    The program is compiled once to a shared library (cached in cache_dir), which is
+    loaded with ctypes. Facts are inserted directly into the input relations, and
+    results are read directly from the output relations, so no files are written
+    to a working directory. Warnings are reported when the library is built.
+
+    Requires souffle and a C++ compiler
+    """
+    cache_dir: str = None
+    executable: str = SOUFFLE
+    _libraries: Dict[str, ctypes.CDLL] = field(default_factory=dict, repr=False)
+    _lib: Any = field(default=None, repr=False)
+    _instance: Any = field(default=None, repr=False)
+
+    def _load(self, program: str) -> ctypes.CDLL:
+        if program not in self._libraries:
+            path = compile_library(program, cache_dir=self.cache_dir, executable=self.executable)
+            self._libraries[program] = load_library(path)
+        return self._libraries[program]
+
+    def close(self) -> None:
+        """
+        Releases the program instance from the last run
+        """
+        if self._instance is not None:
+            self._lib.ldl_delete(self._instance)
+            self._instance = None
+
+    def run(self, program: str, facts: Iterable[Fact], workdir: str = None, strict: bool = True) -> None:
+        self.close()
+        self._lib = self._load(program)
+        instance = self._lib.ldl_new(library_name(program, self.executable).encode('utf-8'))
+        if not instance:
+            raise ValueError('Could not instantiate souffle program')
+        self._instance = instance
+        arrays = {}
+        missing = set()
+        for rel, row in facts:
+            if rel in missing:
+                continue
+            n = len(row)
+            if n not in arrays:
+                arrays[n] = ctypes.c_char_p * n
+            values = arrays[n](*[v.encode('utf-8') for v in row])
+            if self._lib.ldl_insert(instance, rel.encode('utf-8'), values, n) != 0:
+                logging.warning(f'Could not insert into {rel}; skipping')
+                missing.add(rel)
+        self._lib.ldl_run(instance)
+
+    def relation(self, pred: str) -> List[List[str]]:
+        if self._instance is None:
+            raise ValueError('Program has not been run')
+        ptr = self._lib.ldl_relation(self._instance, pred.encode('utf-8'))
+        if not ptr:
+            raise ValueError(f'No such relation: {pred}')
+        try:
+            text = ctypes.string_at(ptr).decode('utf-8')
+        finally:
+            self._lib.ldl_free(ptr)
+        return [line.split('\t') for line in text.split('\n') if line]
+
+    def __del__(self):
+        self.close()
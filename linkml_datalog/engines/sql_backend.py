@@ -0,0 +1,391 @@
+import logging
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Iterable, List, Dict, Set, Any
+
+from linkml_datalog.engines.backend import DatalogBackend, Fact, parse_value
+from linkml_datalog.utils.souffle_parser import Program, Rule, Atom, Negation, Constraint, Variable, Constant, \
+    Functor, Aggregate, Term, BodyLiteral, parse_program, expand_eqrel, stratify, literal_variables
+
+SQLITE = 'sqlite'
+DUCKDB = 'duckdb'
+BATCH_SIZE = 10000
+# column type of numbers: generated programs declare decimal values as number too, so integer columns would truncate them
+NUMBER_SQL_TYPES = {SQLITE: 'REAL', DUCKDB: 'DOUBLE'}
+
+SQL_OPERATORS = {'=': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value: Any) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def render_value(value: Any) -> str:
+    """
+    Renders a column value as souffle would: numbers are stored as floating point, and whole numbers have no fraction
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _Translator:
+    """
+    Translates the body of a rule into a SELECT statement
+
+    Positive atoms become joined tables, negations become NOT EXISTS subqueries,
+    and constraints become WHERE conditions. Variables are bound to the column
+    where they first occur; assignments (x = expr) bind a variable to an expression.
+    """
+
+    def __init__(self, backend: 'SQLBackend', prefix: str = 't', outer: Dict[str, str] = None):
+        self.backend = backend
+        self.prefix = prefix
+        self.bindings: Dict[str, str] = dict(outer) if outer else {}
+        self.tables: List[str] = []
+        self.conditions: List[str] = []
+
+    def translate(self, body: List[BodyLiteral], sources: Dict[int, str] = None) -> None:
+        sources = sources or {}
+        pending = []
+        for i, lit in enumerate(body):
+            if isinstance(lit, Atom):
+                self._join(lit, sources.get(i, lit.relation))
+            else:
+                pending.append(lit)
+        while pending:
+            progress = False
+            for lit in list(pending):
+                if self._try_translate(lit):
+                    pending.remove(lit)
+                    progress = True
+            if not progress:
+                raise ValueError(f'Ungrounded variables in {[str(lit) for lit in pending]}')
+
+    def _join(self, atom: Atom, table: str) -> None:
+        alias = f'{self.prefix}{len(self.tables)}'
+        self.tables.append(f'{quote_identifier(table)} AS {alias}')
+        columns = self.backend.columns(atom.relation)
+        for col, t in zip(columns, atom.args):
+            ref = f'{alias}.{quote_identifier(col)}'
+            if isinstance(t, Variable):
+                if t.is_wildcard():
+                    continue
+                if t.name in self.bindings:
+                    self.conditions.append(f'{ref} = {self.bindings[t.name]}')
+                else:
+                    self.bindings[t.name] = ref
+            else:
+                self.conditions.append(f'{ref} = {self.expr(t)}')
+
+    def _try_translate(self, lit: BodyLiteral) -> bool:
+        if isinstance(lit, Negation):
+            if not set(literal_variables(lit)) <= set(self.bindings):
+                return False
+            alias = f'{self.prefix}n{len(self.conditions)}'
+            columns = self.backend.columns(lit.atom.relation)
+            conds = [f'{alias}.{quote_identifier(col)} = {self.expr(t)}'
+                     for col, t in zip(columns, lit.atom.args)
+                     if not (isinstance(t, Variable) and t.is_wildcard())]
+            where = f' WHERE {" AND ".join(conds)}' if conds else ''
+            self.conditions.append(f'NOT EXISTS (SELECT 1 FROM {quote_identifier(lit.atom.relation)} AS {alias}{where})')
+            return True
+        if lit.operator == '=':
+            for var, other in ((lit.left, lit.right), (lit.right, lit.left)):
+                if isinstance(var, Variable) and not var.is_wildcard() and var.name not in self.bindings \
+                        and self._translatable(other):
+                    expr = self.expr(other)
+                    if isinstance(other, Aggregate):
+                        self.conditions.append(f'{expr} IS NOT NULL')
+                    self.bindings[var.name] = expr
+                    return True
+        if not (self._translatable(lit.left) and self._translatable(lit.right)):
+            return False
+        left = self.expr(lit.left)
+        right = self.expr(lit.right)
+        if lit.operator == 'match':
+            self.conditions.append(self.backend.regex_match(left, right))
+        elif lit.operator == 'contains':
+            self.conditions.append(f'instr({right}, {left}) > 0')
+        else:
+            self.conditions.append(f'{left} {SQL_OPERATORS[lit.operator]} {right}')
+        return True
+
+    def _translatable(self, t: Term) -> bool:
+        if isinstance(t, Variable):
+            return t.name in self.bindings
+        if isinstance(t, Functor):
+            return all(self._translatable(a) for a in t.args)
+        return True
+
+    def expr(self, t: Term) -> str:
+        if isinstance(t, Variable):
+            return self.bindings[t.name]
+        if isinstance(t, Constant):
+            return quote_literal(t.value)
+        if isinstance(t, Functor):
+            args = [self.expr(a) for a in t.args]
+            return self.backend.functor(t.name, args)
+        if isinstance(t, Aggregate):
+            return self._aggregate(t)
+        raise ValueError(f'Cannot translate {t}')
+
+    def _aggregate(self, agg: Aggregate) -> str:
+        sub = _Translator(self.backend, prefix=f'{self.prefix}a{len(self.conditions)}_', outer=self.bindings)
+        sub.translate(list(agg.body))
+        from_clause = ', '.join(sub.tables)
+        where = f' WHERE {" AND ".join(sub.conditions)}' if sub.conditions else ''
+        n_atoms = len(sub.tables)
+        if agg.name == 'count':
+            if n_atoms <= 1:
+                return f'(SELECT COUNT(*) FROM {from_clause}{where})'
+            # count distinct bindings of the variables local to the aggregate body
+            local_vars = sorted(v for v in sub.bindings if v not in self.bindings)
+            refs = [f'CAST({sub.bindings[v]} AS TEXT)' for v in local_vars]
+            key = " || '|' || ".join(refs) if refs else "''"
+            return f'(SELECT COUNT(DISTINCT {key}) FROM {from_clause}{where})'
+        if n_atoms > 1 and agg.name in ('sum', 'mean'):
+            raise ValueError(f'{agg.name} over a join is not supported by the SQL backend')
+        target = sub.expr(agg.target)
+        fn = {'sum': 'SUM', 'min': 'MIN', 'max': 'MAX', 'mean': 'AVG'}[agg.name]
+        return f'(SELECT {fn}({target}) FROM {from_clause}{where})'
+
+    def select(self, head: Atom) -> str:
+        cols = ', '.join(self.expr(a) for a in head.args)
+        sql = f'SELECT DISTINCT {cols}'
+        if self.tables:
+            sql += f' FROM {", ".join(self.tables)}'
+        if self.conditions:
+            sql += f' WHERE {" AND ".join(self.conditions)}'
+        return sql
+
+
+@dataclass
+class SQLBackend(DatalogBackend):
+    """
+    Evaluates programs by translating them to SQL, using SQLite or DuckDB
+
+    Each relation becomes a table, with one column per attribute and a primary key over
+    all columns. Numbers are stored as floating point, as programs may hold decimal values in
+    number columns. Facts are bulk inserted, and each stratum of rules is translated to
+    INSERT ... SELECT statements:
+
+     - non-recursive rules are evaluated once
+     - a relation whose only recursive rule is linear (e.g. a transitive closure
+       over a base relation) is computed with a recursive common table expression
+     - other recursive strata are evaluated semi-naively, using delta tables
+
+    Results remain in the database, and can be queried in place via the connection.
+
+    If database is not set, an on-disk database is created in the working directory
+    if one is provided, otherwise an in-memory database is used
+    """
+    database: str = None
+    dialect: str = SQLITE
+    connection: Any = None
+    _program_text: str = field(default=None, repr=False)
+    _program: Program = field(default=None, repr=False)
+
+    def connect(self, workdir: str = None) -> Any:
+        database = self.database
+        if database is None:
+            database = os.path.join(workdir, 'datalog.db') if workdir else ':memory:'
+        if self.dialect == DUCKDB:
+            try:
+                import duckdb
+            except ImportError:
+                raise ImportError('The duckdb dialect requires the duckdb package: pip install duckdb')
+            return duckdb.connect(database)
+        elif self.dialect == SQLITE:
+            conn = sqlite3.connect(database)
+            conn.create_function('regexp_full_match', 2,
+                                 lambda s, p: re.fullmatch(p, s) is not None, deterministic=True)
+            return conn
+        else:
+            raise ValueError(f'Unknown dialect: {self.dialect}')
+
+    def columns(self, relation: str) -> List[str]:
+        return [n for n, _ in self._program.declarations[relation].attributes]
+
+    def functor(self, name: str, args: List[str]) -> str:
+        if name in ('+', '-', '*', '%') and len(args) == 2:
+            return f'({args[0]} {name} {args[1]})'
+        if name == '/':
+            op = '//' if self.dialect == DUCKDB else '/'
+            return f'({args[0]} {op} {args[1]})'
+        if name == '^':
+            return f'power({args[0]}, {args[1]})'
+        if name == '-':
+            return f'(-{args[0]})'
+        if name == 'cat':
+            return '(' + ' || '.join(f'CAST({a} AS TEXT)' for a in args) + ')'
+        if name == 'to_string':
+            # numbers are stored as floating point, and whole numbers are written without a fraction, as in souffle
+            return (f'(CASE WHEN {args[0]} = CAST({args[0]} AS BIGINT) THEN CAST(CAST({args[0]} AS BIGINT) AS TEXT) '
+                    f'ELSE CAST({args[0]} AS TEXT) END)')
+        if name in ('to_number', 'to_unsigned'):
+            return f'CAST({args[0]} AS INTEGER)'
+        if name == 'to_float':
+            return f'CAST({args[0]} AS REAL)'
+        if name == 'strlen':
+            return f'length({args[0]})'
+        if name == 'substr':
+            return f'substr({args[0]}, {args[1]} + 1, {args[2]})'
+        if name == 'as':
+            return args[0]
+        if name in ('min', 'max'):
+            fn = {'min': 'least', 'max': 'greatest'}[name] if self.dialect == DUCKDB else name
+            return f'{fn}({", ".join(args)})'
+        if name == 'abs':
+            return f'abs({args[0]})'
+        raise ValueError(f'Unsupported functor: {name}')
+
+    def regex_match(self, pattern: str, s: str) -> str:
+        return f'regexp_full_match({s}, {pattern})'
+
+    def _create_tables(self) -> None:
+        cur = self.connection.cursor()
+        for name, decl in self._program.declarations.items():
+            cols = []
+            for (attr, typ) in decl.attributes:
+                sql_type = NUMBER_SQL_TYPES[self.dialect] if self._program.is_numeric(typ) else 'TEXT'
+                cols.append(f'{quote_identifier(attr)} {sql_type}')
+            key = ', '.join(quote_identifier(a) for a, _ in decl.attributes)
+            cur.execute(f'DROP TABLE IF EXISTS {quote_identifier(name)}')
+            cur.execute(f'CREATE TABLE {quote_identifier(name)} ({", ".join(cols)}, PRIMARY KEY ({key}))')
+            # the primary key indexes the leading column; index the others for joins on later columns
+            for attr, _ in decl.attributes[1:]:
+                index_name = quote_identifier(f'{name}__{attr}')
+                cur.execute(f'CREATE INDEX {index_name} ON {quote_identifier(name)} ({quote_identifier(attr)})')
+
+    def _insert_sql(self, relation: str) -> str:
+        n = self._program.declarations[relation].arity
+        return f'INSERT OR IGNORE INTO {quote_identifier(relation)} VALUES ({", ".join(["?"] * n)})'
+
+    def _load(self, facts: Iterable[Fact]) -> None:
+        cur = self.connection.cursor()
+        batches: Dict[str, List[tuple]] = {}
+        types = {}
+        for rel, row in facts:
+            if rel not in self._program.declarations:
+                continue
+            if rel not in types:
+                types[rel] = self._program.column_types(rel)
+                batches[rel] = []
+            batch = batches[rel]
+            batch.append(tuple(parse_value(v, t) for v, t in zip(row, types[rel])))
+            if len(batch) >= BATCH_SIZE:
+                cur.executemany(self._insert_sql(rel), batch)
+                batch.clear()
+        for rel, batch in batches.items():
+            if batch:
+                cur.executemany(self._insert_sql(rel), batch)
+
+    def rule_sql(self, rule: Rule, sources: Dict[int, str] = None) -> str:
+        """
+        SELECT statement computing the head tuples of a rule
+
+        :param rule:
+        :param sources: replaces the table used for the body atom at a position
+        """
+        if rule.is_fact():
+            return 'SELECT ' + ', '.join(quote_literal(a.value) for a in rule.head.args)
+        translator = _Translator(self)
+        translator.translate(rule.body, sources)
+        return translator.select(rule.head)
+
+    def _execute(self, sql: str) -> int:
+        logging.debug(sql)
+        # statements run on the connection itself, as DuckDB cursors do not see its temporary tables
+        return self.connection.execute(sql).rowcount
+
+    def _count(self, table: str) -> int:
+        return self.connection.execute(f'SELECT COUNT(*) FROM {quote_identifier(table)}').fetchone()[0]
+
+    def _evaluate_stratum(self, scc: Set[str], rules: List[Rule]) -> None:
+        recursive = [r for r in rules if any(isinstance(lit, Atom) and lit.relation in scc for lit in r.body)]
+        if not recursive:
+            for rule in rules:
+                self._execute(f'INSERT OR IGNORE INTO {quote_identifier(rule.head.relation)} {self.rule_sql(rule)}')
+        elif len(scc) == 1 and len(recursive) == 1 and \
+                sum(1 for lit in recursive[0].body if isinstance(lit, Atom) and lit.relation in scc) == 1:
+            self._evaluate_linear(list(scc)[0], rules, recursive[0])
+        else:
+            self._evaluate_semi_naive(scc, rules, recursive)
+
+    def _evaluate_linear(self, relation: str, rules: List[Rule], recursive: Rule) -> None:
+        """
+        Evaluates a linearly recursive relation using WITH RECURSIVE
+        """
+        cte = quote_identifier(f'_rec_{relation}')
+        cols = ', '.join(quote_identifier(c) for c in self.columns(relation))
+        base = [f'SELECT * FROM {quote_identifier(relation)}'] + \
+               [self.rule_sql(r) for r in rules if r is not recursive]
+        position = next(i for i, lit in enumerate(recursive.body)
+                        if isinstance(lit, Atom) and lit.relation == relation)
+        step = self.rule_sql(recursive, {position: f'_rec_{relation}'})
+        self._execute(f'INSERT OR IGNORE INTO {quote_identifier(relation)} SELECT * FROM '
+                      f'(WITH RECURSIVE {cte}({cols}) AS ({" UNION ".join(base)} UNION {step}) '
+                      f'SELECT * FROM {cte})')
+
+    def _evaluate_semi_naive(self, scc: Set[str], rules: List[Rule], recursive: List[Rule]) -> None:
+        """
+        Evaluates a recursive stratum to a fixpoint, joining each round only against the previous round's delta
+        """
+        cur = self.connection
+        for rel in scc:
+            for prefix in ('_delta_', '_new_'):
+                tmp = quote_identifier(f'{prefix}{rel}')
+                cur.execute(f'DROP TABLE IF EXISTS {tmp}')
+                cur.execute(f'CREATE TEMP TABLE {tmp} AS SELECT * FROM {quote_identifier(rel)} WHERE 1 = 0')
+        for rule in rules:
+            self._execute(f'INSERT INTO {quote_identifier("_new_" + rule.head.relation)} {self.rule_sql(rule)}')
+        while True:
+            n_delta = 0
+            for rel in scc:
+                delta = quote_identifier(f'_delta_{rel}')
+                new = quote_identifier(f'_new_{rel}')
+                cur.execute(f'DELETE FROM {delta}')
+                cur.execute(f'INSERT INTO {delta} SELECT DISTINCT * FROM {new} '
+                            f'EXCEPT SELECT * FROM {quote_identifier(rel)}')
+                cur.execute(f'DELETE FROM {new}')
+                cur.execute(f'INSERT INTO {quote_identifier(rel)} SELECT * FROM {delta}')
+                n_delta += self._count(f'_delta_{rel}')
+            if not n_delta:
+                break
+            for rule in recursive:
+                for i, lit in enumerate(rule.body):
+                    if isinstance(lit, Atom) and lit.relation in scc:
+                        sql = self.rule_sql(rule, {i: f'_delta_{lit.relation}'})
+                        self._execute(f'INSERT INTO {quote_identifier("_new_" + rule.head.relation)} {sql}')
+        for rel in scc:
+            for prefix in ('_delta_', '_new_'):
+                cur.execute(f'DROP TABLE IF EXISTS {quote_identifier(prefix + rel)}')
+
+    def run(self, program: str, facts: Iterable[Fact], workdir: str = None, strict: bool = True) -> None:
+        if program != self._program_text:
+            self._program = expand_eqrel(parse_program(program))
+            self._program_text = program
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = self.connect(workdir)
+        self._create_tables()
+        self._load(facts)
+        for scc, rules in stratify(self._program):
+            if rules:
+                self._evaluate_stratum(scc, rules)
+        self.connection.commit()
+
+    def relation(self, pred: str) -> List[List[str]]:
+        if self.connection is None:
+            raise ValueError('Program has not been run')
+        rows = self.connection.execute(f'SELECT * FROM {quote_identifier(pred)}').fetchall()
+        return [[render_value(v) for v in row] for row in rows]
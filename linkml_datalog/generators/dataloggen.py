@@ -1,6 +1,10 @@
+import hashlib
+import json
 import os
-from dataclasses import dataclass
-from typing import Union, TextIO, Optional, Set, List, Any, Callable, Dict, Tuple
+from collections import OrderedDict
+from copy import deepcopy
+from functools import lru_cache
+from typing import Union, TextIO, Optional, Set, List, Any, Callable, Dict, Tuple, Iterable
 import logging
 
 import click
@@ -9,10 +13,16 @@ from jinja2 import Template
 from linkml_runtime.linkml_model.meta import SchemaDefinition, ClassDefinition, SlotDefinition, Element, \
     ClassDefinitionName, \
     SlotDefinitionName, \
-    ElementName, TypeDefinitionName, TypeDefinition, Definition, DefinitionName, PermissibleValue
+    ElementName, TypeDefinitionName, TypeDefinition, Definition, DefinitionName, PermissibleValue, EnumDefinition
 from linkml.utils.generator import Generator, shared_arguments
-from linkml_runtime.utils.formatutils import camelcase, underscore
 from linkml_runtime.utils.schemaview import SchemaView
+from rdflib.namespace import XSD
+
+from linkml_datalog.dumpers.tupledumper import partition_relation, PARTITION_OBJECT, PARTITION_SYMBOL, \
+    PARTITION_NUMBER
+from linkml_datalog.utils.souffle_parser import Constant, Program, Atom, Negation, parse_program, add_graph_column
+from linkml_datalog.utils.schema_index import SchemaIndex, Reification, element_pred, schema_digest, \
+    type_datalog_type
 
 
 macros = """
@@ -22,55 +32,27 @@ macros = """
 {%- endmacro %}
 """
 
-template = macros + """
-
-
-/**
- Schema: {{schema.name}}
-*/
-
-// Declarations
-#define RDF_TYPE "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
-
-.type identifier = symbol
-.type value = symbol
-
-// Mapping from RDF
-.decl triple(s:symbol, p:symbol, o:symbol)
-.input triple
-.decl literal_number(s:symbol, o:number)
-.input literal_number
-.decl literal_symbol(s:symbol, o:symbol)
-.input literal_symbol
-
-// closure
-.decl uri_subsumed_by(s:symbol, o:symbol)
-uri_subsumed_by(s,o) :- uri_subsumed_by(s,z), uri_subsumed_by(z,o).
-
-.decl validation_result(type: symbol, subject: symbol, instantiates: symbol, path: symbol, value: symbol, info:symbol)
-.output validation_result
-
-
-{% if 'datalog' in schemaview.schema.annotations %}
-// ------------------
-// -- SCHEMA RULES --
-// ------------------
-{{ schemaview.schema.annotations['datalog'].value }}
-{% endif %}
-
-// -------------
-// -- Slots --
-// -------------
-{% for s in schemaview.all_slots().values() %}
+slot_macro = """{% macro slot_rules(s) %}
 {% set dltype = gen.datalog_type(s) %}
 // Slot: {{s.name}} TYPE: {{ dltype }}
 {{slot(s)}}
 {% set spred = gen.pred(s) -%}
+{% set encoding = gen.slot_encoding(s) -%}
+{% set shead = gen.slot_head(s) -%}
 .decl {{ spred }}_asserted(i: identifier, v: {{ dltype }})
-.decl {{ spred }}(i: identifier, v: {{ dltype }})
+.decl {{ spred }}(i: identifier, v: {{ dltype }}){{ ' eqrel' if encoding == 'eqrel' }}
+{%- if encoding == 'linear' %}
+.decl {{ shead }}(i: identifier, v: {{ dltype }})
+{%- endif %}
+{% if gen.is_output(s) %}
 .output {{ spred }}
-{{ spred }}(i, v) :- 
+{% endif %}
+{{ shead }}(i, v) :- 
     {{ spred }}_asserted(i, v).
+{% if gen.partitioned %}
+{{ spred }}_asserted(i, v) :- {{ gen.partition(s) }}(i, v).
+{% endif %}
+{% if gen.reads_triples() %}
 {{ spred }}_asserted(i, v) :- 
     {% if dltype == 'identifier' %}
     triple(i, "{{ gen.uri(s) }}", v).
@@ -82,33 +64,38 @@ uri_subsumed_by(s,o) :- uri_subsumed_by(s,z), uri_subsumed_by(z,o).
      literal_symbol(x, v).
     {% endif %}
     {% endif %}
+{% endif %}
     
-uri_subsumed_by("{{ gen.uri(s) }}", "{{ gen.uri(s) }}").
 {% for p in gen.parents(s) %}
-{{ gen.pred(p) }}(i, v) :- {{ spred }}(i, v).
-uri_subsumed_by("{{ gen.uri(s) }}", "{{ gen.uri(p) }}").
+{{ gen.slot_head(p) }}(i, v) :- {{ spred }}(i, v).
+{% endfor %}
+{% for u in gen.slot_uri_ancestors(s) %}
+uri_subsumed_by("{{ gen.uri(s) }}", "{{ u }}").
 {% endfor %}
 
 {% if s.inverse %}
 // inverse
-{{ spred }}(i, v) :- {{ gen.pred(s.inverse) }}(v, i). 
+{{ shead }}(i, v) :- {{ gen.pred(s.inverse) }}(v, i). 
 {% endif %}
 
-{% if s.symmetric %}
+{% if s.symmetric and encoding != 'eqrel' %}
 // symmetric
 {{ spred }}(i, v) :- {{ spred }}(v, i). 
 {% endif %}
 
-{% if gen.is_transitive(s) %}
+{% if gen.is_transitive(s) and encoding != 'eqrel' %}
 // transitive
+{%- if encoding == 'linear' %}
+{{ spred }}(i, v) :- {{ shead }}(i, v).
+{%- endif %}
 {{ spred }}(i, v) :- 
     {{ spred }}(i, z),
-    {{ spred }}(z, v).
+    {{ shead }}(z, v).
 {% endif %}
 
 {% if 'transitive_closure_of' in s.annotations %}
 // transitive
-{{ spred }}(i, v) :- 
+{{ shead }}(i, v) :- 
     {{ gen.pred(s.annotations['transitive_closure_of'].value) }}(i, v).
 {% endif %}
 
@@ -127,7 +114,7 @@ validation_result(
     , ! {{ gen.pred(domain) }}(i)
     {%- endfor %} .
     
-{% if s.range and not s.range in schemaview.all_types() %}
+{% if s.range and not gen.is_type(s.range) %}
 validation_result(
   "sh:Range",
   i,
@@ -139,27 +126,55 @@ validation_result(
     {{spred}}(i, v),
     ! {{ gen.pred(s.range) }}(v).
 {% endif %}
+
+{% if gen.checks_datatype(s) %}
+validation_result(
+  "sh:DatatypeConstraintComponent",
+  i,
+  "{{s.name}}",
+  "{{s.name}}",
+  x,
+  "Expected range is {{s.range}}") :-
+    {% if gen.partitioned %}
+    {{ gen.object_partition(s) }}(i, x),
+    {% else %}
+    triple(i, "{{ gen.uri(s) }}", x),
+    {% endif %}
+    literal_datatype(x, dt),
+    ! type_datatype("{{ gen.pred(s.range) }}", dt).
+{% endif %}
     
-{% endfor %}
-// end of slots block
+{% endmacro %}"""
 
-// -------------
-// -- CLASSES --
-// -------------
-{% for c in schemaview.all_classes().values() %}
+class_macro = """{% macro class_rules(c) %}
 // Class: {{c.name}}
 {% set cpred = gen.pred(c) -%}
 .decl {{ cpred }}(i: symbol)
 .decl {{ cpred }}_asserted(i: identifier)
+{% if gen.is_output(c) %}
 .output {{ cpred }}
+{% endif %}
+{% if gen.partitioned %}
+{{ cpred }}_asserted(i) :- {{ gen.type_partition() }}(i, "{{ gen.uri(c) }}").
+{% endif %}
+{% if gen.reads_triples() %}
 {{ cpred }}_asserted(i) :- triple(i, RDF_TYPE, "{{ gen.uri(c) }}").
-{{ cpred }}(i) :- {{ cpred }}_asserted(i).
-{% if c.is_a %}
-{{ gen.pred(c.is_a) }}(i) :- {{ cpred }}(i).
 {% endif %}
-{% for p in c.mixins %}
-{{ gen.pred(p) }}(i) :- {{ cpred }}(i).
+{% for a in gen.class_ancestors(c) %}
+class_subsumed_by("{{ gen.uri(c) }}", "{{ gen.pred(a) }}").
 {% endfor %}
+{% if gen.partitioned %}
+{{ cpred }}(i) :- {{ gen.type_partition() }}(i, x), class_subsumed_by(x, "{{ cpred }}").
+{% endif %}
+{% if gen.reads_triples() %}
+{{ cpred }}(i) :- triple(i, RDF_TYPE, x), class_subsumed_by(x, "{{ cpred }}").
+{% endif %}
+{% if gen.is_derived(c) %}
+// members derived by rules are added to each ancestor directly
+{% for a in gen.class_ancestors(c) if a != c.name %}
+{{ gen.pred(a) }}(i) :- {{ cpred }}(i).
+{% endfor %}
+{% endif %}
 
 
 {% if gen.reification_of(c.name) %}
@@ -181,7 +196,7 @@ triple(i, p, v) :-
 {{ cpred }}(i) :-
     {{ gen.pred(c.is_a) }}(i)
     {% for ds in c.defining_slots %}
-    {% set islot = schemaview.induced_slot(ds, c.name) %}
+    {% set islot = gen.induced_slot(ds, c.name) %}
     {% set spred = gen.pred(islot) %}
     {% if islot.subproperty_of %}
     , {{ spred }}(i, v_{{ spred }}), uri_subsumed_by(v_{{ spred }}, "{{ gen.uri(islot.subproperty_of) }}")
@@ -192,17 +207,22 @@ triple(i, p, v) :-
     .
 {% endif %}
 
-{% for s in schemaview.class_induced_slots(c.name) %}
+{% for s in gen.class_induced_slots(c.name) %}
 {% set spred = gen.class_slot_pred(c, s) -%}
+{% set cslot = gen.class_slot_atom(c, s) -%}
 {% set dltype = gen.datalog_type(s) %}
 // CLASS_SLOT {{s.name}} TYPE: {{ dltype }}
+{%- if not gen.wide %}
 .decl {{ spred }}_asserted(i: identifier, v: {{ dltype }})
 .decl {{ spred }}(i: identifier, v: {{ dltype }})
+{% if gen.is_output(c, s) %}
 .output {{ spred }}
 .output {{ spred }}_asserted
+{% endif %}
 {{ spred }}(i, v) :- 
     {{ spred }}_asserted(i, v).
-{{ spred }}_asserted(i, v) :- 
+{%- endif %}
+{{ gen.class_slot_atom(c, s, asserted=True) }}i, v) :- 
     {{ cpred }}(i),
     {{ gen.pred(s) }}(i, v).
 // TODO: inferring default values
@@ -219,11 +239,11 @@ triple(i, p, v) :-
 {% set classified_from = s.annotations['classified_from'].value %}
 {% set enum = schemaview.get_enum(s.range) %}
 // CLASSIFYING CATEGORY FROM OTHER SLOT {{enum.name}} . {{classified_from}}
-{% for pv in enum.permissible_values.values() %}
+{% for pv in gen.permissible_values(enum) %}
 // PV = {{pv.text}}
 {% if 'expr' in pv.annotations %}
 {% set expr = pv.annotations['expr'] %}
-{{ spred }}(i, "{{ gen.uri(pv) }}" ) :-
+{{ cslot }}i, "{{ gen.uri(pv) }}" ) :-
      {{ classified_from }}(i, v),
      {{expr.value}} .
 {% endif %}
@@ -237,11 +257,10 @@ validation_result(
   "{{ cpred }}",
   "{{ s.name }}",
   "",
-  //v1,
-  "got two distinct values for subject and predicate") :-
-    {{ spred }}(i, v1),
-    {{ spred }}(i, v2),
-    v1 != v2. 
+  cat("got ", to_string(n), " distinct values for subject and predicate")) :-
+    {{ cpred }}(i),
+    n = count : { {{ cslot }}i, _) },
+    n > 1.
 {% endif %}
 
 {% if s.required %}
@@ -253,7 +272,7 @@ validation_result(
   "",
   "") :-
     {{ cpred }}(i),
-    ! {{spred}}(i, _).
+    ! {{ cslot }}i, _).
 {% endif %}
 
 {% if s.maximum_value %}
@@ -265,11 +284,11 @@ validation_result(
   to_string(v),
   "Maximum is {{s.maximum_value}}") :-
     {{ cpred }}(i),
-    {{spred}}(i, v),
+    {{ cslot }}i, v),
     v > {{ s.maximum_value }}.
 {% endif %}
 
-{% if s.range and not s.range in schemaview.all_types() %}
+{% if s.range and not gen.is_type(s.range) %}
 validation_result(
   "sh:ClassConstraintComponent",
   i,
@@ -278,7 +297,7 @@ validation_result(
   v,
   "Expected range is {{s.range}}") :-
     {{ cpred }}(i),
-    {{spred}}(i, v),
+    {{ cslot }}i, v),
     ! {{ gen.pred(s.range) }}(v).
 {% endif %}
 
@@ -287,55 +306,205 @@ validation_result(
 
 
 
+{% endmacro %}"""
+
+header = """
+
+
+/**
+ Schema: {{schema.name}}
+*/
+
+// Declarations
+#define RDF_TYPE "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+.type identifier = symbol
+.type value = symbol
+
+// Mapping from RDF
+.decl triple(s:symbol, p:symbol, o:symbol)
+.input triple
+.decl literal_number(s:symbol, o:number)
+.input literal_number
+.decl literal_symbol(s:symbol, o:symbol)
+.input literal_symbol
+.decl literal_datatype(s:symbol, dt:symbol)
+.input literal_datatype
+{%- if gen.partitioned %}
+
+// Triples partitioned by predicate: (subject, object) rows for each predicate, and
+// (subject, value) rows for literal objects; triple only holds triples derived by rules
+{% for rel, dltype in gen.partitions() %}
+.decl {{ rel }}(s:symbol, o:{{ dltype }})
+.input {{ rel }}
 {% endfor %}
+{% if gen.reads_all_triples() %}
+// triples of the schema's predicates, for rules that read triples with any predicate
+{% for rel, uri in gen.triple_partitions() %}
+triple(s, "{{ uri }}", o) :- {{ rel }}(s, o).
+{% endfor %}
+{% endif %}
+{%- endif %}
+
+// closures of the slot and class hierarchies, as facts computed from the schema:
+// slot URIs and the slot URIs they are subsumed by, and class URIs and the classes they are subsumed by
+.decl uri_subsumed_by(s:symbol, o:symbol)
+.decl class_subsumed_by(s:symbol, c:symbol)
+// datatypes of the literals accepted by each type, see the types block
+.decl type_datatype(t:symbol, dt:symbol)
+
+.decl validation_result(type: symbol, subject: symbol, instantiates: symbol, path: symbol, value: symbol, info:symbol)
+.output validation_result
+{%- if gen.wide %}
+
+// Values of slots for instances of each class, keyed by class and slot
+{% for rel, dltype in [('class_slot', 'symbol'), ('class_slot_number', 'number')] %}
+.decl {{ rel }}_asserted(c: symbol, s: symbol, i: identifier, v: {{ dltype }})
+.decl {{ rel }}(c: symbol, s: symbol, i: identifier, v: {{ dltype }})
+{% if gen.outputs != 'validation' %}
+.output {{ rel }}
+.output {{ rel }}_asserted
+{% endif %}
+{{ rel }}(c, s, i, v) :- {{ rel }}_asserted(c, s, i, v).
+{% endfor %}
+{%- endif %}
+
+
+{% if 'datalog' in schemaview.schema.annotations %}
+// ------------------
+// -- SCHEMA RULES --
+// ------------------
+{{ schemaview.schema.annotations['datalog'].value }}
+{% endif %}
+
+// -------------
+// -- Slots --
+// -------------
+"""
+
+footer = """
 // end of classes block
 
 // -------------
 // -- Types --
 // -------------
-{% for t in schemaview.all_types().values() %}
+{% for t in gen.all_types() %}
 {% set type_type = gen.type_to_datalog_type(t) %}
 // Type: {{t.name}} . {{ type_type }}
-//{% set tpred = gen.pred(t) -%}
-//.decl {{ tpred }}(i: {{type_type}})
-//{% if type_type == 'number' %}
-//{% endif %}
-//{{ tpred }}(i) :- literal_symbol(i, _).
-//{{ tpred }}(i) :- literal_number(i, _).
-// TODO!
+{% for dt in gen.type_datatypes(t) %}
+type_datatype("{{ gen.pred(t) }}", "{{ dt }}").
+{% endfor %}
 {% endfor %}
 // end of types block
 
 // -------------
 // -- Enums --
 // -------------
-{% for e in schemaview.all_enums().values() %}
+{% for e in gen.all_enums() %}
 // Enum: {{e.name}}
 {% set epred = gen.pred(e) -%}
 .decl {{ epred }}(i: symbol)
-{{ epred }}(i) :- literal_symbol(i, _).
-// TODO!
-{% for pv in e.permissible_values.values() %}
+{% if e.permissible_values %}
+.decl {{ epred }}_pv(v: symbol)
+{{ epred }}(i) :- {{ epred }}_pv(v), literal_symbol(i, v).
+{% for pv in gen.permissible_values(e) %}
+{{ epred }}_pv({{ gen.string_constant(pv.text) }}).
 {% if pv.meaning %}
 {{ epred }}("{{ gen.meaning_uri(pv.meaning) }}").
-{% else %}
 {% endif %}
 {% endfor %}
+{% else %}
+// no permissible values, so any literal is a member
+{{ epred }}(i) :- literal_symbol(i, _).
+{% endif %}
 {% endfor %}
 // end of enums block
 
 """
 
-@dataclass
-class Reification:
-    subject: SlotDefinitionName = None
-    predicate: SlotDefinitionName = None
-    object: SlotDefinitionName = None
+classes_header = """
+// end of slots block
+
+// -------------
+// -- CLASSES --
+// -------------
+"""
+
+# the monolithic program: rules for each slot and class, followed by types and enums
+template = (macros + slot_macro + class_macro + header +
+            """{% for s in gen.all_slots() %}{{ slot_rules(s) }}{% endfor %}""" + classes_header +
+            """{% for c in gen.all_classes() %}{{ class_rules(c) }}{% endfor %}""" + footer)
+
+# modules of a modular program: the main module includes the modules for slot groups and classes
+main_module_template = (macros + header +
+                        """{% for path in slot_modules %}\n#include "{{ path }}"{% endfor %}\n""" + classes_header +
+                        """{% for path in class_modules %}\n#include "{{ path }}"{% endfor %}\n""" + footer)
+
+slots_module_template = macros + slot_macro + """{% for s in slots %}{{ slot_rules(s) }}{% endfor %}"""
+
+class_module_template = macros + class_macro + """{{ class_rules(c) }}"""
+
+MAIN_MODULE = 'schema.dl'
+MANIFEST = 'manifest.json'
+
+OUTPUT_ALL = 'all'
+OUTPUT_VALIDATION = 'validation'
+ENCODING_RELATIONS = 'relations'
+ENCODING_WIDE = 'wide'
+# how the closures of slots are computed, see DatalogGenerator.slot_encoding
+SLOT_RULES = 'rules'
+SLOT_LINEAR = 'linear'
+SLOT_EQREL = 'eqrel'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+PROGRAM_CACHE_SIZE = 32
+# datatypes of values that are URIs rather than literals, and datatypes of literals read as numbers
+URI_DATATYPES = {'rdfs:Resource', 'xsd:anyURI'}
+NUMERIC_DATATYPES = [str(XSD[name]) for name in [
+    'byte', 'decimal', 'double', 'float', 'int', 'integer', 'long', 'negativeInteger', 'nonNegativeInteger',
+    'nonPositiveInteger', 'positiveInteger', 'short', 'unsignedByte', 'unsignedInt', 'unsignedLong',
+    'unsignedShort']]
+
+
+@lru_cache()
+def compiled_template(text: str = template) -> Template:
+    return Template(text)
+
 
 class DatalogGenerator(Generator):
     """
     Generates Souffle datalog from a LinkML schema where the domain of discourse is RDF triples
 
+    The relations declared as .output can be restricted with outputs, which is one of:
+
+     - 'all': every slot, class and class-slot relation (the default)
+     - 'validation': validation_result only
+     - a collection of class and slot names: the relations for those classes and
+       slots, and the class-slot relations involving any of them
+
+    validation_result is always output
+
+    The values of slots for instances of each class are encoded in one of two ways:
+
+     - 'relations': a pair of relations per class and induced slot, {Class}_{slot} and
+       {Class}_{slot}_asserted (the default)
+     - 'wide': four relations for all classes and slots, class_slot(c, s, i, v) and
+       class_slot_number(c, s, i, v) and their _asserted forms, where c and s are the
+       names of the per-pair relations; with outputs other than 'validation', all four are output
+
+    If partitioned is set, the program reads facts partitioned by predicate (see
+    TupleDumper): slot and class rules read the relation for their slot or rdf:type
+    rather than joining through triple and the literal relations
+
+    If quads is set, the program reads facts about many named graphs (see TupleDumper), and
+    evaluates each graph in isolation: triple and every relation derived from it, including
+    validation_result, have a leading graph column (see add_graph_column). Literal relations and
+    facts computed from the schema are shared by all graphs. Quads cannot be written as modules
+
+    An index over the schema can be passed in, e.g. one loaded from a snapshot
+
+    As well as a single program, the generator can write a modular program (see write_modules):
+    a main module that includes one module per slot group and per class, so that a schema
+    change only rewrites the modules it affects
     """
     generatorname = os.path.basename(__file__)
     generatorversion = "0.1.1"
@@ -345,38 +514,180 @@ class DatalogGenerator(Generator):
     type_field_uris: List[str] = []
     schemaview: SchemaView = []
 
-    def __init__(self, schema: Union[str, TextIO, SchemaDefinition], format: str = valid_formats[0], **kwargs) -> None:
+    def __init__(self, schema: Union[str, TextIO, SchemaDefinition], format: str = valid_formats[0],
+                 outputs: Union[str, Iterable[str]] = OUTPUT_ALL, index: SchemaIndex = None,
+                 encoding: str = ENCODING_RELATIONS, partitioned: bool = False, quads: bool = False,
+                 **kwargs) -> None:
+        if encoding not in (ENCODING_RELATIONS, ENCODING_WIDE):
+            raise ValueError(f'Unknown encoding: {encoding}')
         self.format = format
+        self.encoding = encoding
+        self.partitioned = partitioned
+        self.quads = quads
+        self._derived_classes = None
+        self._reifications: Optional[List[Reification]] = None
+        self._schema_rules_parsed = False
+        self._schema_rules: Optional[Program] = None
         self.schemaview = SchemaView(schema)
+        self.index = index if index is not None else SchemaIndex(self.schemaview)
+        if isinstance(outputs, str) and outputs not in (OUTPUT_ALL, OUTPUT_VALIDATION):
+            outputs = [outputs]
+        self.outputs = outputs if isinstance(outputs, str) else set(outputs)
 
     def serialize(self, **kwargs) -> str:
-        sv = self.schemaview
-        template_obj = Template(template)
+        template_obj = compiled_template()
         code = template_obj.render(schemaview=self.schemaview,
                                    schema=self.schemaview.schema,
                                    gen=self)
+        if self.quads:
+            code = add_graph_column(parse_program(code), self.graph_relations()).to_souffle()
         return code
 
+    def slot_groups(self) -> Dict[SlotDefinitionName, List[SlotDefinition]]:
+        """
+        Slots grouped by the root of their is_a chain
 
-    def pred(self, el: Union[Element, ElementName]) -> str:
+        A slot and its descendants share rules (values of a slot are values of its parents),
+        so they are kept in one module
+        """
         sv = self.schemaview
-        sv: SchemaView
+        groups = {}
+        for s in self.all_slots():
+            root = s
+            while root.is_a and sv.get_slot(root.is_a) is not None:
+                root = sv.get_slot(root.is_a)
+            groups.setdefault(root.name, []).append(s)
+        return groups
+
+    def serialize_modules(self) -> Dict[str, str]:
+        """
+        Generates the program as modules
+
+        :return: text of each module, keyed by path relative to the main module
+        """
+        if self.quads:
+            raise ValueError('Programs over quads cannot be written as modules')
+        args = dict(schemaview=self.schemaview, schema=self.schemaview.schema, gen=self)
+        modules = {}
+        for root, slots in self.slot_groups().items():
+            modules[f'slots/{self.pred(root)}.dl'] = compiled_template(slots_module_template).render(slots=slots, **args)
+        for c in self.all_classes():
+            modules[f'classes/{self.pred(c)}.dl'] = compiled_template(class_module_template).render(c=c, **args)
+        main = compiled_template(main_module_template).render(
+            slot_modules=[path for path in modules if path.startswith('slots/')],
+            class_modules=[path for path in modules if path.startswith('classes/')],
+            **args)
+        modules[MAIN_MODULE] = main
+        return modules
+
+    def write_modules(self, directory: str) -> List[str]:
+        """
+        Writes a modular program to a directory, together with a manifest of module hashes
+
+        Modules whose hash is unchanged since the last write are left untouched, and modules
+        for elements no longer in the schema are removed. The main module is MAIN_MODULE,
+        which souffle can be run on directly.
+
+        :param directory: directory for the main module
+        :return: paths of modules that were written or removed
+        """
+        manifest_path = os.path.join(directory, MANIFEST)
+        previous = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as stream:
+                previous = json.load(stream).get('modules', {})
+        hashes = {}
+        changed = []
+        for path, text in self.serialize_modules().items():
+            hashes[path] = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            full_path = os.path.join(directory, path)
+            if previous.get(path) != hashes[path] or not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                with open(full_path, 'w') as stream:
+                    stream.write(text)
+                changed.append(path)
+        for path in sorted(set(previous) - set(hashes)):
+            full_path = os.path.join(directory, path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+            changed.append(path)
+        with open(manifest_path, 'w') as stream:
+            json.dump({'generator_version': self.generatorversion, 'modules': hashes}, stream, indent=2, sort_keys=True)
+        return changed
+
+    def pred(self, el: Union[Element, ElementName]) -> str:
         if el == '':
             return 'NONE'
-        if not isinstance(el, Element):
-            if sv.get_element(el) is None:
-                logging.error(f'No such element: "{el}" // {type(el)}')
-                return 'UNDEFINED'
-            el = sv.get_element(el)
-        if isinstance(el, SlotDefinition):
-            pred = underscore(el.name)
-        else:
-            pred = camelcase(el.name)
+        if isinstance(el, Element):
+            return element_pred(el)
+        pred = self.index.pred(el)
+        if pred is None:
+            logging.error(f'No such element: "{el}" // {type(el)}')
+            return 'UNDEFINED'
         return pred
 
+    # elements are rendered in order of name, so that the program text does not
+    # depend on the order in which the schema and its imports were loaded
+
+    def all_slots(self) -> List[SlotDefinition]:
+        return sorted(self.schemaview.all_slots().values(), key=lambda x: x.name)
+
+    def all_classes(self) -> List[ClassDefinition]:
+        return sorted(self.schemaview.all_classes().values(), key=lambda x: x.name)
+
+    def class_induced_slots(self, cn: ClassDefinitionName) -> List[SlotDefinition]:
+        return sorted(self.index.class_induced_slots(cn), key=lambda x: x.name)
+
+    def induced_slot(self, sn: SlotDefinitionName, cn: ClassDefinitionName) -> SlotDefinition:
+        return self.index.induced_slot(sn, cn)
+
+    def is_type(self, name: Optional[str]) -> bool:
+        return self.index.is_type(name)
+
+    def all_types(self) -> List[TypeDefinition]:
+        return sorted(self.schemaview.all_types().values(), key=lambda x: x.name)
+
+    def all_enums(self) -> List[EnumDefinition]:
+        return sorted(self.schemaview.all_enums().values(), key=lambda x: x.name)
+
+    def permissible_values(self, e: EnumDefinition) -> List[PermissibleValue]:
+        return sorted(e.permissible_values.values(), key=lambda x: x.text)
+
+    def string_constant(self, text: str) -> str:
+        """
+        Souffle string constant for a text, with quotes and backslashes escaped
+        """
+        return str(Constant(text))
+
+    def is_output(self, *elements: Union[Element, ElementName]) -> bool:
+        """
+        True if the relation for a class, slot, or class-slot pair is selected for output
+        """
+        if self.outputs == OUTPUT_ALL:
+            return True
+        if self.outputs == OUTPUT_VALIDATION:
+            return False
+        return any((el.name if isinstance(el, Element) else el) in self.outputs for el in elements)
+
     def class_slot_pred(self, c: Union[ClassDefinition, ClassDefinitionName], s: Union[SlotDefinition, SlotDefinitionName]) -> str:
         return f'{self.pred(c)}_{self.pred(s)}'
 
+    @property
+    def wide(self) -> bool:
+        return self.encoding == ENCODING_WIDE
+
+    def class_slot_atom(self, c: ClassDefinition, s: SlotDefinition, asserted: bool = False) -> str:
+        """
+        Opening of an atom for the values of a slot for instances of a class, up to the subject and value arguments
+
+        e.g. Person_age_in_years( or class_slot_number("Person", "age_in_years",
+        """
+        suffix = '_asserted' if asserted else ''
+        if not self.wide:
+            return f'{self.class_slot_pred(c, s)}{suffix}('
+        rel = 'class_slot_number' if self.datalog_type(s) == 'number' else 'class_slot'
+        return f'{rel}{suffix}("{self.pred(c)}", "{self.pred(s)}", '
+
     def uri(self, el: Union[Element, ElementName, PermissibleValue]) -> str:
         sv = self.schemaview
         sv: SchemaView
@@ -388,17 +699,13 @@ class DatalogGenerator(Generator):
         if el is None:
             logging.error(f'NONE')
             return 'NONE'
-        return sv.get_uri(el, expand=True)
+        return self.index.uri(el)
 
     def meaning_uri(self, curie: str):
-        return self.schemaview.expand_curie(curie)
+        return self.index.expand_curie(curie)
 
     def domains(self, slot: SlotDefinition) -> List[ClassDefinitionName]:
-        sv = self.schemaview
-        domains = []
-        for cn in sv.all_classes().keys():
-            if slot.name in sv.class_slots(cn, direct=True):
-                domains.append(cn)
+        domains = list(self.index.slot_domains(slot.name))
         if slot.domain:
             domains.append(slot.domain)
         return domains
@@ -417,12 +724,180 @@ class DatalogGenerator(Generator):
             raise ValueError(f'No range for slot {sn}')
 
     def datalog_type(self, s: Union[SlotDefinition, SlotDefinitionName]) -> str:
-        sv = self.schemaview
         if not isinstance(s, SlotDefinition):
-            s = sv.get_slot(s)
-        if s.range in sv.all_types():
-            return self.type_to_datalog_type(s.range)
-        return 'identifier'
+            s = self.schemaview.get_slot(s)
+        return self.index.datalog_type(s)
+
+    def slot_uri_ancestors(self, s: SlotDefinition) -> List[str]:
+        return self.index.slot_uri_ancestors(self.uri(s))
+
+    def class_ancestors(self, c: ClassDefinition) -> List[ClassDefinitionName]:
+        """
+        Ancestors of a class through is_a and mixins, including the class itself, in order of name
+        """
+        return sorted(self.index.class_ancestors(c.name))
+
+    def is_derived(self, c: ClassDefinition) -> bool:
+        """
+        True if members of a class may be derived by rules, rather than only from rdf:type triples
+
+        Members of a class with defining slots are classified by rule, and rules in the
+        schema's datalog annotation may derive members of any class
+        """
+        if self._derived_classes is None:
+            self._derived_classes = {cn for cn, cls in self.schemaview.all_classes().items() if cls.defining_slots}
+            heads = self.schema_rule_heads()
+            if heads is None:
+                logging.warning('Treating all classes as derived; could not parse schema rules')
+                self._derived_classes = set(self.schemaview.all_classes())
+            else:
+                self._derived_classes.update(cn for cn in self.schemaview.all_classes() if self.pred(cn) in heads)
+        return c.name in self._derived_classes
+
+    def schema_rules(self) -> Optional[Program]:
+        """
+        The rules in the schema's datalog annotation
+
+        :return: parsed rules, or None if the rules cannot be parsed
+        """
+        if not self._schema_rules_parsed:
+            self._schema_rules_parsed = True
+            self._schema_rules = Program()
+            if 'datalog' in self.schemaview.schema.annotations:
+                try:
+                    self._schema_rules = parse_program(self.schemaview.schema.annotations['datalog'].value)
+                except Exception as e:
+                    logging.warning(f'Could not parse schema rules: {e}')
+                    self._schema_rules = None
+        return self._schema_rules
+
+    def schema_rule_heads(self) -> Optional[Set[str]]:
+        """
+        Relations derived by the rules in the schema's datalog annotation
+
+        :return: relation names, or None if the rules cannot be parsed
+        """
+        program = self.schema_rules()
+        if program is None:
+            return None
+        return {r.head.relation for r in program.rules}
+
+    def reifications(self) -> List[Reification]:
+        if self._reifications is None:
+            self._reifications = [r for r in (self.reification_of(c.name) for c in self.all_classes()) if r is not None]
+        return self._reifications
+
+    def reads_triples(self) -> bool:
+        """
+        True if slot and class rules read triple
+
+        Unless facts are partitioned, all triples are in triple. Otherwise it only holds
+        triples derived by rules: by de-reification, or by the schema's rules
+        """
+        if not self.partitioned:
+            return True
+        heads = self.schema_rule_heads()
+        return heads is None or 'triple' in heads or len(self.reifications()) > 0
+
+    def reads_all_triples(self) -> bool:
+        """
+        True if partitioned facts must also be put in triple, for rules that read triples with any predicate
+
+        These are the rules that de-reify relationship objects without a subject slot, which
+        find the subject through any triple, and any of the schema's rules that read triple
+        """
+        if any(r.subject is None for r in self.reifications()):
+            return True
+        program = self.schema_rules()
+        if program is None:
+            return True
+        for rule in program.rules:
+            for lit in rule.body:
+                atom = lit.atom if isinstance(lit, Negation) else lit
+                if isinstance(atom, Atom) and atom.relation == 'triple':
+                    return True
+        return False
+
+    def partition(self, s: Union[SlotDefinition, SlotDefinitionName]) -> str:
+        """
+        Relation holding the asserted values of a slot, when facts are partitioned by predicate
+        """
+        dltype = self.datalog_type(s)
+        if dltype == 'identifier':
+            kind = PARTITION_OBJECT
+        elif dltype == 'number':
+            kind = PARTITION_NUMBER
+        else:
+            kind = PARTITION_SYMBOL
+        return partition_relation(self.uri(s), kind)
+
+    def object_partition(self, s: Union[SlotDefinition, SlotDefinitionName]) -> str:
+        """
+        Relation holding the objects of all triples of a slot, when facts are partitioned by predicate
+        """
+        return partition_relation(self.uri(s))
+
+    def type_partition(self) -> str:
+        return partition_relation(RDF_TYPE)
+
+    def triple_partitions(self) -> List[Tuple[str, str]]:
+        """
+        Object relations for rdf:type and each slot URI, with the URI, in order of relation name
+        """
+        uris = {self.uri(s) for s in self.all_slots()} | {RDF_TYPE}
+        return sorted((partition_relation(uri), uri) for uri in uris)
+
+    def partitions(self) -> List[Tuple[str, str]]:
+        """
+        Partitioned input relations that the program reads, with the type of their value column
+        """
+        relations = {self.type_partition(): 'symbol'}
+        for s in self.all_slots():
+            rel = self.partition(s)
+            relations[rel] = 'number' if rel.endswith(f'_{PARTITION_NUMBER}') else 'symbol'
+            if self.checks_datatype(s):
+                relations[self.object_partition(s)] = 'symbol'
+        if self.reads_all_triples():
+            for rel, _ in self.triple_partitions():
+                relations[rel] = 'symbol'
+        return sorted(relations.items())
+
+    def graph_relations(self) -> List[str]:
+        """
+        Input relations with a graph column when reading quads: triple, and any partitioned relations
+        """
+        relations = ['triple']
+        if self.partitioned:
+            relations += [rel for rel, _ in self.partitions()]
+        return relations
+
+    def slot_encoding(self, s: SlotDefinition) -> str:
+        """
+        How the closure of a slot is computed
+
+        - eqrel: symmetric transitive slots between identifiers are souffle equivalence relations
+        - linear: other transitive slots extend paths by one edge at a time, from a separate edge relation
+        - rules: anything else, including slots that schema rules derive values for
+        """
+        if not self.is_transitive(s):
+            return SLOT_RULES
+        if s.symmetric:
+            return SLOT_EQREL if self.datalog_type(s) == 'identifier' else SLOT_RULES
+        heads = self.schema_rule_heads()
+        if heads is None or self.pred(s) in heads:
+            return SLOT_RULES
+        return SLOT_LINEAR
+
+    def slot_head(self, s: Union[SlotDefinition, SlotDefinitionName]) -> str:
+        """
+        Relation that rules deriving values of a slot write to
+
+        For linearly recursive slots this is the edge relation that the closure is computed from
+        """
+        if not isinstance(s, SlotDefinition):
+            s = self.schemaview.get_slot(s)
+        pred = self.pred(s)
+        return f'{pred}_edge' if self.slot_encoding(s) == SLOT_LINEAR else pred
 
     def parents(self, e: Definition) -> List[DefinitionName]:
         sv = self.schemaview
@@ -452,53 +927,101 @@ class DatalogGenerator(Generator):
         sv = self.schemaview
         if not isinstance(t, TypeDefinition):
             t = sv.get_type(t)
-        if t.base == 'int' or t.base == 'float' or t.base == 'Decimal':
-            return 'number'
-        else:
-            return 'symbol'
+        return type_datalog_type(t)
 
     def type_is_numeric(self, t: Union[TypeDefinition, TypeDefinitionName]) -> bool:
         return self.type_to_datalog_type(t) == 'number'
 
-    def reification_of(self, cn: ClassDefinitionName) -> Optional[Reification]:
+    def type_datatypes(self, t: Union[TypeDefinition, TypeDefinitionName]) -> List[str]:
         """
-        TODO: move to schemaview
+        Datatypes of the literals accepted as values of a type
+
+        Values are dumped as literals with the type's uri as datatype, except for types whose
+        values are URIs (see ObjectWalker). Numeric types accept any numeric datatype, since
+        their values are read as numbers whatever the datatype, e.g. 1.5 in Turtle is an xsd:decimal
+
+        :return: expanded datatype URIs, or an empty list if values of the type are not literals
+          or the type has no uri
         """
-        sv = self.schemaview
-        if sv.is_relationship(cn):
-            islots = sv.class_induced_slots(cn)
-            su = None
-            pr = None
-            ob = None
-            for islot in islots:
-                for anc in sv.class_ancestors(cn):
-                    slot_uri = sv.induced_slot(islot.name, anc).slot_uri
-                    if slot_uri == 'rdf:subject':
-                        su = islot
-                    if slot_uri == 'rdf:predicate':
-                        pr = islot
-                    if slot_uri == 'rdf:object':
-                        ob = islot
-            if pr is None:
-                logging.error(f'No predicate for {cn}')
-                return None
-            if ob is None:
-                logging.error(f'No object for {cn}')
-                return None
-            reif = Reification(subject=su,
-                               predicate=pr,
-                               object=ob)
-            return reif
-        else:
-            return None
+        if not isinstance(t, TypeDefinition):
+            t = self.schemaview.get_type(t)
+        if t is None or not t.uri or t.uri in URI_DATATYPES:
+            return []
+        if self.type_is_numeric(t):
+            return NUMERIC_DATATYPES
+        return [self.meaning_uri(t.uri)]
+
+    def checks_datatype(self, s: SlotDefinition) -> bool:
+        """
+        True if the datatypes of literal values of a slot are checked against its range
+        """
+        return self.is_type(s.range) and len(self.type_datatypes(s.range)) > 0
 
+    def reification_of(self, cn: ClassDefinitionName) -> Optional[Reification]:
+        return self.index.reification_of(cn)
+
+
+_program_cache: OrderedDict = OrderedDict()
+
+
+def generate_program(sv: SchemaView, outputs: Union[str, Iterable[str]] = OUTPUT_ALL, digest: str = None,
+                     index: SchemaIndex = None, encoding: str = ENCODING_RELATIONS, partitioned: bool = False,
+                     quads: bool = False) -> str:
+    """
+    Generates the datalog program for a schema, reusing the program generated for identical schemas
+
+    Programs are keyed by the schema content, the generator version, the output selection, the encoding
+    and whether facts are partitioned or quads.
+    Generation works on a copy of the schema, so the schema object is never modified.
+
+    :param sv:
+    :param outputs: relations to output
+    :param digest: schema digest, if already known
+    :param index: index over an identical schema, if already built
+    :param encoding: encoding of class-slot relations
+    :param partitioned: read facts partitioned by predicate
+    :param quads: read facts about many named graphs, with a graph column
+    :return: program text
+    """
+    selection = outputs if isinstance(outputs, str) else ','.join(sorted(outputs))
+    if digest is None:
+        digest = schema_digest(sv)
+    key = (digest, DatalogGenerator.generatorversion, selection, encoding, partitioned, quads)
+    program = _program_cache.get(key)
+    if program is None:
+        program = DatalogGenerator(deepcopy(sv.schema), outputs=outputs, index=index, encoding=encoding,
+                                   partitioned=partitioned, quads=quads).serialize()
+        _program_cache[key] = program
+        while len(_program_cache) > PROGRAM_CACHE_SIZE:
+            _program_cache.popitem(last=False)
+    else:
+        _program_cache.move_to_end(key)
+    return program
 
 
 @shared_arguments(DatalogGenerator)
 @click.command()
-def cli(yamlfile, dir, **kwargs):
+@click.option('--outputs', default=OUTPUT_ALL, show_default=True,
+              help="Relations to output: 'all', 'validation', or a comma-separated list of class and slot names")
+@click.option('--dir', '-d',
+              help=f'Directory to write a modular program to, with {MAIN_MODULE} as the main module')
+@click.option('--encoding', type=click.Choice([ENCODING_RELATIONS, ENCODING_WIDE]), default=ENCODING_RELATIONS,
+              show_default=True, help='Encoding of the values of slots for instances of each class')
+@click.option('--partitioned/--no-partitioned', default=False, show_default=True,
+              help='Read facts partitioned by predicate, as written by the tuple dumper')
+@click.option('--quads/--no-quads', default=False, show_default=True,
+              help='Read facts about many named graphs, and evaluate each graph in isolation')
+def cli(yamlfile, dir, outputs, encoding, partitioned, quads, **kwargs):
     """ Generate Souffle datalog from a LinkML schema """
-    print(DatalogGenerator(yamlfile, **kwargs).serialize(**kwargs))
+    if outputs not in (OUTPUT_ALL, OUTPUT_VALIDATION):
+        outputs = outputs.split(',')
+    gen = DatalogGenerator(yamlfile, outputs=outputs, encoding=encoding, partitioned=partitioned, quads=quads,
+                           **kwargs)
+    if dir:
+        for path in gen.write_modules(dir):
+            print(path)
+    else:
+        print(gen.serialize(**kwargs))
 
 
 if __name__ == '__main__':
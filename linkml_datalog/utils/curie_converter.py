@@ -0,0 +1,47 @@
+from typing import Dict
+
+
+class CurieConverter:
+    """
+    Expands CURIEs to URIs and compacts URIs to CURIEs, using a prefix map
+
+    Results are memoized, since the same identifiers are converted many times
+    when writing inferred values back to objects
+    """
+
+    def __init__(self, prefix_map: Dict[str, str]):
+        self.prefix_map = dict(prefix_map)
+        # longest namespaces first, so that the most specific prefix is used when compacting
+        self._namespaces = sorted(((ns, pfx) for pfx, ns in self.prefix_map.items() if ns),
+                                  key=lambda x: -len(x[0]))
+        self._expanded: Dict[str, str] = {}
+        self._compacted: Dict[str, str] = {}
+
+    def expand(self, curie: str) -> str:
+        """
+        Expands a CURIE; values that are not CURIEs with a known prefix are returned unchanged
+        """
+        uri = self._expanded.get(curie)
+        if uri is None:
+            uri = curie
+            if ':' in curie:
+                pfx, local = curie.split(':', 1)
+                ns = self.prefix_map.get(pfx)
+                if ns is not None and not local.startswith('//'):
+                    uri = ns + local
+            self._expanded[curie] = uri
+        return uri
+
+    def compact(self, uri: str) -> str:
+        """
+        Compacts a URI; URIs not in any namespace are returned unchanged
+        """
+        curie = self._compacted.get(uri)
+        if curie is None:
+            curie = uri
+            for ns, pfx in self._namespaces:
+                if uri.startswith(ns):
+                    curie = f'{pfx}:{uri[len(ns):]}'
+                    break
+            self._compacted[uri] = curie
+        return curie
@@ -0,0 +1,349 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass
+from importlib.metadata import version
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from linkml_runtime.dumpers import json_dumper
+from linkml_runtime.linkml_model.meta import ClassDefinition, ClassDefinitionName, Element, ElementName, \
+    SlotDefinition, SlotDefinitionName, TypeDefinition
+from linkml_runtime.utils.formatutils import camelcase, underscore
+from linkml_runtime.utils.schemaview import SchemaView
+
+# increment when the contents of SchemaIndex change, so that older snapshots are not loaded
+SNAPSHOT_VERSION = 3
+
+
+@dataclass
+class Reification:
+    subject: SlotDefinitionName = None
+    predicate: SlotDefinitionName = None
+    object: SlotDefinitionName = None
+
+
+REIFICATION_SLOT_URIS = {
+    'rdf:subject': 'subject',
+    'rdf:predicate': 'predicate',
+    'rdf:object': 'object',
+}
+
+
+class SchemaIndex:
+    """
+    Indexes over a SchemaView, each computed at most once
+
+    SchemaView memoizes induced slots and class slots in bounded caches, which are
+    too small for large schemas, so generating from a schema like Biolink recomputes
+    them over and over. The index keeps every result for the lifetime of a generator,
+    and inverts the class-to-slot mapping so that the domains of a slot are a lookup
+    rather than a scan over all classes
+
+    A fully built index can be saved as a snapshot and loaded by later processes,
+    see load_schema_index
+    """
+
+    def __init__(self, schemaview: SchemaView):
+        self.schemaview = schemaview
+        self._slot_domains: Optional[Dict[SlotDefinitionName, List[ClassDefinitionName]]] = None
+        self._types: Optional[Dict[str, TypeDefinition]] = None
+        self._classes: Optional[Set[ClassDefinitionName]] = None
+        self._preds: Dict[ElementName, str] = {}
+        self._uris: Dict[Tuple[str, ElementName], str] = {}
+        self._expanded: Dict[str, str] = {}
+        self._induced_slots: Dict[Tuple[SlotDefinitionName, ClassDefinitionName], SlotDefinition] = {}
+        self._class_induced_slots: Dict[ClassDefinitionName, List[SlotDefinition]] = {}
+        self._reifications: Dict[ClassDefinitionName, Optional[Reification]] = {}
+        self._ancestors: Dict[ClassDefinitionName, List[ClassDefinitionName]] = {}
+        self._identifier_slots: Dict[ClassDefinitionName, Optional[SlotDefinition]] = {}
+        self._uri_closure: Optional[Dict[str, List[str]]] = None
+        self._enum_meanings: Dict[str, Optional[Dict[str, str]]] = {}
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        del state['schemaview']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.schemaview = None
+
+    def build(self) -> 'SchemaIndex':
+        """
+        Computes every entry of the index, rather than computing entries when first used
+        """
+        sv = self.schemaview
+        self.types()
+        self.is_class('')
+        self.slot_domains('')
+        for name in sv.all_elements():
+            self.pred(name)
+        for elements in [sv.all_classes(), sv.all_slots(), sv.all_types()]:
+            for el in elements.values():
+                self.uri(el)
+        for e in sv.all_enums().values():
+            self.enum_meanings(e.name)
+        self.slot_uri_ancestors('')
+        for cn in sv.all_classes():
+            self.class_ancestors(cn)
+            self.class_induced_slots(cn)
+            self.identifier_slot(cn)
+            self.reification_of(cn)
+        return self
+
+    def types(self) -> Dict[str, TypeDefinition]:
+        if self._types is None:
+            self._types = self.schemaview.all_types()
+        return self._types
+
+    def is_type(self, name: str) -> bool:
+        return name in self.types()
+
+    def datalog_type(self, slot: SlotDefinition) -> str:
+        """
+        Datalog type of the values of a slot: identifier for slots that do not range over a type
+        """
+        t = self.types().get(slot.range)
+        return 'identifier' if t is None else type_datalog_type(t)
+
+    def is_class(self, name: str) -> bool:
+        if self._classes is None:
+            self._classes = set(self.schemaview.all_classes())
+        return name in self._classes
+
+    def slot_domains(self, sn: SlotDefinitionName) -> List[ClassDefinitionName]:
+        """
+        Classes that directly declare a slot, in order of name
+        """
+        if self._slot_domains is None:
+            sv = self.schemaview
+            self._slot_domains = {}
+            for cn in sorted(sv.all_classes().keys()):
+                for direct_sn in sv.class_slots(cn, direct=True):
+                    self._slot_domains.setdefault(direct_sn, []).append(cn)
+        return self._slot_domains.get(sn, [])
+
+    def pred(self, name: ElementName) -> Optional[str]:
+        """
+        Name of the relation for a schema element, or None if there is no such element
+        """
+        pred = self._preds.get(name)
+        if pred is None:
+            el = self.schemaview.get_element(name)
+            if el is None:
+                return None
+            pred = element_pred(el)
+            self._preds[name] = pred
+        return pred
+
+    def uri(self, el: Element) -> str:
+        """
+        Expanded URI of a schema element
+        """
+        key = (type(el).__name__, el.name)
+        uri = self._uris.get(key)
+        if uri is None:
+            uri = self.schemaview.get_uri(el, expand=True)
+            self._uris[key] = uri
+        return uri
+
+    def expand_curie(self, curie: str) -> str:
+        uri = self._expanded.get(curie)
+        if uri is None:
+            uri = self.schemaview.expand_curie(curie)
+            self._expanded[curie] = uri
+        return uri
+
+    def induced_slot(self, sn: SlotDefinitionName, cn: ClassDefinitionName) -> SlotDefinition:
+        key = (sn, cn)
+        islot = self._induced_slots.get(key)
+        if islot is None:
+            islot = self.schemaview.induced_slot(sn, cn)
+            # SchemaView makes identifiers required by modifying the slot definition, which only affects
+            # slots induced afterwards; applying it to every induced slot makes the index independent of order
+            if islot.identifier or islot.key:
+                islot.required = True
+            if islot.inlined_as_list:
+                islot.inlined = True
+            self._induced_slots[key] = islot
+        return islot
+
+    def class_induced_slots(self, cn: ClassDefinitionName) -> List[SlotDefinition]:
+        islots = self._class_induced_slots.get(cn)
+        if islots is None:
+            islots = [self.induced_slot(sn, cn) for sn in self.schemaview.class_slots(cn)]
+            self._class_induced_slots[cn] = islots
+        return islots
+
+    def reification_of(self, cn: ClassDefinitionName) -> Optional[Reification]:
+        """
+        Slots of a relationship class that hold the subject, predicate and object of the statement
+
+        :param cn: class name
+        :return: reification, or None if the class is not a relationship class
+        """
+        if cn not in self._reifications:
+            self._reifications[cn] = self._reification_of(cn)
+        return self._reifications[cn]
+
+    def class_ancestors(self, cn: ClassDefinitionName) -> List[ClassDefinitionName]:
+        ancestors = self._ancestors.get(cn)
+        if ancestors is None:
+            ancestors = self.schemaview.class_ancestors(cn)
+            self._ancestors[cn] = ancestors
+        return ancestors
+
+    def slot_uri_ancestors(self, uri: str) -> List[str]:
+        """
+        URIs of the slots that a slot URI is subsumed by, including itself, in order
+
+        This is the transitive closure of the slot hierarchy (is_a and mixins) over slot URIs
+        """
+        if self._uri_closure is None:
+            sv = self.schemaview
+            parents: Dict[str, Set[str]] = {}
+            for s in sv.all_slots().values():
+                parent_uris = parents.setdefault(self.uri(s), set())
+                for p in sv.slot_parents(s.name):
+                    parent_slot = sv.get_slot(p)
+                    if parent_slot is not None:
+                        parent_uris.add(self.uri(parent_slot))
+            self._uri_closure = {}
+            for start in parents:
+                seen = {start}
+                stack = [start]
+                while stack:
+                    for parent in parents.get(stack.pop(), ()):
+                        if parent not in seen:
+                            seen.add(parent)
+                            stack.append(parent)
+                self._uri_closure[start] = sorted(seen)
+        return self._uri_closure.get(uri, [uri])
+
+    def enum_meanings(self, name: ElementName) -> Optional[Dict[str, str]]:
+        """
+        Texts of the permissible values of an enum, keyed by their expanded meaning
+
+        :return: mapping from meaning URI to text, or None if there is no such enum
+        """
+        if name not in self._enum_meanings:
+            e = self.schemaview.get_enum(name) if name else None
+            self._enum_meanings[name] = None if e is None else \
+                {self.expand_curie(pv.meaning): pv.text for pv in e.permissible_values.values() if pv.meaning}
+        return self._enum_meanings[name]
+
+    def identifier_slot(self, cn: ClassDefinitionName) -> Optional[SlotDefinition]:
+        if cn not in self._identifier_slots:
+            self._identifier_slots[cn] = next((s for s in self.class_induced_slots(cn) if s.identifier), None)
+        return self._identifier_slots[cn]
+
+    def is_inlined(self, slot: SlotDefinition) -> bool:
+        """
+        True if the values of a slot are inlined objects rather than references
+        """
+        if not self.is_class(slot.range):
+            return False
+        return bool(slot.inlined or slot.inlined_as_list or self.identifier_slot(slot.range) is None)
+
+    def _reification_of(self, cn: ClassDefinitionName) -> Optional[Reification]:
+        sv = self.schemaview
+        if not sv.is_relationship(cn):
+            return None
+        reif = Reification()
+        ancestors = self.class_ancestors(cn)
+        for islot in self.class_induced_slots(cn):
+            for anc in ancestors:
+                role = REIFICATION_SLOT_URIS.get(self.induced_slot(islot.name, anc).slot_uri)
+                if role is not None:
+                    setattr(reif, role, islot)
+        if reif.predicate is None:
+            logging.error(f'No predicate for {cn}')
+            return None
+        if reif.object is None:
+            logging.error(f'No object for {cn}')
+            return None
+        return reif
+
+
+def type_datalog_type(t: TypeDefinition) -> str:
+    if t.base == 'int' or t.base == 'float' or t.base == 'Decimal':
+        return 'number'
+    else:
+        return 'symbol'
+
+
+def element_pred(el: Union[Element, ClassDefinition, SlotDefinition]) -> str:
+    """
+    Name of the relation for a schema element: slots are underscored, everything else is camelcased
+    """
+    if isinstance(el, SlotDefinition):
+        return underscore(el.name)
+    return camelcase(el.name)
+
+
+def schema_digest(sv: SchemaView) -> str:
+    """
+    Hash of the content of a schema and the schemas it imports
+    """
+    # resolving imports annotates elements with their source schema, so resolve them before hashing
+    sv.imports_closure()
+    h = hashlib.sha256()
+    h.update(json_dumper.dumps(sv.schema).encode('utf-8'))
+    for name in sorted(sv.schema_map):
+        if name != sv.schema.name:
+            h.update(b'\0')
+            h.update(json_dumper.dumps(sv.schema_map[name]).encode('utf-8'))
+    return h.hexdigest()
+
+
+def snapshot_path(cache_dir: str, digest: str) -> str:
+    """
+    Path of the snapshot of the index for a schema digest
+
+    Snapshots are keyed by the snapshot version and the linkml-runtime version as well as the
+    schema, since both determine the induced slots
+    """
+    h = hashlib.sha256(f'{SNAPSHOT_VERSION}\0{version("linkml_runtime")}\0{digest}'.encode('utf-8'))
+    return os.path.join(cache_dir, f'schema-index-{h.hexdigest()}.pickle')
+
+
+def load_schema_index(sv: SchemaView, cache_dir: str, digest: str = None) -> SchemaIndex:
+    """
+    Index for a schema, loaded from a snapshot in cache_dir
+
+    If there is no snapshot for the schema and its imports, the index is built and
+    a snapshot is saved for subsequent processes. Unreadable snapshots are rebuilt.
+
+    :param sv: schema
+    :param cache_dir: directory for snapshots
+    :param digest: schema digest, if already known
+    :return: fully built index, bound to sv
+    """
+    if digest is None:
+        digest = schema_digest(sv)
+    path = snapshot_path(cache_dir, digest)
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as stream:
+                header, index = pickle.load(stream)
+            if header == (SNAPSHOT_VERSION, digest):
+                index.schemaview = sv
+                return index
+            logging.warning(f'Ignoring snapshot {path} for a different schema')
+        except Exception as e:
+            logging.warning(f'Ignoring unreadable snapshot {path}: {e}')
+    index = SchemaIndex(sv).build()
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first, so concurrent processes never load a partial snapshot
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as stream:
+            pickle.dump(((SNAPSHOT_VERSION, digest), index), stream, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return index
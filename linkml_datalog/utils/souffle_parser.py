@@ -0,0 +1,818 @@
+"""
+Parser for the subset of Souffle datalog produced by the DatalogGenerator
+
+The parsed Program is used by the in-process backends, which evaluate the
+generated rules directly rather than handing them to the souffle executable.
+
+Supported:
+
+ - .type, .decl, .input, .output directives
+ - #define of constants, #include of other files
+ - facts and rules, with conjunction, disjunction and negation in rule bodies
+ - binary constraints (=, !=, <, <=, >, >=), match and contains
+ - arithmetic and the common string functors (cat, to_string, to_number, strlen, substr)
+"""
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Dict, Union, Optional, Tuple, Iterator, Set, Iterable
+
+NUMERIC_TYPES = ['number', 'unsigned', 'float']
+COMPARISON_OPERATORS = ['=', '!=', '<', '<=', '>', '>=']
+BOOLEAN_FUNCTORS = ['match', 'contains']
+FUNCTORS = ['cat', 'to_string', 'to_number', 'to_float', 'to_unsigned', 'strlen', 'substr', 'ord',
+            'as', 'min', 'max', 'abs']
+AGGREGATORS = ['count', 'sum', 'min', 'max', 'mean']
+WILDCARD = '_'
+
+
+@dataclass(frozen=True)
+class Variable:
+    name: str
+
+    def is_wildcard(self) -> bool:
+        return self.name == WILDCARD
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass(frozen=True)
+class Constant:
+    value: Union[str, int, float]
+
+    def __str__(self):
+        if isinstance(self.value, str):
+            v = self.value.replace('\\', '\\\\').replace('"', '\\"')
+            v = v.replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+            return f'"{v}"'
+        return str(self.value)
+
+
+@dataclass(frozen=True)
+class Functor:
+    """
+    Application of a functor or an arithmetic operator
+    """
+    name: str
+    args: Tuple['Term', ...]
+
+    def __str__(self):
+        if self.name in ['+', '-', '*', '/', '%', '^'] and len(self.args) == 2:
+            return f'({self.args[0]} {self.name} {self.args[1]})'
+        if self.name == '-' and len(self.args) == 1:
+            return f'-({self.args[0]})'
+        return f'{self.name}({", ".join(str(a) for a in self.args)})'
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """
+    An aggregate such as count : { body } or sum x : { body }
+    """
+    name: str
+    target: Optional['Term']
+    body: Tuple['BodyLiteral', ...]
+
+    def __str__(self):
+        target = f' {self.target}' if self.target is not None else ''
+        return f'{self.name}{target} : {{ {", ".join(str(lit) for lit in self.body)} }}'
+
+
+Term = Union[Variable, Constant, Functor, Aggregate]
+
+
+@dataclass(frozen=True)
+class Atom:
+    relation: str
+    args: Tuple[Term, ...]
+
+    def __str__(self):
+        return f'{self.relation}({", ".join(str(a) for a in self.args)})'
+
+
+@dataclass(frozen=True)
+class Negation:
+    atom: Atom
+
+    def __str__(self):
+        return f'!{self.atom}'
+
+
+@dataclass(frozen=True)
+class Constraint:
+    """
+    A binary constraint; the operator is either a comparison or a boolean functor such as match
+    """
+    operator: str
+    left: Term
+    right: Term
+
+    def __str__(self):
+        if self.operator in BOOLEAN_FUNCTORS:
+            return f'{self.operator}({self.left}, {self.right})'
+        return f'{self.left} {self.operator} {self.right}'
+
+
+BodyLiteral = Union[Atom, Negation, Constraint]
+
+
+@dataclass
+class Rule:
+    """
+    A horn clause; facts are rules with an empty body
+    """
+    head: Atom
+    body: List[BodyLiteral] = field(default_factory=list)
+
+    def is_fact(self) -> bool:
+        return not self.body
+
+    def __str__(self):
+        if self.is_fact():
+            return f'{self.head}.'
+        return f'{self.head} :-\n    ' + ',\n    '.join(str(lit) for lit in self.body) + '.'
+
+
+@dataclass
+class Declaration:
+    name: str
+    attributes: List[Tuple[str, str]] = field(default_factory=list)
+    qualifiers: List[str] = field(default_factory=list)
+
+    @property
+    def arity(self) -> int:
+        return len(self.attributes)
+
+    def __str__(self):
+        attrs = ', '.join(f'{n}: {t}' for n, t in self.attributes)
+        qualifiers = ''.join(f' {q}' for q in self.qualifiers)
+        return f'.decl {self.name}({attrs}){qualifiers}'
+
+
+@dataclass
+class Program:
+    types: Dict[str, str] = field(default_factory=dict)
+    declarations: Dict[str, Declaration] = field(default_factory=dict)
+    inputs: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    outputs: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    rules: List[Rule] = field(default_factory=list)
+
+    def base_type(self, typ: str) -> str:
+        """
+        Resolves a user-defined type to its primitive type
+        """
+        seen = set()
+        while typ in self.types and typ not in seen:
+            seen.add(typ)
+            typ = self.types[typ]
+        return typ
+
+    def is_numeric(self, typ: str) -> bool:
+        return self.base_type(typ) in NUMERIC_TYPES
+
+    def column_types(self, relation: str) -> List[str]:
+        return [self.base_type(t) for _, t in self.declarations[relation].attributes]
+
+    def rules_for(self, relation: str) -> List[Rule]:
+        return [r for r in self.rules if r.head.relation == relation]
+
+    def to_souffle(self) -> str:
+        """
+        Serializes the program back to souffle syntax
+        """
+        lines = []
+        for name, base in self.types.items():
+            lines.append(f'.type {name} = {base}')
+        for decl in self.declarations.values():
+            lines.append(str(decl))
+            if decl.name in self.inputs:
+                lines.append(f'.input {decl.name}{_io_params(self.inputs[decl.name])}')
+            if decl.name in self.outputs:
+                lines.append(f'.output {decl.name}{_io_params(self.outputs[decl.name])}')
+        for rule in self.rules:
+            lines.append(str(rule))
+        return '\n'.join(lines) + '\n'
+
+
+def _io_params(params: Dict[str, str]) -> str:
+    if not params:
+        return ''
+    return '(' + ', '.join(f'{k}="{v}"' for k, v in params.items()) + ')'
+
+
+class ParseError(ValueError):
+    pass
+
+
+TOKEN_REGEX = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<directive>\.(?:decl|input|output|type|printsize|functor|comp|init|pragma|plan|limitsize)\b)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+\.\d+|0x[0-9a-fA-F]+|\d+)
+  | (?P<ident>[A-Za-z_?][A-Za-z0-9_?]*(?:\.[A-Za-z_?][A-Za-z0-9_?]*)*)
+  | (?P<op>:-|<=|>=|!=|<:|[=<>!(){},.:;+\-*/%^|$@\[\]])
+''', re.VERBOSE | re.DOTALL)
+
+
+@dataclass
+class Token:
+    kind: str
+    text: str
+    pos: int
+
+
+def _unescape(s: str) -> str:
+    return re.sub(r'\\(.)', lambda m: {'t': '\t', 'n': '\n', 'r': '\r'}.get(m.group(1), m.group(1)), s)
+
+
+def preprocess(text: str, base_dir: str = None, defines: Dict[str, str] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Applies the #define and #include directives used by generated programs
+
+    :return: text with directives removed, and a dictionary of macros
+    """
+    if defines is None:
+        defines = {}
+    lines = []
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('#define'):
+            parts = stripped.split(None, 2)
+            defines[parts[1]] = parts[2] if len(parts) > 2 else ''
+            lines.append('')
+        elif stripped.startswith('#include'):
+            fn = stripped.split(None, 1)[1].strip().strip('"<>')
+            if base_dir is not None:
+                fn = os.path.join(base_dir, fn)
+            with open(fn) as stream:
+                included, _ = preprocess(stream.read(), os.path.dirname(fn), defines)
+            lines.append(included)
+        elif stripped.startswith('#'):
+            lines.append('')
+        else:
+            lines.append(line)
+    return '\n'.join(lines), defines
+
+
+def tokenize(text: str, defines: Dict[str, str] = None) -> List[Token]:
+    if defines is None:
+        defines = {}
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = TOKEN_REGEX.match(text, pos)
+        if m is None:
+            raise ParseError(f'Unexpected character at {pos}: {text[pos:pos+40]!r}')
+        kind = m.lastgroup
+        tok_text = m.group(kind)
+        if kind == 'ident' and tok_text in defines:
+            tokens.extend(tokenize(defines[tok_text], {}))
+        elif kind not in ('ws', 'comment'):
+            tokens.append(Token(kind, tok_text, pos))
+        pos = m.end()
+    return tokens
+
+
+class Parser:
+    """
+    Recursive descent parser over a token list
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.i = 0
+        self.anon_counter = 0
+
+    def peek(self, offset=0) -> Optional[Token]:
+        j = self.i + offset
+        return self.tokens[j] if j < len(self.tokens) else None
+
+    def at(self, text: str, offset=0) -> bool:
+        tok = self.peek(offset)
+        return tok is not None and tok.text == text and tok.kind in ('op', 'directive', 'ident')
+
+    def next(self) -> Token:
+        tok = self.peek()
+        if tok is None:
+            raise ParseError('Unexpected end of program')
+        self.i += 1
+        return tok
+
+    def expect(self, text: str) -> Token:
+        tok = self.next()
+        if tok.text != text:
+            raise ParseError(f'Expected "{text}" at {tok.pos}, got "{tok.text}"')
+        return tok
+
+    def expect_kind(self, kind: str) -> Token:
+        tok = self.next()
+        if tok.kind != kind:
+            raise ParseError(f'Expected {kind} at {tok.pos}, got "{tok.text}"')
+        return tok
+
+    def parse_program(self) -> Program:
+        program = Program()
+        while self.peek() is not None:
+            tok = self.peek()
+            if tok.kind == 'directive':
+                self.parse_directive(program)
+            else:
+                program.rules.extend(self.parse_clause())
+        return program
+
+    def parse_directive(self, program: Program):
+        directive = self.next().text
+        if directive == '.type':
+            name = self.expect_kind('ident').text
+            self.next()  # = or <:
+            base = self.expect_kind('ident').text
+            while self.at('|'):
+                self.next()
+                self.expect_kind('ident')
+            program.types[name] = base
+        elif directive == '.decl':
+            names = [self.expect_kind('ident').text]
+            while self.at(','):
+                self.next()
+                names.append(self.expect_kind('ident').text)
+            self.expect('(')
+            attributes = []
+            while not self.at(')'):
+                attr_name = self.expect_kind('ident').text
+                self.expect(':')
+                attributes.append((attr_name, self.expect_kind('ident').text))
+                if self.at(','):
+                    self.next()
+            self.expect(')')
+            qualifiers = []
+            while self.peek() is not None and self.peek().kind == 'ident' and \
+                    self.peek().text in ['eqrel', 'btree', 'brie', 'inline', 'magic', 'no_magic',
+                                         'overridable', 'no_inline', 'btree_delete']:
+                qualifiers.append(self.next().text)
+            for name in names:
+                program.declarations[name] = Declaration(name, list(attributes), list(qualifiers))
+        elif directive in ('.input', '.output', '.printsize'):
+            names = [self.expect_kind('ident').text]
+            params = {}
+            while True:
+                if self.at('('):
+                    self.next()
+                    while not self.at(')'):
+                        k = self.expect_kind('ident').text
+                        self.expect('=')
+                        v = self.next().text
+                        params[k] = _unescape(v[1:-1]) if v.startswith('"') else v
+                        if self.at(','):
+                            self.next()
+                    self.expect(')')
+                if self.at(','):
+                    self.next()
+                    names.append(self.expect_kind('ident').text)
+                else:
+                    break
+            for name in names:
+                if directive == '.input':
+                    program.inputs[name] = dict(params)
+                elif directive == '.output':
+                    program.outputs[name] = dict(params)
+        else:
+            raise ParseError(f'Unsupported directive: {directive}')
+
+    def parse_clause(self) -> List[Rule]:
+        heads = [self.parse_atom()]
+        while self.at(','):
+            self.next()
+            heads.append(self.parse_atom())
+        if self.at(':-'):
+            self.next()
+            bodies = self.parse_disjunction()
+        else:
+            bodies = [[]]
+        self.expect('.')
+        return [Rule(head, list(body)) for head in heads for body in bodies]
+
+    def parse_disjunction(self) -> List[List[BodyLiteral]]:
+        bodies = self.parse_conjunction()
+        while self.at(';'):
+            self.next()
+            bodies += self.parse_conjunction()
+        return bodies
+
+    def parse_conjunction(self) -> List[List[BodyLiteral]]:
+        bodies = [[]]
+        while True:
+            if self.at('('):
+                # parenthesized disjunction, unless it starts a constraint such as (x + 1) > y
+                save = self.i
+                try:
+                    self.next()
+                    alternatives = self.parse_disjunction()
+                    self.expect(')')
+                    bodies = [b + alt for b in bodies for alt in alternatives]
+                except ParseError:
+                    self.i = save
+                    lit = self.parse_literal()
+                    bodies = [b + [lit] for b in bodies]
+            else:
+                lit = self.parse_literal()
+                bodies = [b + [lit] for b in bodies]
+            if self.at(','):
+                self.next()
+            else:
+                return bodies
+
+    def parse_literal(self) -> BodyLiteral:
+        if self.at('!'):
+            self.next()
+            return Negation(self.parse_atom())
+        tok = self.peek()
+        if tok.kind == 'ident' and self.at('(', 1):
+            if tok.text in BOOLEAN_FUNCTORS:
+                self.next()
+                self.expect('(')
+                left = self.parse_term()
+                self.expect(',')
+                right = self.parse_term()
+                self.expect(')')
+                return Constraint(tok.text, left, right)
+            if tok.text not in FUNCTORS:
+                return self.parse_atom()
+        left = self.parse_term()
+        op = self.next().text
+        if op not in COMPARISON_OPERATORS:
+            raise ParseError(f'Expected comparison operator, got "{op}"')
+        right = self.parse_term()
+        return Constraint(op, left, right)
+
+    def parse_atom(self) -> Atom:
+        name = self.expect_kind('ident').text
+        self.expect('(')
+        args = []
+        while not self.at(')'):
+            args.append(self.parse_term())
+            if self.at(','):
+                self.next()
+        self.expect(')')
+        return Atom(name, tuple(args))
+
+    def parse_term(self) -> Term:
+        left = self.parse_product()
+        while self.at('+') or self.at('-'):
+            op = self.next().text
+            left = Functor(op, (left, self.parse_product()))
+        return left
+
+    def parse_product(self) -> Term:
+        left = self.parse_unary()
+        while self.at('*') or self.at('/') or self.at('%') or self.at('^'):
+            op = self.next().text
+            left = Functor(op, (left, self.parse_unary()))
+        return left
+
+    def parse_unary(self) -> Term:
+        if self.at('-'):
+            self.next()
+            t = self.parse_unary()
+            if isinstance(t, Constant) and not isinstance(t.value, str):
+                return Constant(-t.value)
+            return Functor('-', (t,))
+        return self.parse_primary()
+
+    def parse_primary(self) -> Term:
+        tok = self.next()
+        if tok.kind == 'string':
+            return Constant(_unescape(tok.text[1:-1]))
+        if tok.kind == 'number':
+            if '.' in tok.text:
+                return Constant(float(tok.text))
+            return Constant(int(tok.text, 0))
+        if tok.text == '(':
+            t = self.parse_term()
+            self.expect(')')
+            return t
+        if tok.kind == 'ident':
+            if tok.text in AGGREGATORS and not self.at('('):
+                return self.parse_aggregate(tok.text)
+            if self.at('('):
+                self.next()
+                args = []
+                while not self.at(')'):
+                    args.append(self.parse_term())
+                    if self.at(','):
+                        self.next()
+                self.expect(')')
+                return Functor(tok.text, tuple(args))
+            if tok.text == WILDCARD:
+                return Variable(WILDCARD)
+            return Variable(tok.text)
+        raise ParseError(f'Unexpected token "{tok.text}" at {tok.pos}')
+
+    def parse_aggregate(self, name: str) -> Aggregate:
+        target = None
+        if not self.at(':'):
+            target = self.parse_term()
+        self.expect(':')
+        if self.at('{'):
+            self.next()
+            bodies = self.parse_disjunction()
+            self.expect('}')
+            if len(bodies) != 1:
+                raise ParseError('Disjunction is not supported inside aggregates')
+            body = bodies[0]
+        else:
+            body = [self.parse_atom()]
+        return Aggregate(name, target, tuple(body))
+
+
+def parse_program(text: str, base_dir: str = None) -> Program:
+    """
+    Parses souffle program text
+
+    :param text: program text
+    :param base_dir: directory against which #include paths are resolved
+    :return: parsed program
+    """
+    text, defines = preprocess(text, base_dir)
+    return Parser(tokenize(text, defines)).parse_program()
+
+
+EQREL = 'eqrel'
+
+
+def expand_eqrel(program: Program) -> Program:
+    """
+    Replaces eqrel declarations by plain relations with rules for reflexivity, symmetry and transitivity
+
+    Souffle represents equivalence relations with union-find; evaluators without
+    native support can run the expanded program instead
+
+    :param program: parsed program
+    :return: the program itself if it has no eqrel relations, otherwise an expanded copy
+    """
+    eqrels = [d for d in program.declarations.values() if EQREL in d.qualifiers]
+    if not eqrels:
+        return program
+    declarations = dict(program.declarations)
+    rules = list(program.rules)
+    x, y, z = Variable('x'), Variable('y'), Variable('z')
+    for decl in eqrels:
+        declarations[decl.name] = Declaration(decl.name, list(decl.attributes),
+                                              [q for q in decl.qualifiers if q != EQREL])
+        r = decl.name
+        rules += [Rule(Atom(r, (x, x)), [Atom(r, (x, y))]),
+                  Rule(Atom(r, (y, x)), [Atom(r, (x, y))]),
+                  Rule(Atom(r, (x, z)), [Atom(r, (x, y)), Atom(r, (y, z))])]
+    return Program(types=program.types, declarations=declarations, inputs=program.inputs,
+                   outputs=program.outputs, rules=rules)
+
+
+GRAPH_RELATION = 'named_graph'
+
+
+def add_graph_column(program: Program, relations: Iterable[str], name: str = 'g') -> Program:
+    """
+    Adds a leading graph column to the relations that depend on the given input relations
+
+    Facts about many graphs can then be evaluated in one run, each graph in isolation:
+    every atom of a dependent relation in a rule is given the same graph variable, so rules
+    only join facts from the same graph, and negations and aggregates only consider that
+    graph. Relations that depend on none of the given relations, such as facts computed
+    from a schema, are shared by all graphs.
+
+    Rules for a dependent relation without a positive atom of one, e.g. facts, or rules that only
+    negate dependent relations, are evaluated for each graph in named_graph, which is derived
+    from the given relations. Equivalence relations are expanded first (see expand_eqrel),
+    as souffle only supports binary ones.
+
+    :param program: parsed program
+    :param relations: input relations whose facts have a leading graph column
+    :param name: name of the graph column and of the graph variable in rules
+    :return: transformed copy of the program
+    """
+    if GRAPH_RELATION in program.declarations:
+        raise ValueError(f'{GRAPH_RELATION} is reserved for the graphs of a program with a graph column')
+    program = expand_eqrel(program)
+    readers: Dict[str, Set[str]] = defaultdict(set)
+    for rule in program.rules:
+        for lit in rule.body:
+            for rel, _ in literal_relations(lit):
+                readers[rel].add(rule.head.relation)
+    graphed = {rel for rel in relations if rel in program.declarations}
+    seeds = sorted(graphed)
+    stack = list(seeds)
+    while stack:
+        for head in readers[stack.pop()]:
+            if head not in graphed:
+                graphed.add(head)
+                stack.append(head)
+
+    def graph_atom(atom: Atom, g: Variable) -> Atom:
+        return Atom(atom.relation, (g,) + atom.args) if atom.relation in graphed else atom
+
+    def graph_literal(lit: BodyLiteral, g: Variable) -> BodyLiteral:
+        if isinstance(lit, Atom):
+            return graph_atom(lit, g)
+        if isinstance(lit, Negation):
+            return Negation(graph_atom(lit.atom, g))
+        return Constraint(lit.operator, graph_term(lit.left, g), graph_term(lit.right, g))
+
+    def graph_term(t: Term, g: Variable) -> Term:
+        if isinstance(t, Aggregate):
+            target = graph_term(t.target, g) if t.target is not None else None
+            return Aggregate(t.name, target, tuple(graph_literal(lit, g) for lit in t.body))
+        if isinstance(t, Functor):
+            return Functor(t.name, tuple(graph_term(a, g) for a in t.args))
+        return t
+
+    declarations = {}
+    for rel, decl in program.declarations.items():
+        if rel in graphed:
+            decl = Declaration(rel, [(_fresh_name(name, {n for n, _ in decl.attributes}), 'symbol')] + decl.attributes,
+                               list(decl.qualifiers))
+        declarations[rel] = decl
+    rules = []
+    unbound = False
+    for rule in program.rules:
+        if rule.head.relation not in graphed:
+            rules.append(rule)
+            continue
+        g = Variable(_fresh_name(name, set(_rule_variables(rule))))
+        body = [graph_literal(lit, g) for lit in rule.body]
+        if not any(isinstance(lit, Atom) and lit.relation in graphed for lit in rule.body):
+            body.insert(0, Atom(GRAPH_RELATION, (g,)))
+            unbound = True
+        rules.append(Rule(graph_atom(rule.head, g), body))
+    if unbound:
+        g = Variable(name)
+        declarations[GRAPH_RELATION] = Declaration(GRAPH_RELATION, [(name, 'symbol')])
+        for rel in seeds:
+            wildcards = tuple(Variable(WILDCARD) for _ in program.declarations[rel].attributes)
+            rules.append(Rule(Atom(GRAPH_RELATION, (g,)), [Atom(rel, (g,) + wildcards)]))
+    return Program(types=program.types, declarations=declarations, inputs=program.inputs,
+                   outputs=program.outputs, rules=rules)
+
+
+def _fresh_name(name: str, used: Set[str]) -> str:
+    while name in used:
+        name += '_'
+    return name
+
+
+def _rule_variables(rule: Rule) -> Iterator[str]:
+    """
+    Names of all variables in a rule, including those local to aggregates
+    """
+    def term_names(t: Term) -> Iterator[str]:
+        if isinstance(t, Variable):
+            yield t.name
+        elif isinstance(t, Functor):
+            for a in t.args:
+                yield from term_names(a)
+        elif isinstance(t, Aggregate):
+            if t.target is not None:
+                yield from term_names(t.target)
+            for lit in t.body:
+                yield from literal_names(lit)
+
+    def literal_names(lit: BodyLiteral) -> Iterator[str]:
+        if isinstance(lit, Negation):
+            lit = lit.atom
+        if isinstance(lit, Atom):
+            for a in lit.args:
+                yield from term_names(a)
+        else:
+            yield from term_names(lit.left)
+            yield from term_names(lit.right)
+
+    yield from literal_names(rule.head)
+    for lit in rule.body:
+        yield from literal_names(lit)
+
+
+def term_variables(term: Term) -> Iterator[str]:
+    """
+    Variables appearing in a term, excluding wildcards and variables local to aggregates
+    """
+    if isinstance(term, Variable):
+        if not term.is_wildcard():
+            yield term.name
+    elif isinstance(term, Functor):
+        for a in term.args:
+            yield from term_variables(a)
+
+
+def literal_variables(lit: BodyLiteral) -> Iterator[str]:
+    if isinstance(lit, Atom):
+        for a in lit.args:
+            yield from term_variables(a)
+    elif isinstance(lit, Negation):
+        yield from literal_variables(lit.atom)
+    elif isinstance(lit, Constraint):
+        yield from term_variables(lit.left)
+        yield from term_variables(lit.right)
+
+
+def literal_relations(lit: BodyLiteral) -> Iterator[Tuple[str, bool]]:
+    """
+    Relations referenced by a body literal, each paired with a flag that is true
+    if the reference is positive (i.e. not under negation or inside an aggregate)
+    """
+    if isinstance(lit, Atom):
+        yield lit.relation, True
+    elif isinstance(lit, Negation):
+        yield lit.atom.relation, False
+    elif isinstance(lit, Constraint):
+        for t in (lit.left, lit.right):
+            yield from _term_relations(t)
+
+
+def _term_relations(term: Term) -> Iterator[Tuple[str, bool]]:
+    if isinstance(term, Aggregate):
+        for lit in term.body:
+            for rel, _ in literal_relations(lit):
+                yield rel, False
+        if term.target is not None:
+            yield from _term_relations(term.target)
+    elif isinstance(term, Functor):
+        for a in term.args:
+            yield from _term_relations(a)
+
+
+class NotStratifiableError(ValueError):
+    pass
+
+
+def stratify(program: Program) -> List[Tuple[Set[str], List[Rule]]]:
+    """
+    Partitions the relations of a program into strata, in evaluation order
+
+    Each stratum is a strongly connected component of the dependency graph,
+    computed using Tarjan's algorithm, together with the rules deriving it.
+    Relations within a stratum may not depend on each other negatively or through aggregates.
+
+    :param program:
+    :return: list of (relations, rules) pairs
+    """
+    edges: Dict[str, Set[str]] = defaultdict(set)
+    negative_edges: Set[Tuple[str, str]] = set()
+    for rule in program.rules:
+        for lit in rule.body:
+            for rel, positive in literal_relations(lit):
+                edges[rule.head.relation].add(rel)
+                if not positive:
+                    negative_edges.add((rule.head.relation, rel))
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    sccs = []
+
+    def strongconnect(v):
+        # iterative version of Tarjan's algorithm, avoiding recursion limits on deep hierarchies
+        work = [(v, iter(sorted(edges[v])))]
+        index[v] = lowlink[v] = len(index)
+        stack.append(v)
+        on_stack.add(v)
+        while work:
+            node, it = work[-1]
+            advanced = False
+            for w in it:
+                if w not in index:
+                    index[w] = lowlink[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(sorted(edges[w]))))
+                    advanced = True
+                    break
+                elif w in on_stack:
+                    lowlink[node] = min(lowlink[node], index[w])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                scc = set()
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    scc.add(w)
+                    if w == node:
+                        break
+                sccs.append(scc)
+
+    for v in list(program.declarations) + sorted(edges):
+        if v not in index:
+            strongconnect(v)
+    rules_by_head = defaultdict(list)
+    for rule in program.rules:
+        rules_by_head[rule.head.relation].append(rule)
+    scc_of = {rel: n for n, scc in enumerate(sccs) for rel in scc}
+    for (h, b) in negative_edges:
+        if scc_of[h] == scc_of[b]:
+            raise NotStratifiableError(f'Relation {h} depends negatively on {b} within a cycle')
+    return [(scc, [r for rel in sorted(scc) for r in rules_by_head[rel]]) for scc in sccs]
@@ -0,0 +1,124 @@
+# Auto generated from walker.yaml by pythongen.py version: 0.9.0
+# Generation date: 2026-10-17T17:41:16
+# Schema: walker
+#
+# id: https://example.org/walker
+# description: Schema with an import, a uri slot and an enum, for comparing ObjectWalker with rdflib_dumper
+# license: https://creativecommons.org/publicdomain/zero/1.0/
+
+import dataclasses
+import sys
+import re
+from jsonasobj2 import JsonObj, as_dict
+from typing import Optional, List, Union, Dict, ClassVar, Any
+from dataclasses import dataclass
+from linkml_runtime.linkml_model.meta import EnumDefinition, PermissibleValue, PvFormulaOptions
+
+from linkml_runtime.utils.slot import Slot
+from linkml_runtime.utils.metamodelcore import empty_list, empty_dict, bnode
+from linkml_runtime.utils.yamlutils import YAMLRoot, extended_str, extended_float, extended_int
+from linkml_runtime.utils.dataclass_extensions_376 import dataclasses_init_fn_with_kwargs
+from linkml_runtime.utils.formatutils import camelcase, underscore, sfx
+from linkml_runtime.utils.enumerations import EnumDefinitionImpl
+from rdflib import Namespace, URIRef
+from linkml_runtime.utils.curienamespace import CurieNamespace
+from linkml_runtime.linkml_model.types import String, Uri
+from linkml_runtime.utils.metamodelcore import URI
+
+metamodel_version = "1.7.0"
+
+# Overwrite dataclasses _init_fn to add **kwargs in __init__
+dataclasses._init_fn = dataclasses_init_fn_with_kwargs
+
+# Namespaces
+LINKML = CurieNamespace('linkml', 'https://w3id.org/linkml/')
+WALKER = CurieNamespace('walker', 'https://example.org/walker/')
+WI = CurieNamespace('wi', 'https://example.org/walker_import/')
+DEFAULT_ = WALKER
+
+
+# Types
+
+# Class references
+class ThingId(extended_str):
+    pass
+
+
+@dataclass
+class Container(YAMLRoot):
+    _inherited_slots: ClassVar[List[str]] = []
+
+    class_class_uri: ClassVar[URIRef] = WALKER.Container
+    class_class_curie: ClassVar[str] = "walker:Container"
+    class_name: ClassVar[str] = "Container"
+    class_model_uri: ClassVar[URIRef] = WALKER.Container
+
+    things: Optional[Union[Dict[Union[str, ThingId], Union[dict, "Thing"]], List[Union[dict, "Thing"]]]] = empty_dict()
+
+    def __post_init__(self, *_: List[str], **kwargs: Dict[str, Any]):
+        self._normalize_inlined_as_list(slot_name="things", slot_type=Thing, key_name="id", keyed=True)
+
+        super().__post_init__(**kwargs)
+
+
+@dataclass
+class Thing(YAMLRoot):
+    _inherited_slots: ClassVar[List[str]] = []
+
+    class_class_uri: ClassVar[URIRef] = WALKER.Thing
+    class_class_curie: ClassVar[str] = "walker:Thing"
+    class_name: ClassVar[str] = "Thing"
+    class_model_uri: ClassVar[URIRef] = WALKER.Thing
+
+    id: Union[str, ThingId] = None
+    name: Optional[str] = None
+    homepage: Optional[Union[str, URI]] = None
+    status: Optional[Union[str, "StatusType"]] = None
+
+    def __post_init__(self, *_: List[str], **kwargs: Dict[str, Any]):
+        if self._is_empty(self.id):
+            self.MissingRequiredField("id")
+        if not isinstance(self.id, ThingId):
+            self.id = ThingId(self.id)
+
+        if self.name is not None and not isinstance(self.name, str):
+            self.name = str(self.name)
+
+        if self.homepage is not None and not isinstance(self.homepage, URI):
+            self.homepage = URI(self.homepage)
+
+        if self.status is not None and not isinstance(self.status, StatusType):
+            self.status = StatusType(self.status)
+
+        super().__post_init__(**kwargs)
+
+
+# Enumerations
+class StatusType(EnumDefinitionImpl):
+
+    active = PermissibleValue(text="active",
+                                   meaning=WI.Active)
+    retired = PermissibleValue(text="retired")
+
+    _defn = EnumDefinition(
+        name="StatusType",
+    )
+
+# Slots
+class slots:
+    pass
+
+slots.id = Slot(uri=WALKER.id, name="id", curie=WALKER.curie('id'),
+                   model_uri=WALKER.id, domain=None, range=URIRef)
+
+slots.name = Slot(uri=WALKER.name, name="name", curie=WALKER.curie('name'),
+                   model_uri=WALKER.name, domain=None, range=Optional[str])
+
+slots.homepage = Slot(uri=WI.homepage, name="homepage", curie=WI.curie('homepage'),
+                   model_uri=WALKER.homepage, domain=None, range=Optional[Union[str, URI]])
+
+slots.status = Slot(uri=WI.status, name="status", curie=WI.curie('status'),
+                   model_uri=WALKER.status, domain=None, range=Optional[Union[str, "StatusType"]])
+
+slots.container__things = Slot(uri=WALKER.things, name="container__things", curie=WALKER.curie('things'),
+                   model_uri=WALKER.container__things, domain=None, range=Optional[Union[Dict[Union[str, ThingId], Union[dict, Thing]], List[Union[dict, Thing]]]])
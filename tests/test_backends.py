@@ -0,0 +1,515 @@
+import importlib.util
+import os
+import re
+import shutil
+import unittest
+from pathlib import Path
+
+from linkml_runtime.dumpers import rdflib_dumper
+from linkml_runtime.loaders import yaml_loader
+from linkml_runtime.utils.schemaview import SchemaView
+from rdflib import ConjunctiveGraph, Graph, Literal, RDF, Namespace, URIRef, XSD
+
+from linkml_datalog.dumpers.tupledumper import TupleDumper, partition_relation
+from linkml_datalog.engines.datalog_engine import DatalogEngine
+from linkml_datalog.engines.pruning import prune_program
+from linkml_datalog.engines.python_backend import PythonBackend, NotStratifiableError
+from linkml_datalog.engines.souffle_backend import SouffleBackend
+from linkml_datalog.engines.souffle_compiler import compile_program, compile_library
+from linkml_datalog.engines.souffle_library_backend import SouffleLibraryBackend
+from linkml_datalog.engines.sql_backend import SQLBackend, DUCKDB
+from linkml_datalog.generators.dataloggen import DatalogGenerator, generate_program
+from linkml_datalog.model.validation import ValidationReport
+from linkml_datalog.utils.souffle_parser import parse_program, add_graph_column, GRAPH_RELATION
+
+from tests.models.personinfo import Container, Person
+import tests.models.personinfo as personinfo
+
+INPUTS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'inputs')
+OUTPUT_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'outputs')
+
+prefixes = {
+    'P': 'https://example.org/P/',
+    'CODE': 'https://example.org/CODE/',
+    'ROR': 'https://example.org/ROR/',
+    'GEO': 'https://example.org/GEO/',
+}
+
+LINKML = Namespace('https://w3id.org/linkml/')
+
+PROGRAM = """
+.decl edge(s: symbol, o: symbol)
+.input edge
+.decl weight(s: symbol, n: number)
+.input weight
+.decl path(s: symbol, o: symbol)
+.output path
+.decl unreachable(s: symbol, o: symbol)
+.output unreachable
+.decl node(s: symbol)
+.decl out_degree(s: symbol, n: number)
+.decl heavy(s: symbol, v: symbol)
+node(x) :- edge(x, _) ; edge(_, x).
+path(x, y) :- edge(x, y).
+path(x, z) :- path(x, y), path(y, z).
+unreachable(x, y) :- node(x), node(y), !path(x, y), x != y.
+out_degree(x, n) :- node(x), n = count : { edge(x, _) }.
+heavy(x, cat("w=", to_string(n))) :- weight(x, n), n > 10.
+"""
+
+FACTS = [('edge', ('a', 'b')), ('edge', ('b', 'c')), ('edge', ('c', 'a')), ('edge', ('d', 'a')),
+         ('weight', ('a', '5')), ('weight', ('d', '50'))]
+
+
+def fixtures():
+    """
+    Yields (name, program, facts) for each input fixture
+    """
+    sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+    program = DatalogGenerator(sv.schema).serialize()
+    data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+    yield 'example_personinfo_data', program, list(TupleDumper().tuples(data, sv, prefix_map=prefixes))
+    g = ConjunctiveGraph()
+    g.parse(os.path.join(INPUTS_DIR, "instance_tests.trig"), format='trig')
+    for subg in g.contexts():
+        if LINKML.TestGraph in list(g.objects(subject=subg.identifier, predicate=RDF.type)):
+            yield str(subg.identifier), program, list(TupleDumper().tuples(subg))
+
+
+class PythonBackendTestCase(unittest.TestCase):
+
+    def _run(self, program: str, facts) -> PythonBackend:
+        backend = PythonBackend()
+        backend.run(program, facts)
+        return backend
+
+    def test_program(self):
+        """tests recursion, stratified negation, aggregates and functors"""
+        backend = self._run(PROGRAM, FACTS)
+        path = {tuple(r) for r in backend.relation('path')}
+        self.assertIn(('a', 'a'), path)
+        self.assertIn(('d', 'c'), path)
+        self.assertNotIn(('a', 'd'), path)
+        unreachable = {tuple(r) for r in backend.relation('unreachable')}
+        self.assertEqual({('a', 'd'), ('b', 'd'), ('c', 'd')}, unreachable)
+        degrees = {tuple(r) for r in backend.relation('out_degree')}
+        self.assertIn(('a', '1'), degrees)
+        self.assertEqual([['d', 'w=50']], backend.relation('heavy'))
+
+    def test_update(self):
+        """tests incremental updates against evaluating from scratch"""
+        backend = self._run(PROGRAM, FACTS)
+        added = [('edge', ('c', 'd')), ('weight', ('b', '20'))]
+        removed = [('edge', ('b', 'c')), ('weight', ('d', '50'))]
+        changes = backend.update(added, removed)
+        facts = [f for f in FACTS if f not in removed] + added
+        expected = self._run(PROGRAM, facts)
+        for pred in parse_program(PROGRAM).declarations:
+            self.assertCountEqual(expected.relation(pred), backend.relation(pred), pred)
+        inserted, deleted = changes['unreachable']
+        self.assertIn(['b', 'a'], inserted)
+        self.assertIn(['c', 'd'], deleted)
+        self.assertEqual(([['b', 'w=20']], [['d', 'w=50']]), changes['heavy'])
+
+    def test_graph_column(self):
+        """facts about several graphs are evaluated as if each graph were run on its own"""
+        program = PROGRAM + """
+        .decl candidate(s: symbol)
+        .input candidate
+        .decl isolated(s: symbol)
+        .output isolated
+        isolated(x) :- candidate(x), !node(x).
+        """
+        graphs = {'g1': [f for f in FACTS if f[0] == 'edge'], 'g2': [('edge', ('a', 'd')), ('edge', ('d', 'e'))]}
+        shared = [f for f in FACTS if f[0] == 'weight'] + [('candidate', ('e',))]
+        quads = add_graph_column(parse_program(program), ['edge'])
+        self.assertIn(GRAPH_RELATION, quads.declarations)
+        self.assertEqual(2, quads.declarations['weight'].arity)
+        facts = shared + [(rel, (g,) + row) for g, rows in graphs.items() for rel, row in rows]
+        backend = self._run(quads.to_souffle(), facts)
+        for pred in ['path', 'unreachable', 'out_degree', 'isolated']:
+            expected = {(g,) + tuple(r) for g, rows in graphs.items()
+                        for r in self._run(program, shared + rows).relation(pred)}
+            self.assertEqual(expected, {tuple(r) for r in backend.relation(pred)}, pred)
+        self.assertEqual([['d', 'w=50']], backend.relation('heavy'))
+
+    def test_not_stratifiable(self):
+        program = """
+        .decl p(x: symbol)
+        .decl q(x: symbol)
+        p(x) :- q(x), !p(x).
+        """
+        with self.assertRaises(NotStratifiableError):
+            self._run(program, [])
+
+    def test_parse_roundtrip(self):
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        program = parse_program(DatalogGenerator(sv.schema).serialize())
+        reparsed = parse_program(program.to_souffle())
+        self.assertEqual([str(r) for r in program.rules], [str(r) for r in reparsed.rules])
+        self.assertEqual(sorted(program.outputs), sorted(reparsed.outputs))
+
+    def test_parse_roundtrip_escapes(self):
+        """string constants keep escaped control characters, quotes and backslashes through to_souffle"""
+        program = parse_program('.decl p(x: symbol)\np("a\\tb\\nc\\rd\\"e\\\\f").\n')
+        self.assertEqual('a\tb\nc\rd"e\\f', program.rules[0].head.args[0].value)
+        text = program.to_souffle()
+        self.assertNotIn('\t', text)
+        self.assertNotIn('\r', text)
+        self.assertIn('p("a\\tb\\nc\\rd\\"e\\\\f").', text)
+        self.assertEqual(program.rules, parse_program(text).rules)
+
+    def test_engine(self):
+        """tests the engine using the in-process backend"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        e = DatalogEngine(sv, backend=PythonBackend())
+        e.run(data, prefix_map=prefixes)
+        rpt = e.validation_results()
+        self.assertIn('sh:MaxInclusiveConstraintComponent', [r.type for r in rpt.results])
+        tups = e.inferred_slot_values(Person.class_name, personinfo.slots.age_category.name)
+        self.assertIn(('https://example.org/P/006', 'http://purl.obolibrary.org/obo/HsapDv_0000086'), tups)
+        age_category = e.results(f'{Person.class_name}_{personinfo.slots.age_category.name}')
+        self.assertIs(age_category, e.results(f'{Person.class_name}_{personinfo.slots.age_category.name}'))
+        self.assertEqual(['http://purl.obolibrary.org/obo/HsapDv_0000086'],
+                         age_category.objects_of('https://example.org/P/006'))
+        self.assertIn('https://example.org/P/006',
+                      age_category.subjects_of('http://purl.obolibrary.org/obo/HsapDv_0000086'))
+
+    def test_engine_wide(self):
+        """tests that class-slot values are the same in the wide encoding"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        e = DatalogEngine(sv, backend=PythonBackend())
+        e.run(data, prefix_map=prefixes)
+        wide = DatalogEngine(sv, backend=PythonBackend(), encoding='wide')
+        wide.run(data, prefix_map=prefixes)
+        program = parse_program(DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml"), encoding='wide').serialize())
+        self.assertNotIn('Person_age_in_years', program.declarations)
+        for sn in [personinfo.slots.age_category.name, personinfo.slots.age_in_years.name]:
+            self.assertCountEqual(e.inferred_slot_values(Person.class_name, sn),
+                                  wide.inferred_slot_values(Person.class_name, sn))
+        self.assertCountEqual(e.validation_results().results, wide.validation_results().results)
+
+    def test_pruning(self):
+        """rules that cannot fire on the input are removed without changing any output"""
+        for name, program, facts in fixtures():
+            parsed = parse_program(program)
+            pruned = prune_program(parsed, facts)
+            self.assertLess(len(pruned.rules), len(parsed.rules))
+            self.assertEqual(parsed.declarations, pruned.declarations)
+            # souffle warns about declared relations without rules, and the souffle backend raises on warnings
+            with_rules = {rule.head.relation for rule in parsed.rules}
+            self.assertEqual(with_rules, {rule.head.relation for rule in pruned.rules})
+            self.assertEqual(with_rules, {rule.head.relation
+                                          for rule in parse_program(pruned.to_souffle()).rules})
+            expected = self._run(program, facts)
+            actual = self._run(pruned.to_souffle(), facts)
+            for pred in parsed.outputs:
+                self.assertCountEqual(expected.relation(pred), actual.relation(pred), f'{name}: {pred}')
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        e = DatalogEngine(sv, backend=PythonBackend())
+        e.run(data, prefix_map=prefixes)
+        pruning = DatalogEngine(sv, backend=PythonBackend(), prune=True)
+        pruning.run(data, prefix_map=prefixes)
+        self.assertCountEqual(e.validation_results().results, pruning.validation_results().results)
+        with self.assertRaises(ValueError):
+            DatalogEngine(sv, compiled=True, prune=True)
+
+    def test_partitioned(self):
+        """facts partitioned by predicate give the same results as triples"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        engines = [DatalogEngine(sv, backend=PythonBackend(), partitioned=partitioned) for partitioned in (False, True)]
+        for e in engines:
+            e.run(data, prefix_map=prefixes)
+        program = parse_program(generate_program(sv, partitioned=True))
+        self.assertIn(partition_relation('https://w3id.org/linkml/examples/personinfo/age_in_years', 'number'),
+                      program.inputs)
+        for pred in program.outputs:
+            self.assertCountEqual(engines[0].backend.relation(pred), engines[1].backend.relation(pred), pred)
+        age = URIRef('https://w3id.org/linkml/examples/personinfo/age_in_years')
+        added = Graph()
+        added.add((URIRef('https://example.org/P/006'), age, Literal(200000)))
+        removed = Graph()
+        removed.add((URIRef('https://example.org/P/003'), age, Literal(100001)))
+        reports = [e.update(added, removed)[0] for e in engines]
+        self.assertCountEqual(reports[0].results, reports[1].results)
+
+    def test_run_file(self):
+        """RDF files are streamed to the engine with the same results as their graph"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        g = rdflib_dumper.as_rdf_graph(data, sv, prefix_map=prefixes)
+        path = os.path.join(OUTPUT_DIR, 'persondata.nt')
+        g.serialize(path, format='nt', encoding='utf-8')
+        e = DatalogEngine(sv, backend=PythonBackend())
+        e.run(g)
+        streamed = DatalogEngine(sv, backend=PythonBackend())
+        streamed.run_file(path)
+
+        def results(engine):
+            return sorted((r.type, re.sub(r'^b(\d+|N[0-9a-f]+)$', '_', r.subject), r.info)
+                          for r in engine.validation_results().results)
+
+        self.assertEqual(results(e), results(streamed))
+
+    def test_quads(self):
+        """named graphs evaluated in one run give the same results as each graph evaluated on its own"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        g = ConjunctiveGraph()
+        g.parse(os.path.join(INPUTS_DIR, "instance_tests.trig"), format='trig')
+        e = DatalogEngine(sv, backend=PythonBackend(), quads=True)
+        e.run(g)
+        reports = e.validation_results_by_graph()
+
+        def summary(results):
+            return [(r.type, r.subject, r.instantiates, r.predicate, r.object_str, r.info) for r in results]
+
+        for subg in g.contexts():
+            single = DatalogEngine(sv, backend=PythonBackend())
+            single.run(subg)
+            report = reports.get(str(subg.identifier), ValidationReport(results=[]))
+            self.assertCountEqual(summary(single.validation_results().results), summary(report.results))
+            self.assertTrue(all(r.source == str(subg.identifier) for r in report.results))
+            for fail in g.objects(subject=subg.identifier, predicate=LINKML.fail):
+                self.assertIn(re.split('[#/]', str(fail))[-1], [r.type.split(':')[-1] for r in report.results])
+
+    def test_quads_update(self):
+        """changes to quads apply to the named graphs they are in, or to the graph they name"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        g = ConjunctiveGraph()
+        g.parse(os.path.join(INPUTS_DIR, "instance_tests.trig"), format='trig')
+        e = DatalogEngine(sv, backend=PythonBackend(), quads=True)
+        e.run(g)
+        tests = Namespace('http://example.org/tests/')
+        age = URIRef('https://w3id.org/linkml/examples/personinfo/age_in_years')
+        added = Graph(identifier=tests.t0)
+        added.add((URIRef('http://example.org/P/1_valid'), age, Literal(200000)))
+        removed = Graph(identifier=tests.t3)
+        removed.add((URIRef('http://example.org/P/1'), age, Literal(99999)))
+        _, delta = e.update(added, removed)
+
+        def max_inclusive(results):
+            return [(r.source, r.subject) for r in results if r.type == 'sh:MaxInclusiveConstraintComponent']
+
+        self.assertEqual([(str(tests.t0), 'http://example.org/P/1_valid')], max_inclusive(delta.added))
+        self.assertEqual([(str(tests.t3), 'http://example.org/P/1')], max_inclusive(delta.removed))
+        unnamed = Graph()
+        unnamed.add((URIRef('http://example.org/P/1'), age, Literal(99999)))
+        with self.assertRaises(ValueError):
+            e.update(unnamed)
+        _, delta = e.update(unnamed, graph=str(tests.t3))
+        self.assertEqual([(str(tests.t3), 'http://example.org/P/1')], max_inclusive(delta.added))
+
+    def test_materialize_inferences(self):
+        """tests writing inferred values back to objects"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        e = DatalogEngine(sv, backend=PythonBackend())
+        e.run(data, prefix_map=prefixes)
+        persons = {p.id: p for p in data.persons}
+        persons['P:001'].age_category = 'adolescent'
+        # deeply nested containers are traversed without recursion
+        nested = [data]
+        for _ in range(5000):
+            nested = [nested]
+        e.materialize_inferences(nested)
+        # enum values are inferred as meanings, and written back as the texts of the permissible values
+        self.assertEqual('adolescent', persons['P:006'].age_category)
+        self.assertEqual('adult', persons['P:003'].age_category)
+        # single-valued slots that already have a value are left unchanged
+        self.assertEqual('adolescent', persons['P:001'].age_category)
+        aliases = list(persons['P:001'].aliases)
+        e.materialize_inferences(data)
+        self.assertEqual(aliases, persons['P:001'].aliases)
+
+    def test_engine_update(self):
+        """tests incrementally updating validation results"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        e = DatalogEngine(sv, backend=PythonBackend())
+        e.run(data, prefix_map=prefixes)
+        age = URIRef('https://w3id.org/linkml/examples/personinfo/age_in_years')
+        added = Graph()
+        added.add((URIRef('https://example.org/P/006'), age, Literal(200000)))
+        removed = Graph()
+        removed.add((URIRef('https://example.org/P/003'), age, Literal(100001)))
+        rpt, delta = e.update(added, removed)
+        self.assertEqual(['https://example.org/P/006'],
+                         [r.subject for r in delta.added if r.type == 'sh:MaxInclusiveConstraintComponent'])
+        self.assertEqual(['https://example.org/P/003'],
+                         [r.subject for r in delta.removed if r.type == 'sh:MaxInclusiveConstraintComponent'])
+        self.assertCountEqual([r.subject for r in rpt.results if r.type == 'sh:MaxInclusiveConstraintComponent'],
+                              ['https://example.org/P/006'])
+
+
+class SQLBackendTestCase(unittest.TestCase):
+    """
+    Checks that the SQL backend gives the same results as the in-process backend
+    """
+
+    def _assert_equivalent(self, dialect: str):
+        for name, program, facts in [('program', PROGRAM, FACTS)] + list(fixtures()):
+            sql = SQLBackend(dialect=dialect)
+            sql.run(program, facts)
+            python = PythonBackend()
+            python.run(program, facts)
+            for pred in parse_program(program).declarations:
+                expected = {tuple(r) for r in python.relation(pred)}
+                actual = {tuple(r) for r in sql.relation(pred)}
+                self.assertEqual(expected, actual, f'{name}: {pred}')
+
+    def test_sqlite(self):
+        self._assert_equivalent('sqlite')
+
+    @unittest.skipIf(importlib.util.find_spec('duckdb') is None, 'duckdb not installed')
+    def test_duckdb(self):
+        self._assert_equivalent(DUCKDB)
+
+    @unittest.skipIf(importlib.util.find_spec('duckdb') is None, 'duckdb not installed')
+    def test_duckdb_decimals(self):
+        """numbers keep their fractional part, e.g. when compared with a maximum_value"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        program = DatalogGenerator(sv.schema).serialize()
+        g = Graph()
+        p = URIRef('https://example.org/P/1')
+        g.add((p, RDF.type, URIRef(sv.get_uri('Person', expand=True))))
+        g.add((p, URIRef(sv.get_uri(sv.get_slot('age_in_years'), expand=True)), Literal('999.25', datatype=XSD.decimal)))
+        facts = list(TupleDumper().tuples(g))
+        sql = SQLBackend(dialect=DUCKDB)
+        sql.run(program, facts)
+        self.assertEqual([[str(p), '999.25']], sql.relation('Person_age_in_years'))
+        self.assertIn('sh:MaxInclusiveConstraintComponent', {row[0] for row in sql.relation('validation_result')})
+        python = PythonBackend()
+        python.run(program, facts)
+        self.assertEqual({tuple(r) for r in python.relation('validation_result')},
+                         {tuple(r) for r in sql.relation('validation_result')})
+
+    def test_query_in_place(self):
+        backend = SQLBackend()
+        backend.run(PROGRAM, FACTS)
+        rows = backend.connection.execute('SELECT o FROM path WHERE s = ?', ('d',)).fetchall()
+        self.assertEqual({'a', 'b', 'c'}, {r[0] for r in rows})
+
+
+STAND_IN_SOUFFLE = """#!/bin/sh
+# stands in for souffle -o BINARY SOURCE, checking that the source exists relative to the working directory
+if [ "$1" = "--version" ]; then echo "stand-in"; exit 0; fi
+test -f "$3" || { echo "no such file: $3" >&2; exit 1; }
+cp "$3" "$2"
+"""
+
+STAND_IN_CXX = """#!/bin/sh
+# stands in for a C++ compiler, checking that its sources exist relative to the working directory
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -o) out="$2"; shift;;
+    *.cpp) test -f "$1" || { echo "no such file: $1" >&2; exit 1; };;
+  esac
+  shift
+done
+echo > "$out"
+"""
+
+
+class SouffleCompilerTestCase(unittest.TestCase):
+    """
+    Checks how programs are compiled and cached
+    """
+
+    def _stand_in(self, name: str, script: str) -> str:
+        path = os.path.join(OUTPUT_DIR, 'stand-in', name)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as stream:
+            stream.write(script)
+        os.chmod(path, 0o755)
+        return path
+
+    def test_relative_cache_dir(self):
+        """a cache directory relative to the working directory is not resolved relative to itself"""
+        executable = self._stand_in('souffle', STAND_IN_SOUFFLE)
+        cwd = os.getcwd()
+        os.chdir(OUTPUT_DIR)
+        try:
+            shutil.rmtree('relative-cache', ignore_errors=True)
+            path = compile_program(PROGRAM, cache_dir='relative-cache', executable=executable)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(os.path.join(OUTPUT_DIR, 'relative-cache'), os.path.dirname(path))
+        with open(path) as stream:
+            self.assertEqual(PROGRAM, stream.read())
+
+    def test_relative_library_cache_dir(self):
+        """a library can be built in a cache directory relative to the working directory"""
+        executable = self._stand_in('souffle', STAND_IN_SOUFFLE)
+        cxx = os.environ.get('CXX')
+        os.environ['CXX'] = self._stand_in('c++', STAND_IN_CXX)
+        cwd = os.getcwd()
+        os.chdir(OUTPUT_DIR)
+        try:
+            shutil.rmtree('relative-cache', ignore_errors=True)
+            path = compile_library(PROGRAM, cache_dir='relative-cache', executable=executable)
+        finally:
+            os.chdir(cwd)
+            if cxx is None:
+                del os.environ['CXX']
+            else:
+                os.environ['CXX'] = cxx
+        self.assertEqual(os.path.join(OUTPUT_DIR, 'relative-cache'), os.path.dirname(path))
+        self.assertTrue(os.path.exists(path))
+
+    @unittest.skipIf(shutil.which('souffle') is None, 'souffle not installed')
+    def test_compiled_relative_cache_dir(self):
+        """runs a compiled binary cached in a relative directory"""
+        workdir = os.path.join(OUTPUT_DIR, 'compiled')
+        Path(workdir).mkdir(parents=True, exist_ok=True)
+        cwd = os.getcwd()
+        os.chdir(OUTPUT_DIR)
+        try:
+            souffle = SouffleBackend(compiled=True, cache_dir='relative-cache')
+            souffle.run(PROGRAM, FACTS, workdir=workdir)
+        finally:
+            os.chdir(cwd)
+        python = PythonBackend()
+        python.run(PROGRAM, FACTS)
+        for pred in parse_program(PROGRAM).outputs:
+            self.assertEqual({tuple(r) for r in python.relation(pred)}, {tuple(r) for r in souffle.relation(pred)})
+
+
+@unittest.skipIf(shutil.which('souffle') is None, 'souffle not installed')
+class BackendEquivalenceTestCase(unittest.TestCase):
+    """
+    Checks that the in-process backend gives the same results as souffle
+    """
+
+    def test_equivalence(self):
+        workdir = os.path.join(OUTPUT_DIR, 'equivalence')
+        Path(workdir).mkdir(parents=True, exist_ok=True)
+        for name, program, facts in fixtures():
+            souffle = SouffleBackend()
+            souffle.run(program, facts, workdir=workdir, strict=False)
+            python = PythonBackend()
+            python.run(program, facts)
+            for pred in parse_program(program).outputs:
+                expected = {tuple(r) for r in souffle.relation(pred)}
+                actual = {tuple(r) for r in python.relation(pred)}
+                self.assertEqual(expected, actual, f'{name}: {pred}')
+
+    def test_library(self):
+        """tests in-memory exchange of facts with a program built as a library"""
+        cache_dir = os.path.join(OUTPUT_DIR, 'cache')
+        for name, program, facts in fixtures():
+            library = SouffleLibraryBackend(cache_dir=cache_dir)
+            library.run(program, facts)
+            python = PythonBackend()
+            python.run(program, facts)
+            for pred in parse_program(program).outputs:
+                expected = {tuple(r) for r in python.relation(pred)}
+                actual = {tuple(r) for r in library.relation(pred)}
+                self.assertEqual(expected, actual, f'{name}: {pred}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,13 @@
+import tempfile
 import unittest
-from linkml_datalog.generators.dataloggen import DatalogGenerator
+from linkml_runtime.dumpers import json_dumper
+from linkml_runtime.linkml_model.meta import Annotation
+from linkml_runtime.utils.schemaview import SchemaView
+
+from linkml_datalog.engines.python_backend import PythonBackend
+from linkml_datalog.generators.dataloggen import DatalogGenerator, generate_program, MAIN_MODULE
+from linkml_datalog.utils.schema_index import load_schema_index, snapshot_path, schema_digest
+from linkml_datalog.utils.souffle_parser import parse_program, Atom, Constant
 import os
 
 INPUTS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'inputs')
@@ -13,6 +21,177 @@ class DatalogGeneratorTestCase(unittest.TestCase):
         gen = DatalogGenerator(fn)
         print(gen.serialize())
 
+    def test_outputs(self):
+        fn = os.path.join(INPUTS_DIR, "personinfo.yaml")
+        outputs = parse_program(DatalogGenerator(fn, outputs='validation').serialize()).outputs
+        self.assertEqual(['validation_result'], list(outputs))
+        outputs = parse_program(DatalogGenerator(fn, outputs=['Person', 'founding_date']).serialize()).outputs
+        for rel in ['validation_result', 'Person', 'Person_age_category', 'Person_age_category_asserted',
+                    'founding_date', 'Organization_founding_date']:
+            self.assertIn(rel, outputs)
+        for rel in ['Organization', 'Organization_id', 'age_category']:
+            self.assertNotIn(rel, outputs)
+
+    def test_generate_program(self):
+        """programs are reused for identical schemas, and generation leaves the schema unchanged"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        sv.imports_closure()
+        before = json_dumper.dumps(sv.schema)
+        program = generate_program(sv)
+        self.assertEqual(before, json_dumper.dumps(sv.schema))
+        self.assertIs(program, generate_program(SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))))
+        self.assertEqual(program, DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml")).serialize())
+
+    def test_schema_index(self):
+        gen = DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        self.assertEqual(['NamedThing', 'Place'], gen.index.slot_domains('name'))
+        reif = gen.reification_of('FamilialRelationship')
+        self.assertEqual('type', reif.predicate.name)
+        self.assertEqual('related_to', reif.object.name)
+        self.assertIsNone(gen.reification_of('Person'))
+        self.assertIs(gen.induced_slot('age_in_years', 'Person'), gen.induced_slot('age_in_years', 'Person'))
+
+    def test_closures(self):
+        """slot and class hierarchies are closed at generation time, so no rules recurse over them"""
+        program = parse_program(DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml")).serialize())
+        closures = [r for r in program.rules if r.head.relation in ('uri_subsumed_by', 'class_subsumed_by')]
+        self.assertTrue(all(r.is_fact() for r in closures))
+        facts = [str(r) for r in closures]
+        self.assertIn('class_subsumed_by("http://schema.org/Person", "NamedThing").', facts)
+        self.assertIn('class_subsumed_by("http://schema.org/Person", "Person").', facts)
+        # classes are only derived from rdf:type triples, not from their subclasses
+        person = [r for r in program.rules if r.head.relation == 'Person']
+        self.assertEqual(['triple', 'class_subsumed_by'], [lit.relation for lit in person[0].body])
+        self.assertEqual(1, len(person))
+
+    def test_slot_encodings(self):
+        """transitive slots are closed by linear recursion, and symmetric transitive slots are equivalence relations"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        sibling_of = sv.schema.slots['sibling_of']
+        sibling_of.symmetric = True
+        sibling_of.annotations['transitive'] = Annotation('transitive', True)
+        gen = DatalogGenerator(sv.schema)
+        program = parse_program(gen.serialize())
+        self.assertEqual(['eqrel'], program.declarations['sibling_of'].qualifiers)
+        self.assertIn('ancestor_of_edge', program.declarations)
+        for rel in ['sibling_of', 'ancestor_of']:
+            for rule in program.rules_for(rel):
+                self.assertLessEqual(len([lit for lit in rule.body if lit.relation == rel]), 1)
+        parent_of = gen.uri(sv.get_slot('parent_of'))
+        sibling_uri = gen.uri(sibling_of)
+        facts = [('triple', ('a', parent_of, 'b')), ('triple', ('b', parent_of, 'c')), ('triple', ('c', parent_of, 'd')),
+                 ('triple', ('b', sibling_uri, 'x')), ('triple', ('y', sibling_uri, 'x'))]
+        backend = PythonBackend()
+        backend.run(gen.serialize(), facts)
+        self.assertCountEqual([('a', 'b'), ('a', 'c'), ('a', 'd'), ('b', 'c'), ('b', 'd'), ('c', 'd')],
+                              [tuple(t) for t in backend.relation('ancestor_of')])
+        self.assertCountEqual([(s, o) for s in 'bxy' for o in 'bxy'],
+                              [tuple(t) for t in backend.relation('sibling_of')])
+
+    def test_max_count(self):
+        """single-valued slots are checked by counting values, giving one result per subject"""
+        gen = DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        person = gen.uri(gen.schemaview.get_class('Person'))
+        name = gen.uri(gen.schemaview.get_slot('name'))
+        facts = [('triple', ('p', 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type', person)),
+                 ('triple', ('p', name, '"a"')), ('triple', ('p', name, '"b"')), ('triple', ('p', name, '"c"')),
+                 ('literal_symbol', ('"a"', 'a')), ('literal_symbol', ('"b"', 'b')), ('literal_symbol', ('"c"', 'c'))]
+        backend = PythonBackend()
+        backend.run(gen.serialize(), facts)
+        results = [r for r in backend.relation('validation_result')
+                   if r[0] == 'sh:MaxCountConstraintComponent' and r[2] == 'Person']
+        self.assertEqual([['sh:MaxCountConstraintComponent', 'p', 'Person', 'name', '',
+                           'got 3 distinct values for subject and predicate']], results)
+        # the count is driven by class membership, so it is evaluated once per instance rather than per value
+        rules = [r for r in parse_program(gen.serialize()).rules_for('validation_result')
+                 if r.head.args[0] == Constant('sh:MaxCountConstraintComponent')]
+        self.assertTrue(rules)
+        self.assertTrue(all(isinstance(r.body[0], Atom) and r.body[0].relation == r.head.args[2].value
+                            for r in rules))
+
+    def test_enums(self):
+        """enum relations only hold permissible values, as text literals or meanings"""
+        gen = DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        gender = gen.uri(gen.schemaview.get_slot('gender'))
+        facts = [('triple', ('p', gender, '"cisgender man"')), ('triple', ('q', gender, '"bogus"')),
+                 ('triple', ('r', gender, 'http://purl.obolibrary.org/obo/GSSO_000385')),
+                 ('literal_symbol', ('"cisgender man"', 'cisgender man')), ('literal_symbol', ('"bogus"', 'bogus'))]
+        backend = PythonBackend()
+        backend.run(gen.serialize(), facts)
+        members = [v for v, in backend.relation('GenderType')]
+        self.assertIn('"cisgender man"', members)
+        self.assertIn('http://purl.obolibrary.org/obo/GSSO_000385', members)
+        self.assertNotIn('"bogus"', members)
+        self.assertCountEqual([['"bogus"'], ['"cisgender man"']], backend.relation('DiagnosisType'))
+
+    def test_datatypes(self):
+        """literal values of slots with a type range are checked against the datatypes in literal_datatype"""
+        gen = DatalogGenerator(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        age = gen.uri(gen.schemaview.get_slot('age_in_years'))
+        xsd = 'http://www.w3.org/2001/XMLSchema#'
+        facts = [('triple', ('p', age, '30')), ('triple', ('q', age, '"thirty"')),
+                 ('triple', ('r', age, f'30.5^^<{xsd}decimal>')),
+                 ('literal_number', ('30', '30')), ('literal_symbol', ('"thirty"', 'thirty')),
+                 ('literal_number', (f'30.5^^<{xsd}decimal>', '30.5'))]
+        datatypes = [('literal_datatype', ('30', f'{xsd}integer')), ('literal_datatype', ('"thirty"', f'{xsd}string')),
+                     ('literal_datatype', (f'30.5^^<{xsd}decimal>', f'{xsd}decimal'))]
+        program = gen.serialize()
+
+        def datatype_results(facts):
+            backend = PythonBackend()
+            backend.run(program, facts)
+            return [row for row in backend.relation('validation_result') if row[0] == 'sh:DatatypeConstraintComponent']
+        self.assertEqual([['sh:DatatypeConstraintComponent', 'q', 'age_in_years', 'age_in_years', '"thirty"',
+                           'Expected range is integer']], datatype_results(facts + datatypes))
+        # the check reads the datatypes of literals only from literal_datatype
+        self.assertEqual([], datatype_results(facts))
+
+    def test_snapshot(self):
+        """indexes are saved once and loaded by later generators"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self._check_snapshot(cache_dir)
+
+    def _check_snapshot(self, cache_dir: str):
+        fn = os.path.join(INPUTS_DIR, "personinfo.yaml")
+        built = load_schema_index(SchemaView(fn), cache_dir)
+        path = snapshot_path(cache_dir, schema_digest(SchemaView(fn)))
+        self.assertTrue(os.path.exists(path))
+        sv = SchemaView(fn)
+        loaded = load_schema_index(sv, cache_dir)
+        self.assertIsNot(built, loaded)
+        self.assertIs(sv, loaded.schemaview)
+        self.assertEqual(built.class_induced_slots('Person'), loaded.class_induced_slots('Person'))
+        self.assertEqual('id', loaded.identifier_slot('Person').name)
+        self.assertEqual(DatalogGenerator(fn).serialize(), DatalogGenerator(fn, index=loaded).serialize())
+        # unreadable snapshots are rebuilt
+        with open(path, 'w') as stream:
+            stream.write('junk')
+        rebuilt = load_schema_index(SchemaView(fn), cache_dir)
+        self.assertEqual(built.class_induced_slots('Person'), rebuilt.class_induced_slots('Person'))
+
+    def test_modules(self):
+        """modular programs only rewrite the modules affected by a change"""
+        with tempfile.TemporaryDirectory() as modules_dir:
+            self._check_modules(modules_dir)
+
+    def _check_modules(self, modules_dir: str):
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        gen = DatalogGenerator(sv.schema)
+        modules = gen.serialize_modules()
+        self.assertIn('slots/id.dl', modules)
+        self.assertIn('classes/Person.dl', modules)
+        main = modules[MAIN_MODULE]
+        for path, text in modules.items():
+            if path != MAIN_MODULE:
+                main = main.replace(f'#include "{path}"', text)
+        self.assertCountEqual([str(r) for r in parse_program(gen.serialize()).rules],
+                              [str(r) for r in parse_program(main).rules])
+        self.assertCountEqual(modules.keys(), gen.write_modules(modules_dir))
+        self.assertEqual([], DatalogGenerator(sv.schema).write_modules(modules_dir))
+        sv.schema.slots['employed_at'].required = True
+        changed = DatalogGenerator(sv.schema).write_modules(modules_dir)
+        self.assertEqual(['classes/EmploymentEvent.dl'], changed)
+
     def test_biolink(self):
         fn = os.path.join(INPUTS_DIR, "biolink-model.yaml")
         print(f'Loading {fn}')
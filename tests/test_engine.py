@@ -1,3 +1,4 @@
+import shutil
 import unittest
 from pathlib import Path
 from typing import Type, Tuple, List
@@ -71,6 +72,53 @@ class DatalogEngineTestCase(unittest.TestCase):
         #ys = yaml_dumper.dumps(data)
         #print(ys)
 
+    @unittest.skipIf(shutil.which('souffle') is None, 'souffle not installed')
+    def test_engine_compiled(self):
+        """tests running a cached compiled binary"""
+        schema_fn = os.path.join(INPUTS_DIR, "personinfo.yaml")
+        data_fn = os.path.join(INPUTS_DIR, "example_personinfo_data.yaml")
+        data = yaml_loader.load(data_fn, target_class=Container)
+        sv = SchemaView(schema_fn)
+        e = DatalogEngine(sv, workdir=os.path.join(OUTPUT_DIR, 'tmp'), compiled=True,
+                          cache_dir=os.path.join(OUTPUT_DIR, 'cache'))
+        e.run(data, prefix_map=prefixes)
+        rpt = e.validation_results()
+        assert len(rpt.results) > 0
+        # second run reuses the binary
+        e.run(data, prefix_map=prefixes)
+        self.assertEqual(len(rpt.results), len(e.validation_results().results))
+
+    @unittest.skipIf(shutil.which('souffle') is None, 'souffle not installed')
+    def test_engine_streaming(self):
+        """tests exchanging facts and results through named pipes"""
+        schema_fn = os.path.join(INPUTS_DIR, "personinfo.yaml")
+        data_fn = os.path.join(INPUTS_DIR, "example_personinfo_data.yaml")
+        data = yaml_loader.load(data_fn, target_class=Container)
+        sv = SchemaView(schema_fn)
+        workdir = os.path.join(OUTPUT_DIR, 'tmp')
+        e = DatalogEngine(sv, workdir=workdir)
+        e.run(data, prefix_map=prefixes)
+        expected = e.validation_results()
+        e = DatalogEngine(sv, workdir=workdir, streaming=True)
+        e.run(data, prefix_map=prefixes)
+        self.assertCountEqual(expected.results, e.validation_results().results)
+        self.assertFalse(os.path.exists(os.path.join(workdir, 'triple.facts')))
+
+    @unittest.skipIf(shutil.which('souffle') is None, 'souffle not installed')
+    def test_engine_pruned(self):
+        """tests running a pruned program, in which some declared relations have no rules"""
+        schema_fn = os.path.join(INPUTS_DIR, "personinfo.yaml")
+        data_fn = os.path.join(INPUTS_DIR, "example_personinfo_data.yaml")
+        data = yaml_loader.load(data_fn, target_class=Container)
+        sv = SchemaView(schema_fn)
+        workdir = os.path.join(OUTPUT_DIR, 'tmp')
+        e = DatalogEngine(sv, workdir=workdir)
+        e.run(data, prefix_map=prefixes)
+        expected = e.validation_results()
+        e = DatalogEngine(sv, workdir=workdir, prune=True)
+        e.run(data, prefix_map=prefixes)
+        self.assertCountEqual(expected.results, e.validation_results().results)
+
     def test_engine_rdf(self):
         """uses a collection of annotated named graphs as test  """
         schema_fn = os.path.join(INPUTS_DIR, "personinfo.yaml")
@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from linkml_runtime.loaders import yaml_loader
+from linkml_runtime.utils.schemaview import SchemaView
+
+from linkml_datalog.engines.datalog_engine import DatalogEngine
+from linkml_datalog.engines.python_backend import PythonBackend
+from linkml_datalog.engines.result_cache import ResultCache, data_hash
+
+from tests.models.personinfo import Container
+
+INPUTS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'inputs')
+
+prefixes = {
+    'P': 'https://example.org/P/',
+    'CODE': 'https://example.org/CODE/',
+    'ROR': 'https://example.org/ROR/',
+    'GEO': 'https://example.org/GEO/',
+}
+
+
+class ResultCacheTestCase(unittest.TestCase):
+
+    def test_data_hash(self):
+        facts = [('triple', ('a', 'p', 'b')), ('triple', ('b', 'p', 'c')), ('literal_number', ('"1"', '1'))]
+        self.assertEqual(data_hash(facts), data_hash(reversed(facts)))
+        self.assertNotEqual(data_hash(facts), data_hash(facts[1:]))
+        # relations are sets, so a repeated fact does not change the hash
+        self.assertEqual(data_hash(facts), data_hash(facts + [facts[0]]))
+        self.assertEqual(data_hash(facts), data_hash(facts + facts))
+        # column boundaries are part of the hash
+        self.assertNotEqual(data_hash([('triple', ('ab', 'c'))]), data_hash([('triple', ('a', 'bc'))]))
+
+    def test_lru(self):
+        cache = ResultCache(max_entries=2)
+        cache.put(('p', '1'), {})
+        cache.put(('p', '2'), {})
+        cache.get(('p', '1'))
+        cache.put(('p', '3'), {})
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(('p', '2')))
+        self.assertIsNotNone(cache.get(('p', '1')))
+
+    def test_engine(self):
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        cache = ResultCache()
+        e = DatalogEngine(sv, backend=PythonBackend(), cache=cache)
+        e.run(data, prefix_map=prefixes)
+        expected = e.validation_results()
+        e.run(data, prefix_map=prefixes)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(expected, e.validation_results())
+        data.persons = data.persons[1:]
+        e.run(data, prefix_map=prefixes)
+        self.assertEqual(2, cache.misses)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,24 @@
+import re
 import unittest
+from collections import Counter
 from pathlib import Path
 
 import yaml
+from linkml_runtime.dumpers import rdflib_dumper
+from linkml_runtime.linkml_model.meta import PermissibleValue
 from linkml_runtime.loaders import yaml_loader
 from linkml_runtime.utils.schemaview import SchemaView
+from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
+from rdflib.namespace import RDF, XSD
+from rdflib.plugins.parsers.notation3 import BadSyntax
 
 import os
 
-from linkml_datalog.dumpers.tupledumper import TupleDumper
+from linkml_datalog.dumpers.tupledumper import TupleDumper, ObjectWalker, partition_relation, turtle_triples, \
+    DEFAULT_GRAPH, TURTLE_RETRY_LINES
 
 from tests.models.personinfo import Container
+import tests.models.walker as walker
 
 INPUTS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'inputs')
 OUTPUT_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'outputs')
@@ -35,6 +44,181 @@ class TupleDumperTestCase(unittest.TestCase):
         tuple_dumper = TupleDumper()
         tuple_dumper.dump(data, schemaview=sv, prefix_map=prefixes, directory=directory)
 
+    def test_bnode_labels(self):
+        """blank nodes are labeled the same way each time the data is dumped"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        tuples = set(TupleDumper().tuples(data, sv, prefix_map=prefixes))
+        self.assertEqual(tuples, set(TupleDumper().tuples(data, sv, prefix_map=prefixes)))
+
+    def test_object_walker(self):
+        """objects are converted to the same tuples with and without rdflib, up to blank node labels"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        data.persons[0].aliases = ['freddie', 'freddie', 'fred']
+
+        direct = list(TupleDumper().tuples(data, sv, prefix_map=prefixes))
+        via_rdflib = list(TupleDumper(use_rdflib=True).tuples(data, sv, prefix_map=prefixes))
+        self.assertEqual(self._without_labels(via_rdflib), self._without_labels(direct))
+        self.assertEqual(direct, list(TupleDumper().tuples(data, sv, prefix_map=prefixes)))
+
+    def test_object_walker_rdflib_parity(self):
+        """ObjectWalker generates the tuples of the graph rdflib_dumper makes"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        direct = ObjectWalker(sv, prefix_map=prefixes).tuples(data)
+        g = rdflib_dumper.as_rdf_graph(data, SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml")),
+                                       prefix_map=prefixes)
+        self.assertEqual(self._without_labels(TupleDumper().graph_tuples(g)), self._without_labels(direct))
+
+        # slots, prefixes and enums from an imported schema, and a uri slot
+        sv = SchemaView(os.path.join(INPUTS_DIR, "walker.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "walker_data.yaml"), target_class=walker.Container)
+        direct = list(ObjectWalker(sv).tuples(data))
+        rdflib_sv = SchemaView(os.path.join(INPUTS_DIR, "walker.yaml"))
+        # rdflib_dumper only finds the prefixes of imported schemas once the imports are loaded
+        rdflib_sv.imports_closure()
+        g = rdflib_dumper.as_rdf_graph(data, rdflib_sv)
+        # rdflib_dumper writes values of xsd:anyURI types as typed literals, and ObjectWalker as URIs
+        for s, p, o in list(g):
+            if isinstance(o, Literal) and o.datatype == XSD.anyURI:
+                g.remove((s, p, o))
+                g.add((s, p, URIRef(o)))
+        self.assertEqual(self._without_labels(TupleDumper().graph_tuples(g)), self._without_labels(direct))
+        self.assertIn(('triple', ('https://example.org/walker_import/T1', 'https://example.org/walker_import/homepage',
+                                  'https://example.org/home/T1')), direct)
+        self.assertIn(('triple', ('https://example.org/walker_import/T1', 'https://example.org/walker_import/status',
+                                  'https://example.org/walker_import/Active')), direct)
+        self.assertIn(('literal_symbol', ('"retired"', 'retired')), direct)
+
+        # enum values may be plain permissible values
+        for thing in data.things:
+            thing.status = PermissibleValue(text=thing.status.code.text, meaning=thing.status.code.meaning)
+        self.assertEqual(direct, list(ObjectWalker(sv).tuples(data)))
+
+    @staticmethod
+    def _without_labels(tuples):
+        return Counter((p, tuple(re.sub(r'^b\d+$', '_', v) for v in row)) for p, row in tuples)
+
+    def test_literal_datatypes(self):
+        """literals with the same value but a different language or datatype are distinct nodes"""
+        g = Graph()
+        s = URIRef('https://example.org/s')
+        g.add((s, URIRef('https://example.org/name'), Literal('bob')))
+        g.add((s, URIRef('https://example.org/label'), Literal('bob', lang='en')))
+        g.add((s, URIRef('https://example.org/age'), Literal(30)))
+        g.add((s, URIRef('https://example.org/weight'), Literal('30', datatype=XSD.decimal)))
+        tuples = list(TupleDumper().tuples(g))
+        datatypes = {row for rel, row in tuples if rel == 'literal_datatype'}
+        decimal = f'30^^<{XSD.decimal}>'
+        self.assertEqual({('"bob"', str(XSD.string)), ('"bob"@en', str(RDF.langString)), ('30', str(XSD.integer)),
+                          (decimal, str(XSD.decimal))}, datatypes)
+        self.assertCountEqual([('"bob"', 'bob'), ('"bob"@en', 'bob')],
+                              [row for rel, row in tuples if rel == 'literal_symbol'])
+        self.assertCountEqual([('30', '30'), (decimal, '30')], [row for rel, row in tuples if rel == 'literal_number'])
+
+    def test_unique_literals(self):
+        """literal tuples are written once for a value that recurs"""
+        g = Graph()
+        for i in range(3):
+            g.add((URIRef(f'https://example.org/s{i}'), URIRef('https://example.org/name'), Literal('bob')))
+        tuples = list(TupleDumper().tuples(g))
+        self.assertEqual(3, len([row for rel, row in tuples if rel == 'triple']))
+        self.assertEqual([('"bob"', 'bob')], [row for rel, row in tuples if rel == 'literal_symbol'])
+
+    def test_file_tuples(self):
+        """N-Triples and Turtle files are streamed to the same tuples as their graph, up to blank node labels"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        g = rdflib_dumper.as_rdf_graph(data, sv, prefix_map=prefixes)
+        g.add((URIRef('https://example.org/s'), URIRef('https://example.org/notes'), Literal('one.\ntwo.')))
+
+        def without_labels(tuples):
+            return Counter((p, tuple(re.sub(r'^b(\d+|N[0-9a-f]+)$', '_', v) for v in row)) for p, row in tuples)
+
+        expected = without_labels(TupleDumper().tuples(g))
+        for fmt, suffix in [('nt', 'nt'), ('turtle', 'ttl')]:
+            path = os.path.join(OUTPUT_DIR, f'persondata.{suffix}')
+            g.serialize(path, format=fmt, encoding='utf-8')
+            self.assertEqual(expected, without_labels(TupleDumper().file_tuples(path)), fmt)
+
+    def test_object_walker_bounded(self):
+        """only the most recent triples about identified objects are remembered to omit repeats"""
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+
+        def triples(walker):
+            return [row for rel, row in walker.tuples(data) if rel == 'triple']
+
+        walker = ObjectWalker(sv, prefix_map=prefixes)
+        expected = triples(walker)
+        self.assertEqual(len(expected), len(set(expected)))
+        # only triples involving blank nodes, which are new for each walk, are repeated
+        self.assertEqual([], [row for row in triples(walker) if not any(re.match(r'^b\d+$', v) for v in row)])
+        walker = ObjectWalker(sv, prefix_map=prefixes, maxsize=1)
+        bounded = triples(walker)
+        self.assertEqual(set(expected), set(bounded))
+        self.assertEqual(1, len(walker._seen))
+
+    def test_turtle_syntax_error(self):
+        """a syntax error in Turtle is reported with its line, without reading the rest of the file"""
+        read = []
+
+        def lines():
+            yield '@prefix ex: <https://example.org/> .\n'
+            yield 'ex:s ex:p ex:o .\n'
+            yield 'ex:s ex:p ] .\n'
+            for i in range(100000):
+                read.append(i)
+                yield f'ex:s ex:p ex:o{i} .\n'
+
+        with self.assertRaises(BadSyntax) as cm:
+            list(turtle_triples(lines()))
+        self.assertEqual(2, cm.exception.lines)
+        self.assertLessEqual(len(read), TURTLE_RETRY_LINES + 1)
+
+    def test_partitioned(self):
+        """triples are written to one file per relation of each predicate"""
+        g = Graph()
+        s = URIRef('https://example.org/s')
+        g.add((s, URIRef('https://example.org/name'), Literal('bob')))
+        g.add((s, URIRef('https://example.org/age'), Literal(30)))
+        g.add((s, RDF.type, URIRef('https://example.org/Person')))
+        directory = os.path.join(OUTPUT_DIR, 'partitioned')
+        Path(directory).mkdir(exist_ok=True)
+        TupleDumper().graph_to_tuples(g, directory, partitioned=True)
+
+        def rows(rel):
+            with open(os.path.join(directory, f'{rel}.facts')) as stream:
+                return [line.rstrip('\n').split('\t') for line in stream]
+
+        self.assertEqual([], rows('triple'))
+        self.assertEqual([[str(s), '"bob"']], rows(partition_relation('https://example.org/name')))
+        self.assertEqual([[str(s), 'bob']], rows(partition_relation('https://example.org/name', 'symbol')))
+        self.assertEqual([[str(s), '30']], rows(partition_relation('https://example.org/age', 'number')))
+        self.assertEqual([[str(s), 'https://example.org/Person']], rows(partition_relation(str(RDF.type))))
+        self.assertCountEqual([['"bob"', 'bob']], rows('literal_symbol'))
+
+    def test_quads(self):
+        """triples are dumped with their named graph, and literals once for all graphs"""
+        g = ConjunctiveGraph()
+        s = URIRef('https://example.org/s')
+        name = URIRef('https://example.org/name')
+        for graph in ['https://example.org/g1', 'https://example.org/g2']:
+            g.get_context(URIRef(graph)).add((s, name, Literal('bob')))
+        tuples = list(TupleDumper(quads=True).tuples(g))
+        self.assertCountEqual([('https://example.org/g1', str(s), str(name), '"bob"'),
+                               ('https://example.org/g2', str(s), str(name), '"bob"')],
+                              [row for rel, row in tuples if rel == 'triple'])
+        self.assertEqual([('"bob"', 'bob')], [row for rel, row in tuples if rel == 'literal_symbol'])
+        partitioned = list(TupleDumper(quads=True, partitioned=True).tuples(g))
+        self.assertIn((partition_relation(str(name), 'symbol'), ('https://example.org/g1', str(s), 'bob')),
+                      partitioned)
+        data = yaml_loader.load(os.path.join(INPUTS_DIR, "example_personinfo_data.yaml"), target_class=Container)
+        sv = SchemaView(os.path.join(INPUTS_DIR, "personinfo.yaml"))
+        rows = [row for rel, row in TupleDumper(quads=True).tuples(data, sv, prefix_map=prefixes) if rel == 'triple']
+        self.assertEqual({DEFAULT_GRAPH}, {row[0] for row in rows})
+
 
 if __name__ == '__main__':
     unittest.main()